@@ -0,0 +1,155 @@
+# adaptive_quiz.py
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from symptom_matrix import SymptomMatrix, normalize_symptom
+
+ANSWERS = ("yes", "no", "unsure")
+
+
+class AdaptiveSession:
+    """Posterior over diseases for one user working through the questionnaire"""
+
+    def __init__(self, session_id: str, log_posterior: np.ndarray, asked: np.ndarray):
+        self.session_id = session_id
+        self.log_posterior = log_posterior
+        self.asked = asked
+        self.history: List[Dict[str, str]] = []
+        self.questions_asked = 0
+
+    @property
+    def posterior(self) -> np.ndarray:
+        return np.exp(self.log_posterior)
+
+
+class AdaptiveQuestionnaire:
+    """
+    Asks one yes/no symptom question at a time, always the one with the highest
+    expected information gain about the disease, until the top disease is likely enough.
+
+    Answers are modelled as noisy reports: a patient with a disease reports each of its
+    symptoms with probability `sensitivity` and any other symptom with `false_positive`.
+    """
+
+    def __init__(self, matrix: SymptomMatrix, sensitivity: float = 0.9,
+                 false_positive: float = 0.02, confidence: float = 0.8,
+                 max_questions: int = 10, min_gain: float = 1e-3,
+                 max_sessions: int = 10000):
+        self.matrix = matrix
+        self.confidence = confidence
+        self.max_questions = max_questions
+        self.min_gain = min_gain
+        self.max_sessions = max_sessions
+
+        # Precomputed (diseases x symptoms) tables so each step is two mat-vec products
+        p_yes = np.where(matrix.matrix > 0, sensitivity, false_positive)
+        p_no = 1.0 - p_yes
+        self._p_yes = p_yes
+        self._log_yes = np.log(p_yes)
+        self._log_no = np.log(p_no)
+        # Entropy of the answer to each question given each disease
+        self._answer_entropy = -(p_yes * self._log_yes + p_no * self._log_no)
+        self._log_prior = np.full(len(matrix.diseases), -np.log(len(matrix.diseases)))
+
+        self._sessions: "OrderedDict[str, AdaptiveSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, symptoms: Optional[Iterable[str]] = None) -> AdaptiveSession:
+        """Open a session, optionally seeded with symptoms the user already reported"""
+        session = AdaptiveSession(
+            str(uuid.uuid4()),
+            self._log_prior.copy(),
+            np.zeros(len(self.matrix.symptoms), dtype=bool),
+        )
+        for symptom in symptoms or []:
+            col = self.matrix.symptom_index.get(normalize_symptom(symptom))
+            if col is not None:
+                self._update(session, col, "yes")
+
+        with self._lock:
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get_session(self, session_id: str) -> Optional[AdaptiveSession]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def end(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def adopt_sessions(self, other: "AdaptiveQuestionnaire") -> bool:
+        """Take over another questionnaire's open sessions if both use the same vocabulary"""
+        if other.matrix.diseases != self.matrix.diseases or other.matrix.symptoms != self.matrix.symptoms:
+            return False
+        # Share the lock too, so requests still draining on the old version stay consistent
+        self._sessions, self._lock = other._sessions, other._lock
+        return True
+
+    def answer(self, session: AdaptiveSession, symptom: str, answer: str):
+        """Fold one answer into the session's posterior"""
+        answer = answer.lower()
+        if answer not in ANSWERS:
+            raise ValueError(f"answer must be one of {', '.join(ANSWERS)}")
+        col = self.matrix.symptom_index.get(normalize_symptom(symptom))
+        if col is None:
+            raise KeyError(symptom)
+        self._update(session, col, answer)
+        session.questions_asked += 1
+
+    def _update(self, session: AdaptiveSession, col: int, answer: str):
+        if answer == "yes":
+            session.log_posterior = session.log_posterior + self._log_yes[:, col]
+        elif answer == "no":
+            session.log_posterior = session.log_posterior + self._log_no[:, col]
+        # Renormalise in log space
+        peak = session.log_posterior.max()
+        session.log_posterior -= peak + np.log(np.exp(session.log_posterior - peak).sum())
+        session.asked[col] = True
+        session.history.append({"symptom": self.matrix.symptoms[col], "answer": answer})
+
+    def expected_gains(self, session: AdaptiveSession) -> np.ndarray:
+        """Expected entropy reduction of the disease posterior for every symptom question"""
+        posterior = session.posterior
+        m_yes = np.clip(posterior @ self._p_yes, 1e-12, 1 - 1e-12)
+        answer_entropy = -(m_yes * np.log(m_yes) + (1 - m_yes) * np.log(1 - m_yes))
+        gains = answer_entropy - posterior @ self._answer_entropy
+        gains[session.asked] = -np.inf
+        return gains
+
+    def is_done(self, session: AdaptiveSession) -> bool:
+        return (
+            session.posterior.max() >= self.confidence
+            or session.questions_asked >= self.max_questions
+            or session.asked.all()
+        )
+
+    def next_question(self, session: AdaptiveSession) -> Optional[Dict[str, str]]:
+        """The most informative unanswered question, or None when the quiz should stop"""
+        if self.is_done(session):
+            return None
+        gains = self.expected_gains(session)
+        best = int(np.argmax(gains))
+        if gains[best] < self.min_gain:
+            return None
+        symptom = self.matrix.symptoms[best]
+        return {"symptom": symptom, "question": f"Are you experiencing {symptom}?"}
+
+    def top_diseases(self, session: AdaptiveSession, k: int = 3) -> List[Dict[str, Any]]:
+        posterior = session.posterior
+        k = min(k, len(posterior))
+        top = np.argpartition(-posterior, k - 1)[:k]
+        top = top[np.argsort(-posterior[top])]
+        return [
+            {"disease": self.matrix.diseases[i], "probability": round(float(posterior[i]), 4)}
+            for i in top
+        ]
@@ -0,0 +1,188 @@
+# autotune_threads.py
+"""
+Benchmark (workers x threads) settings for the inference workers on this host
+and write the best one to thread_config.json, which apply_thread_config() reads.
+
+Usage:
+    python autotune_threads.py --model ../models/biobart-v2-medical-chatbot-final
+    python autotune_threads.py --prompts prompts.txt --objective latency --max-p95 8
+
+Each candidate starts `workers` processes, each pinned to its own slice of
+physical cores with `threads` intra-op threads, loads the model, warms up and
+then runs the prompt set concurrently with the others.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+from typing import Any, Dict, List
+
+from eval_metrics import percentile
+from thread_config import CONFIG_PATH, physical_cores, sweep_candidates
+
+DEFAULT_MODEL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../models/biobart-v2-medical-chatbot-final")
+
+# Representative /chat traffic: short symptom lists, longer narratives, follow-ups
+DEFAULT_PROMPTS = [
+    "I have a high fever, headache and body aches since two days.",
+    "I have been coughing for three weeks, sometimes with yellow phlegm, and I get tired easily.",
+    "My skin is itchy with red patches on my arms and neck.",
+    "Tell me more about malaria.",
+    "I feel a burning sensation in my chest after meals and sometimes a sour taste in my mouth.",
+    "What are the symptoms of diabetes?",
+    "My joints hurt in the morning, especially my fingers and knees, and they look swollen.",
+    "I have diarrhoea, stomach cramps and I vomited twice today after eating outside.",
+]
+
+
+def _bench_worker(slot: int, threads: int, model_path: str, prompts: List[str],
+                  pin: bool, barrier, results):
+    os.environ["OMP_NUM_THREADS"] = os.environ["MKL_NUM_THREADS"] = str(threads)
+    from thread_config import pin_to_slot
+    if pin:
+        pin_to_slot(slot, threads)
+
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    from model_service import MedicalModel
+
+    model = MedicalModel(model_path)
+    model.generate_response(prompts[0])  # warm-up
+    barrier.wait()
+
+    started = time.time()
+    latencies = []
+    for prompt in prompts:
+        t0 = time.perf_counter()
+        model.generate_response(prompt)
+        latencies.append(time.perf_counter() - t0)
+    results.put({"started": started, "finished": time.time(), "latencies": latencies})
+
+
+def _collect(procs, results, timeout: float) -> List[Dict[str, Any]]:
+    """One result per worker; RuntimeError if a worker dies or the candidate runs past timeout"""
+    deadline = time.monotonic() + timeout
+    runs = []
+    while len(runs) < len(procs):
+        try:
+            runs.append(results.get(timeout=5))
+            continue
+        except queue.Empty:
+            pass
+        # A dead worker leaves the others waiting on the barrier, so give up on the candidate
+        failed = [proc.exitcode for proc in procs if proc.exitcode not in (None, 0)]
+        if failed:
+            raise RuntimeError(f"worker exited with code {failed[0]}")
+        if all(proc.exitcode is not None for proc in procs):
+            raise RuntimeError("workers exited without reporting results")
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"no results after {timeout:.0f}s")
+    return runs
+
+
+def run_candidate(workers: int, threads: int, model_path: str, prompts: List[str], pin: bool,
+                  timeout: float = 1800) -> Dict[str, Any]:
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_bench_worker, args=(slot, threads, model_path, prompts, pin, barrier, results))
+        for slot in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    try:
+        runs = _collect(procs, results, timeout)
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
+
+    latencies = [lat for run in runs for lat in run["latencies"]]
+    wall = max(run["finished"] for run in runs) - min(run["started"] for run in runs)
+    return {
+        "workers": workers,
+        "intra_op_threads": threads,
+        "requests": len(latencies),
+        "throughput_rps": round(len(latencies) / wall, 4),
+        "p50_latency_s": round(percentile(latencies, 0.5), 4),
+        "p95_latency_s": round(percentile(latencies, 0.95), 4),
+    }
+
+
+def pick_best(results: List[Dict[str, Any]], objective: str, max_p95: float = None) -> Dict[str, Any]:
+    candidates = [r for r in results if max_p95 is None or r["p95_latency_s"] <= max_p95] or results
+    if objective == "latency":
+        return min(candidates, key=lambda r: (r["p95_latency_s"], -r["throughput_rps"]))
+    return max(candidates, key=lambda r: (r["throughput_rps"], -r["p95_latency_s"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auto-tune inference workers x threads")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--prompts", help="text file with one prompt per line")
+    parser.add_argument("--repeat", type=int, default=1, help="times each worker runs the prompt set")
+    parser.add_argument("--workers", help="comma-separated worker counts to try")
+    parser.add_argument("--threads", help="comma-separated thread counts to try")
+    parser.add_argument("--objective", choices=["throughput", "latency"], default="throughput")
+    parser.add_argument("--max-p95", type=float, help="ignore settings with p95 latency above this (seconds)")
+    parser.add_argument("--no-pin", action="store_true", help="do not pin workers to cores")
+    parser.add_argument("--timeout", type=float, default=1800, help="seconds before a candidate is abandoned")
+    parser.add_argument("--out", default=CONFIG_PATH)
+    args = parser.parse_args()
+
+    prompts = DEFAULT_PROMPTS
+    if args.prompts:
+        with open(args.prompts) as f:
+            prompts = [line.strip() for line in f if line.strip()]
+    prompts = prompts * args.repeat
+
+    cores = len(physical_cores())
+    candidates = sweep_candidates(cores)
+    if args.workers:
+        allowed = {int(w) for w in args.workers.split(",")}
+        candidates = [c for c in candidates if c["workers"] in allowed]
+    if args.threads:
+        allowed = {int(t) for t in args.threads.split(",")}
+        candidates = [c for c in candidates if c["intra_op_threads"] in allowed]
+
+    results = []
+    for candidate in candidates:
+        print(f"workers={candidate['workers']} threads={candidate['intra_op_threads']} ...", flush=True)
+        try:
+            result = run_candidate(candidate["workers"], candidate["intra_op_threads"],
+                                   args.model, prompts, not args.no_pin, args.timeout)
+        except RuntimeError as e:
+            print(f"  skipped: {e}")
+            continue
+        print(f"  {result['throughput_rps']} req/s, p50 {result['p50_latency_s']}s, "
+              f"p95 {result['p95_latency_s']}s")
+        results.append(result)
+
+    if not results:
+        raise SystemExit("No candidate completed")
+    best = pick_best(results, args.objective, args.max_p95)
+    config = {
+        "workers": best["workers"],
+        "intra_op_threads": best["intra_op_threads"],
+        "inter_op_threads": 1,
+        "pin_affinity": not args.no_pin,
+        "objective": args.objective,
+        "physical_cores": cores,
+        "measured": best,
+        "sweep": results,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(args.out, "w") as f:
+        json.dump(config, f, indent=2)
+    print(f"Best: {best}")
+    print(f"Wrote {args.out}; start the API with MEDBOT_WORKERS={best['workers']} "
+          f"uvicorn main:app --workers {best['workers']}")
+
+
+if __name__ == "__main__":
+    main()
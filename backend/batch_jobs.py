@@ -0,0 +1,124 @@
+# batch_jobs.py
+"""
+Bulk pre-screening of NDJSON message files for /chat/batch.
+
+Input lines are {"id": ..., "message": "..."} objects (or bare JSON strings).
+Records are numbered by line among non-empty lines, read a window at a time,
+sorted by length within the window and run through the model in batches, so
+one batch pads little. Results stream back as NDJSON in completion order, and
+after each window a progress line gives the offset a resumed job should start
+from (every record before it has been answered). A batch that fails is retried
+before its records are reported as errors, and the offset never moves past the
+first record that still failed, so resuming retries it. Unparseable lines will
+never succeed and are skipped.
+"""
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+Record = Tuple[int, Any, Optional[str], Optional[str]]  # index, id, message, parse error
+
+
+def read_records(lines: Iterable, offset: int = 0) -> Iterator[Record]:
+    """(index, id, message, error) for every non-empty line at or after `offset`"""
+    index = -1
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        line = line.strip()
+        if not line:
+            continue
+        index += 1
+        if index < offset:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            yield index, None, None, f"invalid JSON: {e}"
+            continue
+        if isinstance(item, str):
+            yield index, index, item, None
+        elif isinstance(item, dict) and isinstance(item.get("message"), str) and item["message"].strip():
+            yield index, item.get("id", index), item["message"], None
+        else:
+            yield index, None, None, "expected a JSON string or an object with a non-empty \"message\""
+
+
+def resolve_batch_path(path: str, batch_dir: str) -> str:
+    """Absolute path of a server-local input file, refusing anything outside batch_dir"""
+    root = os.path.realpath(batch_dir)
+    full = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full]) != root:
+        raise ValueError("path must be inside the batch directory")
+    if not os.path.isfile(full):
+        raise FileNotFoundError(path)
+    return full
+
+
+def _line(payload: Dict[str, Any]) -> str:
+    return json.dumps(payload, ensure_ascii=False) + "\n"
+
+
+def _read_window(records: Iterator[Record], window: int) -> Tuple[List[Record], bool]:
+    """Up to `window` records, and whether the input is exhausted"""
+    chunk: List[Record] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= window:
+            return chunk, False
+    return chunk, True
+
+
+async def run_batch_job(records: Iterator[Record],
+                        process: Callable[[List[str]], Awaitable[List[Dict[str, Any]]]],
+                        offset: int = 0, batch_size: int = 16, window: int = 256,
+                        retries: int = 1, retry_delay: float = 1.0) -> AsyncIterator[str]:
+    """
+    Yield NDJSON result, error and progress lines. `process` answers one
+    length-sorted batch of messages with one dict per message. Windows are read
+    and parsed in a worker thread so file I/O never blocks the event loop.
+    """
+    done = errors = 0
+    resume_offset = offset
+    first_failed: Optional[int] = None
+    exhausted = False
+    while not exhausted:
+        chunk, exhausted = await asyncio.to_thread(_read_window, records, window)
+        if not chunk:
+            break
+
+        valid = []
+        for index, record_id, message, error in chunk:
+            if error:
+                errors += 1
+                yield _line({"index": index, "error": error})
+            else:
+                valid.append((index, record_id, message))
+        valid.sort(key=lambda r: len(r[2]))
+
+        for start in range(0, len(valid), batch_size):
+            batch = valid[start:start + batch_size]
+            for attempt in range(retries + 1):
+                try:
+                    results = await process([message for _, _, message in batch])
+                    break
+                except Exception as e:
+                    failure = e
+                    if attempt < retries:
+                        await asyncio.sleep(retry_delay * 2 ** attempt)
+            else:
+                errors += len(batch)
+                failed = min(index for index, _, _ in batch)
+                first_failed = failed if first_failed is None else min(first_failed, failed)
+                for index, record_id, _ in batch:
+                    yield _line({"index": index, "id": record_id, "error": str(failure)})
+                continue
+            for (index, record_id, _), result in zip(batch, results):
+                done += 1
+                yield _line({"index": index, "id": record_id, **result})
+
+        resume_offset = chunk[-1][0] + 1 if first_failed is None else first_failed
+        yield _line({"progress": {"answered": done, "errors": errors, "resume_offset": resume_offset}})
+
+    yield _line({"done": True, "answered": done, "errors": errors, "resume_offset": resume_offset})
@@ -0,0 +1,79 @@
+# bench_red_flags.py
+"""
+Latency benchmark for the red-flag fast lane (detection + guidance text).
+
+Usage:
+    python bench_red_flags.py [--iterations 20000] [--budget-ms 1.0]
+
+Exits non-zero when p99 latency is over the budget.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from eval_metrics import percentile
+from red_flags import red_flag_detector
+
+RED_FLAG_MESSAGES = [
+    "I have crushing chest pain spreading to my left arm",
+    "my father suddenly can't breathe and his lips are turning blue",
+    "she is confused and her speech is slurred since this morning",
+    "I keep coughing up blood and feel dizzy",
+    "my throat is closing after eating peanuts",
+    "I think I want to end my life",
+]
+
+ORDINARY_MESSAGES = [
+    "I have a mild headache and a runny nose since yesterday",
+    "what are the symptoms of diabetes?",
+    "tell me more about malaria",
+    "no chest pain, just a dry cough at night and some fatigue",
+    "my skin is itchy with a rash on both arms after gardening",
+]
+
+FILLER = "I have been feeling unwell for a few days and I am not sure what is going on. "
+
+
+def build_corpus(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        base = rng.choice(RED_FLAG_MESSAGES + ORDINARY_MESSAGES)
+        # Vary length the way real messages do: short notes up to long paragraphs
+        corpus.append(FILLER * rng.randint(0, 8) + base)
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--budget-ms", type=float, default=1.0)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.iterations)
+    for message in corpus[:100]:  # warm-up
+        red_flag_detector.detect(message)
+
+    timings = []
+    flagged = 0
+    for message in corpus:
+        started = time.perf_counter_ns()
+        match = red_flag_detector.detect(message)
+        if match:
+            match.guidance()
+            flagged += 1
+        timings.append((time.perf_counter_ns() - started) / 1e6)
+
+    p99 = percentile(timings, 0.99)
+    print(f"messages: {len(timings)}  flagged: {flagged}")
+    print(f"mean {statistics.fmean(timings):.4f} ms  p50 {percentile(timings, 0.5):.4f} ms  "
+          f"p99 {p99:.4f} ms  max {max(timings):.4f} ms")
+    if p99 > args.budget_ms:
+        print(f"FAIL: p99 {p99:.4f} ms is over the {args.budget_ms} ms budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# compare_torch_modes.py
+"""
+Compare the optimized torch mode of MedicalModel against eager fp32.
+
+Usage:
+    python compare_torch_modes.py --model ../models/biobart-v2-medical-chatbot-final
+    python compare_torch_modes.py --prompts prompts.txt --no-compile --out report
+
+Both modes decode greedily so differences come from numerics, not sampling.
+Writes <out>.md (human-readable) and <out>.json with per-mode latency
+(p50/p95), tokens/sec and, for the optimized mode, ROUGE-L and exact-match
+rate against the eager fp32 outputs. With --draft, eager fp32 assisted by
+that draft model is measured too; its exact-match rate should be 100%.
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import Any, Dict, List
+
+from autotune_threads import DEFAULT_MODEL, DEFAULT_PROMPTS
+from eval_metrics import percentile, rouge_l
+from model_service import MedicalModel
+
+GREEDY = {"do_sample": False, "num_beams": 1}
+
+
+def run_mode(model: MedicalModel, prompts: List[str], max_length: int) -> Dict[str, Any]:
+    outputs, latencies, tokens = [], [], 0
+    for prompt in prompts:
+        t0 = time.perf_counter()
+        out = model.generate_response(prompt, max_length=max_length, **GREEDY)
+        latencies.append(time.perf_counter() - t0)
+        outputs.append(out)
+        tokens += len(model.tokenizer(out, add_special_tokens=False)["input_ids"])
+    return {
+        "outputs": outputs,
+        "p50_latency_s": round(percentile(latencies, 0.5), 4),
+        "p95_latency_s": round(percentile(latencies, 0.95), 4),
+        "tokens_per_s": round(tokens / sum(latencies), 2),
+    }
+
+
+def write_markdown(path: str, report: Dict[str, Any]):
+    eager, optimized = report["eager_fp32"], report["optimized"]
+    lines = [
+        "# Optimized torch mode vs eager fp32",
+        "",
+        f"Prompts: {report['prompts']}, max_length {report['max_length']}, greedy decoding. "
+        f"Attention: eager fp32 {report['eager_attention']}, optimized {report['attention']}. "
+        f"Optimized: bf16 autocast {'on' if report['bf16'] else 'off'}, "
+        f"torch.compile {'on' if report['compiled'] else 'off'}.",
+        "",
+        "| mode | p50 latency (s) | p95 latency (s) | tokens/s |",
+        "|---|---|---|---|",
+        f"| eager fp32 | {eager['p50_latency_s']} | {eager['p95_latency_s']} | {eager['tokens_per_s']} |",
+        f"| optimized | {optimized['p50_latency_s']} | {optimized['p95_latency_s']} | {optimized['tokens_per_s']} |",
+        "",
+        f"Speed-up (p50): {report['speedup_p50']}x",
+        "",
+        f"Quality vs eager: mean ROUGE-L {report['mean_rouge_l']}, "
+        f"min ROUGE-L {report['min_rouge_l']}, exact match {report['exact_match_rate']:.0%}",
+    ]
+    assisted = report.get("assisted")
+    if assisted:
+        lines += [
+            "",
+            f"Assisted (eager fp32 + draft {assisted['draft']}): p50 {assisted['p50_latency_s']}s, "
+            f"p95 {assisted['p95_latency_s']}s, {assisted['tokens_per_s']} tokens/s, "
+            f"speed-up (p50) {assisted['speedup_p50']}x, exact match vs eager {assisted['exact_match_rate']:.0%}, "
+            f"draft acceptance {assisted['acceptance_rate']}, {assisted['tokens_per_main_forward']} tokens per main step",
+        ]
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare optimized torch mode against eager fp32")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--prompts", help="text file with one prompt per line")
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--no-compile", action="store_true", help="skip torch.compile in optimized mode")
+    parser.add_argument("--draft", help="draft model from distill_draft.py to measure assisted generation")
+    parser.add_argument("--out", default="torch_mode_report", help="output path without extension")
+    args = parser.parse_args()
+
+    prompts = DEFAULT_PROMPTS
+    if args.prompts:
+        with open(args.prompts) as f:
+            prompts = [line.strip() for line in f if line.strip()]
+
+    # transformers >= 4.36 would otherwise pick SDPA for the baseline too
+    eager = MedicalModel(args.model, mode="pipeline", attn_implementation="eager")
+    eager.generate_response(prompts[0], max_length=32, **GREEDY)  # warm-up
+    eager_result = run_mode(eager, prompts, args.max_length)
+    eager_attention = eager.attention
+    del eager
+
+    optimized = MedicalModel(args.model, mode="optimized", compile_model=not args.no_compile)
+    optimized_result = run_mode(optimized, prompts, args.max_length)
+
+    scores = [rouge_l(o, e) for o, e in zip(optimized_result["outputs"], eager_result["outputs"])]
+    exact = [o == e for o, e in zip(optimized_result["outputs"], eager_result["outputs"])]
+    report = {
+        "prompts": len(prompts),
+        "max_length": args.max_length,
+        "attention": optimized.attention,
+        "eager_attention": eager_attention,
+        "bf16": optimized.autocast_dtype is not None,
+        "compiled": optimized.compiled,
+        "eager_fp32": eager_result,
+        "optimized": optimized_result,
+        "speedup_p50": round(eager_result["p50_latency_s"] / optimized_result["p50_latency_s"], 2),
+        "mean_rouge_l": round(statistics.mean(scores), 4),
+        "min_rouge_l": round(min(scores), 4),
+        "exact_match_rate": sum(exact) / len(exact),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if args.draft:
+        del optimized
+        assisted = MedicalModel(args.model, mode="pipeline", draft_model_path=args.draft,
+                                attn_implementation="eager")
+        assisted_result = run_mode(assisted, prompts, args.max_length)
+        matches = [a == e for a, e in zip(assisted_result["outputs"], eager_result["outputs"])]
+        report["assisted"] = {
+            **assisted_result,
+            **assisted.assisted_stats(),
+            "speedup_p50": round(eager_result["p50_latency_s"] / assisted_result["p50_latency_s"], 2),
+            "exact_match_rate": sum(matches) / len(matches),
+        }
+    with open(f"{args.out}.json", "w") as f:
+        json.dump(report, f, indent=2)
+    write_markdown(f"{args.out}.md", report)
+    print(open(f"{args.out}.md").read())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# data_artifacts.py
+"""
+Build step that turns the cleaned CSVs into versioned binary artifacts, and the
+loader the backend uses at startup instead of pd.read_csv.
+
+Usage:
+    python data_artifacts.py --data-dir ../data --out ../data/artifacts
+
+Each build goes into its own directory with a manifest.json holding the format
+version, sha256 checksums of every source CSV and output file, and array shapes.
+A CURRENT file in the artifacts root names the build the backend should load.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from disease_ranker import load_severity
+from symptom_matrix import SymptomMatrix, split_list
+
+FORMAT_VERSION = 1
+
+DISEASE_FILE = "disease_symp_cleaned.csv"
+DOCTOR_FILE = "all_doc_data_cleaned.csv"
+SEVERITY_FILE = "severity.csv"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_paths(data_dir: str) -> Dict[str, str]:
+    """The CSVs a build is made from, by manifest name"""
+    return {name: os.path.join(data_dir, name) for name in (DISEASE_FILE, DOCTOR_FILE, SEVERITY_FILE)}
+
+
+def stale_sources(build_dir: str, data_dir: str) -> List[str]:
+    """Source CSVs that were changed, added or removed since the build was made"""
+    with open(os.path.join(build_dir, "manifest.json")) as f:
+        built = json.load(f)["sources"]
+    live = {name: file_sha256(path) for name, path in source_paths(data_dir).items() if os.path.exists(path)}
+    return sorted(name for name in built.keys() | live.keys() if built.get(name) != live.get(name))
+
+
+def _ragged(lists: List[List[str]]):
+    """Flatten a list of string lists into (indptr, values) CSR-style arrays"""
+    indptr = np.zeros(len(lists) + 1, dtype=np.int32)
+    indptr[1:] = np.cumsum([len(items) for items in lists])
+    values = [item for items in lists for item in items]
+    return indptr, np.array(values, dtype=str) if values else np.array([], dtype="<U1")
+
+
+def _unragged(indptr: np.ndarray, values: np.ndarray) -> List[List[str]]:
+    values = values.tolist()
+    return [values[indptr[i]:indptr[i + 1]] for i in range(len(indptr) - 1)]
+
+
+class DataStore:
+    """Everything the backend serves from the disease and doctor tables"""
+
+    def __init__(self, diseases: List[str], descriptions: List[str],
+                 precautions: List[List[str]], symptom_matrix: SymptomMatrix,
+                 severity: Dict[str, float], doctors_df: Optional[pd.DataFrame],
+                 version: str = "csv"):
+        self.diseases = diseases
+        self.descriptions = descriptions
+        self.precautions = precautions
+        self.symptom_matrix = symptom_matrix
+        self.severity = severity
+        self.doctors_df = doctors_df
+        self.version = version
+        self.disease_details: Dict[str, Dict[str, Any]] = {}
+        for name, description, precaution_list in zip(diseases, descriptions, precautions):
+            self.disease_details.setdefault(name, {
+                "descriptions": description,
+                # /quiz has always returned precautions as the comma-separated string
+                "precautions": ", ".join(precaution_list),
+            })
+
+    @classmethod
+    def from_frames(cls, disease_df: pd.DataFrame, doctors_df: Optional[pd.DataFrame] = None,
+                    severity_df: Optional[pd.DataFrame] = None, version: str = "csv") -> "DataStore":
+        """Build the store straight from parsed tables"""
+        disease_df = disease_df.drop_duplicates("diseases").reset_index(drop=True)
+        return cls(
+            diseases=disease_df["diseases"].astype(str).tolist(),
+            descriptions=disease_df["descriptions"].fillna("").astype(str).tolist(),
+            precautions=[split_list(cell) for cell in disease_df["precautions"]],
+            symptom_matrix=SymptomMatrix.from_frame(disease_df),
+            severity=load_severity(severity_df),
+            doctors_df=doctors_df,
+            version=version,
+        )
+
+    @classmethod
+    def from_csv(cls, data_dir: str) -> "DataStore":
+        """Slow path: parse the CSVs directly (used when no artifacts have been built)"""
+        doctor_path = os.path.join(data_dir, DOCTOR_FILE)
+        severity_path = os.path.join(data_dir, SEVERITY_FILE)
+        return cls.from_frames(
+            pd.read_csv(os.path.join(data_dir, DISEASE_FILE)),
+            pd.read_csv(doctor_path) if os.path.exists(doctor_path) else None,
+            pd.read_csv(severity_path) if os.path.exists(severity_path) else None,
+        )
+
+
+def build_artifacts(store: DataStore, out_root: str, sources: Dict[str, str]) -> str:
+    """Write `store` as a new artifact build under out_root and point CURRENT at it"""
+    source_sums = {name: file_sha256(path) for name, path in sources.items() if os.path.exists(path)}
+    build_id = time.strftime("%Y%m%d-%H%M%S") + "-" + hashlib.sha256(
+        json.dumps(source_sums, sort_keys=True).encode()
+    ).hexdigest()[:8]
+    build_dir = os.path.join(out_root, build_id)
+    os.makedirs(build_dir, exist_ok=True)
+
+    matrix = store.symptom_matrix
+    arrays: Dict[str, np.ndarray] = {
+        "diseases": np.array(store.diseases, dtype=str),
+        "descriptions": np.array(store.descriptions, dtype=str),
+        "symptoms": np.array(matrix.symptoms, dtype=str),
+        "symptom_matrix": np.ascontiguousarray(matrix.matrix, dtype=np.uint8),
+        "severity": np.array([store.severity.get(s, np.nan) for s in matrix.symptoms], dtype=np.float32),
+    }
+    # Precautions pre-split into CSR-style arrays so nothing is re-split per request
+    arrays["precaution_indptr"], arrays["precaution_values"] = _ragged(store.precautions)
+
+    doctor_columns: List[str] = []
+    if store.doctors_df is not None:
+        for col in store.doctors_df.columns:
+            series = store.doctors_df[col]
+            if pd.api.types.is_numeric_dtype(series):
+                arrays[f"doctors.{col}.values"] = series.to_numpy()
+            else:
+                # Text columns as categorical codes; missing values keep code -1 rather than becoming "nan"
+                categorical = pd.Categorical(series)
+                arrays[f"doctors.{col}.codes"] = categorical.codes.astype(np.int32)
+                arrays[f"doctors.{col}.categories"] = np.array(categorical.categories.astype(str), dtype=str)
+            doctor_columns.append(col)
+
+    files = {}
+    for name, array in arrays.items():
+        path = os.path.join(build_dir, f"{name}.npy")
+        np.save(path, array, allow_pickle=False)
+        files[name] = {"sha256": file_sha256(path), "shape": list(array.shape), "dtype": str(array.dtype)}
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "build_id": build_id,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sources": source_sums,
+        "doctor_columns": doctor_columns,
+        "files": files,
+    }
+    with open(os.path.join(build_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the pointer atomically so a running loader never sees a half-written build
+    tmp = os.path.join(out_root, "CURRENT.tmp")
+    with open(tmp, "w") as f:
+        f.write(build_id)
+    os.replace(tmp, os.path.join(out_root, "CURRENT"))
+    return build_dir
+
+
+def current_build(out_root: str) -> Optional[str]:
+    """Directory of the build CURRENT points at, if any"""
+    pointer = os.path.join(out_root, "CURRENT")
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        build_dir = os.path.join(out_root, f.read().strip())
+    return build_dir if os.path.exists(os.path.join(build_dir, "manifest.json")) else None
+
+
+def load_artifacts(build_dir: str, verify: bool = False) -> DataStore:
+    """Load (memory-mapping the numeric arrays) a build written by build_artifacts"""
+    with open(os.path.join(build_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            f"Artifact format {manifest.get('format_version')} in {build_dir}, expected {FORMAT_VERSION}"
+        )
+
+    def load(name: str, mmap: bool = True) -> np.ndarray:
+        path = os.path.join(build_dir, f"{name}.npy")
+        if verify and file_sha256(path) != manifest["files"][name]["sha256"]:
+            raise ValueError(f"Checksum mismatch for {path}")
+        return np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False)
+
+    diseases = load("diseases", mmap=False).tolist()
+    symptoms = load("symptoms", mmap=False).tolist()
+    severity_values = load("severity", mmap=False)
+    severity = {s: float(w) for s, w in zip(symptoms, severity_values) if not np.isnan(w)}
+
+    doctors_df = None
+    if manifest["doctor_columns"]:
+        doctors_df = pd.DataFrame({
+            col: pd.Categorical.from_codes(
+                load(f"doctors.{col}.codes"), load(f"doctors.{col}.categories", mmap=False)
+            ) if f"doctors.{col}.codes" in manifest["files"] else load(f"doctors.{col}.values")
+            for col in manifest["doctor_columns"]
+        })
+
+    return DataStore(
+        diseases=diseases,
+        descriptions=load("descriptions", mmap=False).tolist(),
+        precautions=_unragged(load("precaution_indptr"), load("precaution_values", mmap=False)),
+        symptom_matrix=SymptomMatrix(diseases, symptoms, load("symptom_matrix")),
+        severity=severity,
+        doctors_df=doctors_df,
+        version=manifest["build_id"],
+    )
+
+
+def load_data_store(data_dir: str, artifacts_dir: Optional[str] = None, rebuild: bool = False) -> DataStore:
+    """
+    Load the current artifact build, falling back to parsing the CSVs when it is
+    missing or stale. With rebuild, a stale build is replaced by a fresh one made
+    from the CSVs (and CURRENT moved to it) instead.
+    """
+    artifacts_dir = artifacts_dir or os.path.join(data_dir, "artifacts")
+    build_dir = current_build(artifacts_dir)
+    if build_dir is None:
+        print(f"Warning: no data artifacts in {artifacts_dir}, parsing CSVs (run data_artifacts.py to build them)")
+        return DataStore.from_csv(data_dir)
+    try:
+        stale = stale_sources(build_dir, data_dir)
+        if not stale:
+            return load_artifacts(build_dir, verify=os.environ.get("MEDBOT_VERIFY_ARTIFACTS") == "1")
+        if rebuild:
+            store = DataStore.from_csv(data_dir)
+            build_dir = build_artifacts(store, artifacts_dir, source_paths(data_dir))
+            print(f"{', '.join(stale)} changed, rebuilt data artifacts in {build_dir}")
+            store.version = os.path.basename(build_dir)
+            return store
+        print(f"Warning: {', '.join(stale)} changed since artifact build {build_dir}, parsing CSVs "
+              f"(rerun data_artifacts.py to rebuild)")
+    except Exception as e:
+        print(f"Warning: could not load artifacts from {build_dir}: {e}")
+    return DataStore.from_csv(data_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build binary data artifacts from the cleaned CSVs")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data"))
+    parser.add_argument("--out", default=None, help="artifacts root (default: <data-dir>/artifacts)")
+    args = parser.parse_args()
+
+    out_root = args.out or os.path.join(args.data_dir, "artifacts")
+    sources = source_paths(args.data_dir)
+    started = time.perf_counter()
+    build_dir = build_artifacts(DataStore.from_csv(args.data_dir), out_root, sources)
+    print(f"Wrote {build_dir} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# degradation.py
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from eval_metrics import percentile
+
+# Service levels from full quality to cheapest; generation None means no model call
+DEGRADATION_LEVELS = [
+    {"name": "full", "generation": {}},
+    {"name": "short", "generation": {"max_length": 192}},
+    {"name": "greedy", "generation": {"max_length": 128, "do_sample": False, "num_beams": 1}},
+    {"name": "table", "generation": None},
+]
+
+HIGH_LOAD_MESSAGE = (
+    "We're handling a lot of requests right now, so detailed answers are paused for a moment. "
+    "Please list your main symptoms (for example: fever, headache, cough) and I'll match them "
+    "against our disease database, or try the symptom quiz."
+)
+
+
+class DegradationController:
+    """
+    Steps /chat down through DEGRADATION_LEVELS as load rises and back up as it falls.
+
+    Pressure is the worse of (a) p95 of queue wait + generation time over the last
+    `window` seconds and (b) the wait implied by the current queue, both relative to
+    the latency SLO. Above `raise_at` the level goes down one step (at most once per
+    `step_interval`); it only comes back up after pressure has stayed below
+    `lower_at` for `hold` seconds, so the level does not flap around the threshold.
+    """
+
+    def __init__(self, slo: float = 10.0, window: float = 30.0, raise_at: float = 1.0,
+                 lower_at: float = 0.6, hold: float = 15.0, step_interval: float = 5.0,
+                 min_samples: int = 3):
+        self.slo = slo
+        self.window = window
+        self.raise_at = raise_at
+        self.lower_at = lower_at
+        self.hold = hold
+        self.step_interval = step_interval
+        self.min_samples = min_samples
+        self.level = 0
+        self.pressure = 0.0
+        self._samples: Deque[Tuple[float, float, float]] = deque()
+        self._calm_since: Optional[float] = None
+        self._last_step = 0.0
+        self._lock = threading.Lock()
+        self.transitions = 0
+        self.served = [0] * len(DEGRADATION_LEVELS)
+
+    @classmethod
+    def from_env(cls) -> "DegradationController":
+        return cls(
+            slo=float(os.environ.get("MEDBOT_LATENCY_SLO", "10")),
+            hold=float(os.environ.get("MEDBOT_DEGRADE_HOLD", "15")),
+        )
+
+    @property
+    def mode(self) -> str:
+        return DEGRADATION_LEVELS[self.level]["name"]
+
+    def generation_overrides(self) -> Optional[Dict[str, Any]]:
+        """Decoding overrides for the current level, or None to skip the model"""
+        return DEGRADATION_LEVELS[self.level]["generation"]
+
+    def observe(self, queue_wait: float, generation: float):
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, queue_wait, generation))
+
+    def timed(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """fn wrapped to report its queue wait (from now until it starts) and run time"""
+        enqueued = time.monotonic()
+
+        def run(*args: Any, **kwargs: Any) -> Any:
+            started = time.monotonic()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.observe(started - enqueued, time.monotonic() - started)
+        return run
+
+    def update(self, queue_depth: int = 0, concurrency: int = 1) -> int:
+        """Re-evaluate pressure and return the level to serve this request at"""
+        now = time.monotonic()
+        with self._lock:
+            while self._samples and self._samples[0][0] < now - self.window:
+                self._samples.popleft()
+            totals = [wait + gen for _, wait, gen in self._samples]
+            observed = percentile(totals, 0.95) if len(totals) >= self.min_samples else 0.0
+            mean_generation = (sum(gen for _, _, gen in self._samples) / len(self._samples)
+                               if self._samples else 0.0)
+            queued = queue_depth * mean_generation / max(concurrency, 1)
+            self.pressure = max(observed, queued) / self.slo
+
+            if self.pressure > self.raise_at:
+                self._calm_since = None
+                if self.level < len(DEGRADATION_LEVELS) - 1 and now - self._last_step >= self.step_interval:
+                    self._step(self.level + 1, now)
+            elif self.pressure < self.lower_at:
+                if self._calm_since is None:
+                    self._calm_since = now
+                if self.level > 0 and now - self._calm_since >= self.hold:
+                    self._step(self.level - 1, now)
+                    self._calm_since = now
+            else:
+                self._calm_since = None
+            self.served[self.level] += 1
+            return self.level
+
+    def _step(self, level: int, now: float):
+        print(f"Degradation level {self.level} -> {level} ({DEGRADATION_LEVELS[level]['name']}), "
+              f"pressure {self.pressure:.2f}")
+        self.level = level
+        self._last_step = now
+        self.transitions += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"level": self.level, "mode": self.mode}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = list(self._samples)
+        return {
+            **self.as_dict(),
+            "pressure": round(self.pressure, 3),
+            "slo_s": self.slo,
+            "window_samples": len(samples),
+            "p95_queue_wait_s": round(percentile([w for _, w, _ in samples], 0.95), 4),
+            "p95_generation_s": round(percentile([g for _, _, g in samples], 0.95), 4),
+            "transitions": self.transitions,
+            "served_by_level": {lvl["name"]: n for lvl, n in zip(DEGRADATION_LEVELS, self.served)},
+        }
@@ -0,0 +1,197 @@
+# disease_etl.py
+"""
+Rebuild disease_symp_cleaned.csv and the serving artifacts from the raw Kaggle files.
+
+Usage:
+    python disease_etl.py --raw-dir ../data/raw --data-dir ../data
+    python disease_etl.py --force
+
+Raw inputs (in --raw-dir):
+    dataset.csv     Disease, Symptom_1 .. Symptom_17 (one row per observed case)
+    severity.csv    Symptom, weight
+    symp-desc.csv   Disease, Description
+    symp-prec.csv   Disease, Precaution_1 .. Precaution_4
+
+Every file is read in chunks and reshaped with melt/groupby, and the three
+disease tables are joined on a normalized disease key. The cleaned CSVs and
+a new artifact build (data_artifacts.build_artifacts) are written from the
+same in-memory tables. The input checksums are recorded in etl_state.json, so
+a rerun with unchanged inputs and outputs does nothing.
+"""
+import argparse
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from data_artifacts import (DISEASE_FILE, DOCTOR_FILE, SEVERITY_FILE, DataStore, build_artifacts,
+                            current_build, file_sha256)
+
+RAW_DATASET = "dataset.csv"
+RAW_SEVERITY = "severity.csv"
+RAW_DESCRIPTIONS = "symp-desc.csv"
+RAW_PRECAUTIONS = "symp-prec.csv"
+STATE_FILE = "etl_state.json"
+CHUNK_SIZE = 1000
+
+
+def disease_key(names: pd.Series) -> pd.Series:
+    """Join key for disease names: trimmed, single-spaced, lowercase"""
+    return names.astype(str).str.strip().str.replace(r"\s+", " ", regex=True).str.lower()
+
+
+def _read_chunks(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=str, skipinitialspace=True):
+        chunk.columns = chunk.columns.str.strip()
+        yield chunk
+
+
+def _long_items(chunk: pd.DataFrame, prefix: str) -> pd.DataFrame:
+    """Melt the numbered <prefix>_N columns into (key, item) rows, keeping row then column order"""
+    columns = sorted((c for c in chunk.columns if c.startswith(prefix)), key=lambda c: int(c.rsplit("_", 1)[1]))
+    keyed = chunk.assign(key=disease_key(chunk["Disease"]))
+    long = keyed.melt(id_vars="key", value_vars=columns, value_name="item", ignore_index=False)
+    long = long.sort_index(kind="stable")
+    long["item"] = long["item"].str.strip()
+    return long.loc[long["item"].notna() & (long["item"] != ""), ["key", "item"]]
+
+
+def _grouped_items(path: str, prefix: str, chunksize: int) -> pd.Series:
+    """key -> ", "-joined unique items, in first-seen order across all chunks"""
+    parts = [_long_items(chunk, prefix).drop_duplicates() for chunk in _read_chunks(path, chunksize)]
+    long = pd.concat(parts, ignore_index=True).drop_duplicates()
+    return long.groupby("key", sort=False)["item"].agg(", ".join)
+
+
+def load_symptoms(path: str, chunksize: int = CHUNK_SIZE) -> pd.Series:
+    """Union of the symptoms seen for each disease across all its case rows"""
+    return _grouped_items(path, "Symptom_", chunksize).rename("symptoms")
+
+
+def load_descriptions(path: str, chunksize: int = CHUNK_SIZE) -> pd.Series:
+    parts = [
+        chunk.assign(key=disease_key(chunk["Disease"]))[["key", "Description"]]
+        for chunk in _read_chunks(path, chunksize)
+    ]
+    table = pd.concat(parts, ignore_index=True).drop_duplicates("key")
+    return table.set_index("key")["Description"].str.strip().str.lower().rename("descriptions")
+
+
+def load_precautions(path: str, chunksize: int = CHUNK_SIZE) -> pd.Series:
+    return _grouped_items(path, "Precaution_", chunksize).rename("precautions")
+
+
+def load_severity_table(path: str, chunksize: int = CHUNK_SIZE) -> pd.DataFrame:
+    parts = [chunk[["Symptom", "weight"]] for chunk in _read_chunks(path, chunksize)]
+    table = pd.concat(parts, ignore_index=True)
+    table["Symptom"] = table["Symptom"].str.strip()
+    table["weight"] = pd.to_numeric(table["weight"], errors="coerce")
+    return table.dropna().drop_duplicates("Symptom")
+
+
+def build_disease_table(raw_dir: str, chunksize: int = CHUNK_SIZE) -> pd.DataFrame:
+    """The cleaned disease table: diseases, symptoms, descriptions, precautions"""
+    table = (
+        load_symptoms(os.path.join(raw_dir, RAW_DATASET), chunksize).to_frame()
+        .join(load_descriptions(os.path.join(raw_dir, RAW_DESCRIPTIONS), chunksize))
+        .join(load_precautions(os.path.join(raw_dir, RAW_PRECAUTIONS), chunksize))
+        .sort_index()
+    )
+    table = table.fillna("Unknown").rename_axis("diseases").reset_index()
+    return table[["diseases", "symptoms", "descriptions", "precautions"]]
+
+
+def _write_csv(df: pd.DataFrame, path: str):
+    tmp = f"{path}.tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def _load_state(path: str) -> Optional[Dict]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _up_to_date(state: Optional[Dict], inputs: Dict[str, str], outputs: List[str], out_root: str) -> bool:
+    if not state or state.get("inputs") != inputs:
+        return False
+    build_dir = current_build(out_root)
+    if build_dir is None or os.path.basename(build_dir) != state.get("build_id"):
+        return False
+    return all(
+        os.path.exists(path) and file_sha256(path) == state["outputs"].get(os.path.basename(path))
+        for path in outputs
+    )
+
+
+def run_etl(raw_dir: str, data_dir: str, out_root: Optional[str] = None, force: bool = False,
+            chunksize: int = CHUNK_SIZE) -> Optional[str]:
+    """Rebuild the cleaned tables and artifacts if any input changed; returns the new build dir"""
+    out_root = out_root or os.path.join(data_dir, "artifacts")
+    os.makedirs(out_root, exist_ok=True)
+    state_path = os.path.join(out_root, STATE_FILE)
+
+    raw_paths = [os.path.join(raw_dir, name) for name in (RAW_DATASET, RAW_SEVERITY, RAW_DESCRIPTIONS, RAW_PRECAUTIONS)]
+    doctor_path = os.path.join(data_dir, DOCTOR_FILE)
+    inputs = {os.path.basename(p): file_sha256(p) for p in raw_paths}
+    if os.path.exists(doctor_path):
+        inputs[DOCTOR_FILE] = file_sha256(doctor_path)
+
+    disease_path = os.path.join(data_dir, DISEASE_FILE)
+    severity_path = os.path.join(data_dir, SEVERITY_FILE)
+    if not force and _up_to_date(_load_state(state_path), inputs, [disease_path, severity_path], out_root):
+        return None
+
+    disease_df = build_disease_table(raw_dir, chunksize)
+    severity_df = load_severity_table(os.path.join(raw_dir, RAW_SEVERITY), chunksize)
+    doctors_df = pd.read_csv(doctor_path) if os.path.exists(doctor_path) else None
+
+    os.makedirs(data_dir, exist_ok=True)
+    _write_csv(disease_df, disease_path)
+    _write_csv(severity_df, severity_path)
+
+    store = DataStore.from_frames(disease_df, doctors_df, severity_df)
+    sources = {name: os.path.join(data_dir, name) for name in (DISEASE_FILE, DOCTOR_FILE, SEVERITY_FILE)}
+    build_dir = build_artifacts(store, out_root, sources)
+
+    state = {
+        "inputs": inputs,
+        "outputs": {os.path.basename(p): file_sha256(p) for p in (disease_path, severity_path)},
+        "build_id": os.path.basename(build_dir),
+        "diseases": len(disease_df),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    tmp = f"{state_path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, state_path)
+    return build_dir
+
+
+def main():
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data")
+    parser = argparse.ArgumentParser(description="Rebuild the cleaned disease table and serving artifacts")
+    parser.add_argument("--raw-dir", default=os.path.join(data_dir, "raw"))
+    parser.add_argument("--data-dir", default=data_dir)
+    parser.add_argument("--out", default=None, help="artifacts root (default: <data-dir>/artifacts)")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--force", action="store_true", help="rebuild even if no input changed")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    build_dir = run_etl(args.raw_dir, args.data_dir, args.out, args.force, args.chunksize)
+    if build_dir is None:
+        print("Inputs unchanged, nothing to do (use --force to rebuild)")
+    else:
+        print(f"Wrote {DISEASE_FILE} and {build_dir} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# disease_ranker.py
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from symptom_matrix import SymptomMatrix, normalize_symptom
+
+
+def load_severity(severity_df: Optional[pd.DataFrame]) -> Dict[str, float]:
+    """Symptom -> severity weight from severity.csv (columns Symptom, weight)"""
+    if severity_df is None or severity_df.empty:
+        return {}
+    symptom_col, weight_col = severity_df.columns[:2]
+    weights = pd.to_numeric(severity_df[weight_col], errors="coerce")
+    return {
+        normalize_symptom(symptom): float(weight)
+        for symptom, weight in zip(severity_df[symptom_col], weights)
+        if not np.isnan(weight)
+    }
+
+
+class DiseaseRanker:
+    """
+    Naive-Bayes style disease ranker over reported symptoms.
+
+    Each disease is treated as a smoothed distribution over its symptoms, so diseases
+    with long symptom lists no longer win just by matching more. Reported symptoms are
+    weighted by severity. The (symptoms x diseases) log-likelihood matrix is built once;
+    scoring a query is one dot product, and a softmax with a fitted temperature turns
+    the scores into calibrated probabilities.
+    """
+
+    def __init__(self, matrix: SymptomMatrix, severity: Optional[Dict[str, float]] = None,
+                 alpha: float = 0.5, temperature: float = 1.0):
+        self.matrix = matrix
+        self.alpha = alpha
+        self.temperature = temperature
+
+        counts = matrix.matrix.astype(np.float64)
+        n_symptoms = counts.shape[1]
+        theta = (counts + alpha) / (counts.sum(axis=1, keepdims=True) + alpha * n_symptoms)
+
+        # Severity weights scaled to mean 1 so they reshape rather than rescale scores
+        weights = np.ones(n_symptoms)
+        if severity:
+            known = [severity.get(s) for s in matrix.symptoms]
+            mean = np.mean([w for w in known if w is not None] or [1.0])
+            weights = np.array([(w if w is not None else mean) / mean for w in known])
+        self.symptom_weights = weights.astype(np.float32)
+
+        self._log_likelihood = (np.log(theta) * weights).T.astype(np.float32)
+        self._incidence = matrix.matrix.T.astype(np.float32)
+
+    @classmethod
+    def from_frames(cls, disease_df: pd.DataFrame, severity_df: Optional[pd.DataFrame] = None,
+                    **kwargs) -> "DiseaseRanker":
+        return cls(SymptomMatrix.from_frame(disease_df), load_severity(severity_df), **kwargs)
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """(queries x symptoms) 0/1 matrix -> (queries x diseases) log-likelihoods"""
+        return queries @ self._log_likelihood
+
+    def probabilities(self, queries: np.ndarray, temperature: Optional[float] = None) -> np.ndarray:
+        logits = self.scores(queries) / (temperature or self.temperature)
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        return probs / probs.sum(axis=1, keepdims=True)
+
+    def rank(self, symptoms: Iterable[str], k: int = 3) -> List[Dict[str, Any]]:
+        return self.rank_batch([symptoms], k)[0]
+
+    def rank_batch(self, symptom_lists: Sequence[Iterable[str]], k: int = 3) -> List[List[Dict[str, Any]]]:
+        """Top-k diseases with probabilities for each query; empty when nothing is recognised"""
+        if not symptom_lists:
+            return []
+        queries = np.stack([self.matrix.encode(symptoms) for symptoms in symptom_lists])
+        probs = self.probabilities(queries)
+        matches = queries @ self._incidence
+        k = min(k, probs.shape[1])
+
+        top = np.argpartition(-probs, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            if not queries[row].any():
+                results.append([])
+                continue
+            candidates = candidates[np.argsort(-probs[row, candidates])]
+            results.append([
+                {
+                    "disease": self.matrix.diseases[i],
+                    "probability": round(float(probs[row, i]), 4),
+                    "match_count": int(matches[row, i]),
+                }
+                for i in candidates
+                if matches[row, i] > 0
+            ])
+        return results
+
+    def fit_temperature(self, queries: np.ndarray, labels: np.ndarray,
+                        grid: Optional[np.ndarray] = None) -> float:
+        """Pick the softmax temperature that minimises negative log-likelihood on labelled queries"""
+        grid = np.logspace(-2, 1.5, 50) if grid is None else grid
+        scores = self.scores(queries)
+        best_t, best_nll = self.temperature, np.inf
+        for t in grid:
+            logits = scores / t
+            logits -= logits.max(axis=1, keepdims=True)
+            log_probs = logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+            nll = -log_probs[np.arange(len(labels)), labels].mean()
+            if nll < best_nll:
+                best_t, best_nll = float(t), nll
+        self.temperature = best_t
+        return best_t
+
+    def calibrate_on_table(self, samples_per_disease: int = 20, keep: float = 0.5,
+                           noise: float = 0.03, seed: int = 0) -> float:
+        """
+        Fit the temperature on simulated patients: each one reports a random subset of
+        a disease's listed symptoms plus the odd unrelated one, which is how users fill
+        in the quiz.
+        """
+        rng = np.random.default_rng(seed)
+        incidence = self.matrix.matrix.astype(bool)
+        labels = np.repeat(np.arange(incidence.shape[0]), samples_per_disease)
+        draws = rng.random((len(labels), incidence.shape[1]))
+        queries = np.where(incidence[labels], draws < keep, draws < noise)
+        # Everyone reports at least one symptom
+        for row in np.flatnonzero(~queries.any(axis=1)):
+            present = np.flatnonzero(incidence[labels[row]])
+            if present.size:
+                queries[row, rng.choice(present)] = True
+        keep_rows = queries.any(axis=1)
+        return self.fit_temperature(queries[keep_rows].astype(np.float32), labels[keep_rows])
@@ -0,0 +1,210 @@
+# distill_draft.py
+"""
+Distill a small draft model for assisted generation (MEDBOT_DRAFT_MODEL).
+
+Usage:
+    python distill_draft.py --data ../data/train_set.csv --out ../models/biobart-draft
+    python distill_draft.py --data train.csv --limit 2000 --encoder-layers 2 --decoder-layers 1 --epochs 3
+
+The student is the teacher's architecture with fewer layers, initialised from
+the teacher's embeddings and an evenly spaced subset of its layers, and shares
+its tokenizer (a requirement for assisted generation). It is trained on the
+teacher's own greedy outputs for the chat prompt (sequence-level distillation,
+which is what the draft has to predict) plus a temperature-scaled KL term on the
+teacher's logits. Teacher outputs are cached in <out>/teacher_outputs.jsonl so
+a rerun skips generation. The report gives the student's greedy agreement with
+the teacher on held-out prompts, which is the per-token acceptance rate to
+expect from /metrics/assisted.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List
+
+import torch
+import torch.nn.functional as F
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+from autotune_threads import DEFAULT_MODEL
+from evaluate_model import length_buckets, load_examples
+from model_service import build_prompt
+
+_LAYER_KEY = re.compile(r"^(model\.(?:encoder|decoder)\.layers\.)(\d+)\.")
+
+
+def spread(teacher_layers: int, student_layers: int) -> List[int]:
+    """Evenly spaced teacher layer indices, always keeping the first and last"""
+    if student_layers == 1:
+        return [teacher_layers - 1]
+    step = (teacher_layers - 1) / (student_layers - 1)
+    return [round(i * step) for i in range(student_layers)]
+
+
+def build_student(teacher, encoder_layers: int, decoder_layers: int):
+    config = copy.deepcopy(teacher.config)
+    config.encoder_layers = encoder_layers
+    config.decoder_layers = decoder_layers
+    student = AutoModelForSeq2SeqLM.from_config(config)
+    layer_map = {
+        "model.encoder.layers.": spread(teacher.config.encoder_layers, encoder_layers),
+        "model.decoder.layers.": spread(teacher.config.decoder_layers, decoder_layers),
+    }
+    teacher_state = teacher.state_dict()
+    student_state = {}
+    for key in student.state_dict():
+        match = _LAYER_KEY.match(key)
+        source = key
+        if match:
+            prefix, index = match.group(1), int(match.group(2))
+            source = f"{prefix}{layer_map[prefix][index]}.{key[match.end():]}"
+        student_state[key] = teacher_state[source]
+    student.load_state_dict(student_state)
+    return student
+
+
+def teacher_outputs(teacher, tokenizer, examples: List[Dict[str, Any]], batch_size: int, max_length: int,
+                    cache_path: str) -> Dict[int, List[int]]:
+    """Teacher greedy token ids per example id, resumed from cache_path"""
+    outputs: Dict[int, List[int]] = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                outputs[row["id"]] = row["ids"]
+    todo = [e for e in examples if e["id"] not in outputs]
+    with open(cache_path, "a") as f:
+        for batch in length_buckets(todo, batch_size):
+            inputs = tokenizer([build_prompt(e["input"]) for e in batch], return_tensors="pt", padding=True,
+                               truncation=True, max_length=teacher.config.max_position_embeddings)
+            with torch.inference_mode():
+                generated = teacher.generate(**inputs, do_sample=False, num_beams=1, max_length=max_length)
+            for example, ids in zip(batch, generated.tolist()):
+                ids = [t for t in ids if t != tokenizer.pad_token_id]
+                outputs[example["id"]] = ids
+                f.write(json.dumps({"id": example["id"], "ids": ids}) + "\n")
+            f.flush()
+            print(f"teacher outputs: {len(outputs)}/{len(examples)}")
+    return outputs
+
+
+def make_batch(tokenizer, teacher, batch: List[Dict[str, Any]], targets: Dict[int, List[int]]):
+    inputs = tokenizer([build_prompt(e["input"]) for e in batch], return_tensors="pt", padding=True,
+                       truncation=True, max_length=teacher.config.max_position_embeddings)
+    # Generated ids start with the decoder start token, which the model adds back itself
+    labels = [targets[e["id"]][1:] for e in batch]
+    width = max(len(ids) for ids in labels)
+    inputs["labels"] = torch.tensor([ids + [-100] * (width - len(ids)) for ids in labels])
+    return inputs
+
+
+def distillation_loss(student, teacher, inputs, alpha: float, temperature: float) -> torch.Tensor:
+    student_out = student(**inputs)
+    with torch.no_grad():
+        teacher_logits = teacher(**inputs).logits
+    mask = inputs["labels"] != -100
+    kl = F.kl_div(
+        F.log_softmax(student_out.logits[mask] / temperature, dim=-1),
+        F.log_softmax(teacher_logits[mask] / temperature, dim=-1),
+        log_target=True, reduction="batchmean",
+    )
+    return alpha * student_out.loss + (1 - alpha) * temperature ** 2 * kl
+
+
+def agreement(student, tokenizer, teacher, examples, targets, batch_size: int) -> float:
+    """Share of teacher tokens the student predicts greedily given the same prefix"""
+    hits = total = 0
+    student.eval()
+    with torch.inference_mode():
+        for batch in length_buckets(examples, batch_size):
+            inputs = make_batch(tokenizer, teacher, batch, targets)
+            predicted = student(**inputs).logits.argmax(-1)
+            mask = inputs["labels"] != -100
+            hits += int((predicted[mask] == inputs["labels"][mask]).sum())
+            total += int(mask.sum())
+    return hits / total if total else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill a draft model for assisted generation")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="teacher checkpoint")
+    parser.add_argument("--data", required=True, help="CSV of patient messages")
+    parser.add_argument("--input-col", default="Patient")
+    parser.add_argument("--target-col", default="Doctor")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--encoder-layers", type=int, default=2)
+    parser.add_argument("--decoder-layers", type=int, default=1)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--lr", type=float, default=5e-5)
+    parser.add_argument("--max-length", type=int, default=256, help="teacher generation length")
+    parser.add_argument("--alpha", type=float, default=0.5, help="weight of the hard-label loss vs KL")
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--val-fraction", type=float, default=0.05)
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(DEFAULT_MODEL), "biobart-draft"))
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    teacher = AutoModelForSeq2SeqLM.from_pretrained(args.model)
+    teacher.eval()
+
+    examples = load_examples(args.data, args.input_col, args.target_col, args.limit)
+    targets = teacher_outputs(teacher, tokenizer, examples, args.batch_size, args.max_length,
+                              os.path.join(args.out, "teacher_outputs.jsonl"))
+    random.Random(42).shuffle(examples)
+    n_val = max(1, int(len(examples) * args.val_fraction))
+    val, train = examples[:n_val], examples[n_val:]
+
+    student = build_student(teacher, args.encoder_layers, args.decoder_layers)
+    before = agreement(student, tokenizer, teacher, val, targets, args.batch_size)
+    print(f"held-out greedy agreement before training: {before:.3f}")
+    score = before
+    optimizer = torch.optim.AdamW(student.parameters(), lr=args.lr)
+    started = time.perf_counter()
+    for epoch in range(args.epochs):
+        student.train()
+        batches = length_buckets(train, args.batch_size)
+        random.Random(epoch).shuffle(batches)
+        total = 0.0
+        for step, batch in enumerate(batches, 1):
+            loss = distillation_loss(student, teacher, make_batch(tokenizer, teacher, batch, targets),
+                                     args.alpha, args.temperature)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), 1.0)
+            optimizer.step()
+            optimizer.zero_grad()
+            total += loss.item()
+            if step % 50 == 0:
+                print(f"epoch {epoch + 1} step {step}/{len(batches)} loss {total / step:.4f}")
+        score = agreement(student, tokenizer, teacher, val, targets, args.batch_size)
+        print(f"epoch {epoch + 1}: loss {total / max(len(batches), 1):.4f}, held-out greedy agreement {score:.3f}")
+
+    student.save_pretrained(args.out)
+    tokenizer.save_pretrained(args.out)
+    report = {
+        "teacher": args.model,
+        "encoder_layers": args.encoder_layers,
+        "decoder_layers": args.decoder_layers,
+        "student_params": sum(p.numel() for p in student.parameters()),
+        "teacher_params": sum(p.numel() for p in teacher.parameters()),
+        "train_examples": len(train),
+        "val_examples": len(val),
+        "agreement_before": round(before, 4),
+        "agreement_after": round(score, 4),
+        "train_seconds": round(time.perf_counter() - started, 1),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(args.out, "distill_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
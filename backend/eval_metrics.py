@@ -0,0 +1,79 @@
+# eval_metrics.py
+"""Text-overlap and latency metrics for comparing model outputs"""
+import math
+import re
+from collections import Counter
+from typing import List, Sequence
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _lcs_length(a: Sequence[str], b: Sequence[str]) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for j, y in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+def rouge_l(candidate: str, reference: str) -> float:
+    """ROUGE-L F1 over lowercase word tokens"""
+    cand, ref = tokenize(candidate), tokenize(reference)
+    if not cand or not ref:
+        return float(cand == ref)
+    lcs = _lcs_length(cand, ref)
+    if lcs == 0:
+        return 0.0
+    precision, recall = lcs / len(cand), lcs / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+def _ngrams(tokens: Sequence[str], n: int) -> Counter:
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def rouge_n(candidate: str, reference: str, n: int = 1) -> float:
+    """ROUGE-N F1 over lowercase word tokens"""
+    cand, ref = _ngrams(tokenize(candidate), n), _ngrams(tokenize(reference), n)
+    overlap = sum((cand & ref).values())
+    if overlap == 0:
+        return float(not cand and not ref)
+    precision, recall = overlap / sum(cand.values()), overlap / sum(ref.values())
+    return 2 * precision * recall / (precision + recall)
+
+
+def corpus_bleu(candidates: Sequence[str], references: Sequence[str], max_n: int = 4) -> float:
+    """
+    Corpus BLEU with uniform n-gram weights and a brevity penalty. Zero n-gram
+    matches are smoothed to 0.1 / total (NLTK's method1), as in the fine-tuning notebook.
+    """
+    matches, totals = [0] * max_n, [0] * max_n
+    cand_len = ref_len = 0
+    for candidate, reference in zip(candidates, references):
+        cand, ref = tokenize(candidate), tokenize(reference)
+        cand_len += len(cand)
+        ref_len += len(ref)
+        for n in range(1, max_n + 1):
+            cand_ngrams = _ngrams(cand, n)
+            matches[n - 1] += sum((cand_ngrams & _ngrams(ref, n)).values())
+            totals[n - 1] += sum(cand_ngrams.values())
+    if cand_len == 0 or not all(totals):
+        return 0.0
+    log_precision = sum(
+        math.log((m if m else 0.1) / t) for m, t in zip(matches, totals)
+    ) / max_n
+    brevity = 1.0 if cand_len > ref_len else math.exp(1 - ref_len / cand_len)
+    return brevity * math.exp(log_precision)
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
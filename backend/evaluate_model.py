@@ -0,0 +1,283 @@
+# evaluate_model.py
+"""
+Batch evaluation of the chat model: quality (ROUGE/BLEU) and speed side by side.
+
+Usage:
+    python evaluate_model.py --data ../data/validation_set.csv --configs pipeline:beam4,optimized:beam4
+    python evaluate_model.py --data val.csv --configs pipeline:greedy,optimized:greedy --workers 4 --limit 500
+    python evaluate_model.py --data val.csv --configs optimized:greedy --baseline eval_runs/summary.json
+
+Each config is <mode>:<decoding>, where mode is a MedicalModel mode (pipeline =
+eager fp32, optimized) and decoding is one of DECODING_PRESETS. Examples are
+sorted by input length and cut into batches so each batch pads little; batches
+are dealt round-robin to --workers processes, each with its share of the cores.
+
+Per-example outputs are appended to <out>/<config>-<key>/part-<worker>.jsonl as
+each batch finishes, and examples already there are skipped, so an interrupted
+run resumes where it stopped. <key> hashes everything that changes the outputs
+(model files, data file contents, columns, max length, --raw, mode and
+decoding), so a run with different inputs starts afresh instead of mixing in
+stale predictions; the inputs are recorded in inputs.json next to the parts. The summary (summary.json / summary.md) reports
+ROUGE-1/2/L, BLEU, tokens/s and p50/p95 latency per config and the command
+exits non-zero when ROUGE-L or BLEU drops more than --max-drop below the
+baseline (the first config, or --baseline from an earlier run).
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import pandas as pd
+
+from autotune_threads import DEFAULT_MODEL
+from data_artifacts import file_sha256
+from eval_metrics import corpus_bleu, percentile, rouge_l, rouge_n
+from model_service import GENERATION_DEFAULTS
+from thread_config import physical_cores
+
+# Decoding settings to compare; beam4 matches the fine-tuning notebook's evaluation
+DECODING_PRESETS: Dict[str, Dict[str, Any]] = {
+    "beam4": {"do_sample": False, "num_beams": 4, "no_repeat_ngram_size": 3, "early_stopping": True},
+    "greedy": {"do_sample": False, "num_beams": 1},
+    "sampled": dict(GENERATION_DEFAULTS),
+}
+
+
+def parse_config(spec: str) -> Dict[str, Any]:
+    mode, _, decoding = spec.partition(":")
+    decoding = decoding or "beam4"
+    if mode not in ("pipeline", "optimized") or decoding not in DECODING_PRESETS:
+        raise ValueError(f"Bad config {spec!r}: expected pipeline|optimized:{'|'.join(DECODING_PRESETS)}")
+    return {"name": f"{mode}-{decoding}", "mode": mode, "decoding": decoding}
+
+
+def load_examples(path: str, input_col: str, target_col: str, limit: Optional[int] = None,
+                  seed: int = 42) -> List[Dict[str, Any]]:
+    df = pd.read_csv(path, usecols=[input_col, target_col]).dropna()
+    if limit and limit < len(df):
+        df = df.sample(n=limit, random_state=seed)
+    return [
+        {"id": int(idx), "input": str(row[input_col]), "reference": str(row[target_col])}
+        for idx, row in df.iterrows()
+    ]
+
+
+def length_buckets(examples: List[Dict[str, Any]], batch_size: int) -> List[List[Dict[str, Any]]]:
+    """Batches of similar input length, longest first"""
+    ordered = sorted(examples, key=lambda e: len(e["input"]), reverse=True)
+    return [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+
+def model_fingerprint(model_path: str) -> str:
+    """Changes when any file of the model directory is replaced"""
+    digest = hashlib.sha256(os.path.realpath(model_path).encode())
+    if os.path.isdir(model_path):
+        for root, dirs, files in os.walk(model_path):
+            dirs.sort()
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f"{os.path.relpath(os.path.join(root, name), model_path)}:{stat.st_size}:"
+                              f"{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def run_inputs(config: Dict[str, Any], args) -> Dict[str, Any]:
+    """Everything a config's predictions depend on"""
+    return {
+        "mode": config["mode"],
+        "decoding": config["decoding"],
+        "model": os.path.realpath(args.model),
+        "model_fingerprint": model_fingerprint(args.model),
+        "data": os.path.realpath(args.data),
+        "data_sha256": file_sha256(args.data),
+        "input_col": args.input_col,
+        "target_col": args.target_col,
+        "max_length": args.max_length,
+        "raw": args.raw,
+    }
+
+
+def read_rows(config_dir: str) -> List[Dict[str, Any]]:
+    rows = []
+    if not os.path.isdir(config_dir):
+        return rows
+    for name in sorted(os.listdir(config_dir)):
+        if not name.endswith(".jsonl"):
+            continue
+        with open(os.path.join(config_dir, name)) as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # Partial line from an interrupted run; that example is redone
+                    continue
+    return rows
+
+
+def _eval_worker(worker: int, threads: int, model_path: str, config: Dict[str, Any],
+                 batches: List[List[Dict[str, Any]]], max_length: int, raw: bool, out_path: str):
+    os.environ["OMP_NUM_THREADS"] = os.environ["MKL_NUM_THREADS"] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    from model_service import MedicalModel
+
+    model = MedicalModel(model_path, mode=config["mode"])
+    decoding = DECODING_PRESETS[config["decoding"]]
+    with open(out_path, "a") as out:
+        for batch in batches:
+            t0 = time.perf_counter()
+            predictions = model.generate_batch([e["input"] for e in batch], raw=raw,
+                                               max_length=max_length, **decoding)
+            elapsed = time.perf_counter() - t0
+            for example, prediction in zip(batch, predictions):
+                tokens = len(model.tokenizer(prediction, add_special_tokens=False)["input_ids"])
+                out.write(json.dumps({
+                    **example,
+                    "prediction": prediction,
+                    "output_tokens": tokens,
+                    "latency_s": round(elapsed, 4),
+                    "batch_size": len(batch),
+                    "worker": worker,
+                }) + "\n")
+            out.flush()
+
+
+def run_config(config: Dict[str, Any], examples: List[Dict[str, Any]], args) -> List[Dict[str, Any]]:
+    inputs = run_inputs(config, args)
+    key = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:12]
+    config_dir = os.path.join(args.out, f"{config['name']}-{key}")
+    os.makedirs(config_dir, exist_ok=True)
+    with open(os.path.join(config_dir, "inputs.json"), "w") as f:
+        json.dump(inputs, f, indent=2)
+    done: Set[int] = {row["id"] for row in read_rows(config_dir)}
+    todo = [e for e in examples if e["id"] not in done]
+    print(f"{config['name']}: {len(done)} done, {len(todo)} to go", flush=True)
+
+    if todo:
+        batches = length_buckets(todo, args.batch_size)
+        workers = max(1, min(args.workers, len(batches)))
+        threads = max(1, len(physical_cores()) // workers)
+        ctx = mp.get_context("spawn")
+        procs = []
+        for worker in range(workers):
+            out_path = os.path.join(config_dir, f"part-{worker}.jsonl")
+            proc = ctx.Process(target=_eval_worker, args=(
+                worker, threads, args.model, config, batches[worker::workers],
+                args.max_length, args.raw, out_path,
+            ))
+            proc.start()
+            procs.append(proc)
+        for proc in procs:
+            proc.join()
+        failed = [proc.exitcode for proc in procs if proc.exitcode]
+        if failed:
+            raise RuntimeError(f"{config['name']}: {len(failed)} worker(s) failed; rerun to resume")
+
+    wanted = {e["id"] for e in examples}
+    return [row for row in read_rows(config_dir) if row["id"] in wanted]
+
+
+def summarize(config: Dict[str, Any], rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    predictions = [row["prediction"] for row in rows]
+    references = [row["reference"] for row in rows]
+    latencies = [row["latency_s"] for row in rows]
+    # A batch's time is shared by its examples
+    compute_s = sum(row["latency_s"] / row["batch_size"] for row in rows)
+    tokens = sum(row["output_tokens"] for row in rows)
+    return {
+        **config,
+        "examples": len(rows),
+        "rouge1": round(statistics.mean(map(rouge_n, predictions, references)), 4),
+        "rouge2": round(statistics.mean(rouge_n(p, r, 2) for p, r in zip(predictions, references)), 4),
+        "rougeL": round(statistics.mean(map(rouge_l, predictions, references)), 4),
+        "bleu": round(corpus_bleu(predictions, references), 4),
+        "tokens_per_s": round(tokens / compute_s, 2) if compute_s else 0.0,
+        "p50_latency_s": round(percentile(latencies, 0.5), 4),
+        "p95_latency_s": round(percentile(latencies, 0.95), 4),
+    }
+
+
+def quality_gate(summaries: List[Dict[str, Any]], baseline: Dict[str, Any], max_drop: float) -> List[str]:
+    failures = []
+    for summary in summaries:
+        for metric in ("rougeL", "bleu"):
+            drop = baseline[metric] - summary[metric]
+            if drop > max_drop:
+                failures.append(f"{summary['name']}: {metric} {summary[metric]} is {drop:.4f} below "
+                                f"baseline {baseline['name']} ({baseline[metric]})")
+    return failures
+
+
+def write_markdown(path: str, summaries: List[Dict[str, Any]], baseline: Dict[str, Any], failures: List[str]):
+    lines = [
+        "# Evaluation summary",
+        "",
+        f"Baseline: {baseline['name']}",
+        "",
+        "| config | examples | ROUGE-1 | ROUGE-2 | ROUGE-L | BLEU | tokens/s | p50 (s) | p95 (s) |",
+        "|---|---|---|---|---|---|---|---|---|",
+    ]
+    for s in summaries:
+        lines.append(f"| {s['name']} | {s['examples']} | {s['rouge1']} | {s['rouge2']} | {s['rougeL']} | "
+                     f"{s['bleu']} | {s['tokens_per_s']} | {s['p50_latency_s']} | {s['p95_latency_s']} |")
+    lines += ["", "Quality gate: " + ("FAILED" if failures else "passed")]
+    lines += [f"- {failure}" for failure in failures]
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate model quality and speed per backend/decoding config")
+    parser.add_argument("--data", required=True, help="held-out CSV")
+    parser.add_argument("--input-col", default="Patient")
+    parser.add_argument("--target-col", default="Doctor")
+    parser.add_argument("--configs", default="pipeline:beam4", help="comma-separated <mode>:<decoding>")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--limit", type=int, help="evaluate a fixed random sample of this many rows")
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--raw", action="store_true",
+                        help="feed inputs as-is (as in fine-tuning) instead of wrapping them in the chat prompt")
+    parser.add_argument("--baseline", help="summary.json of an earlier run to gate against")
+    parser.add_argument("--max-drop", type=float, default=0.02,
+                        help="largest allowed absolute drop in ROUGE-L or BLEU")
+    parser.add_argument("--out", default="eval_runs")
+    args = parser.parse_args()
+
+    configs = [parse_config(spec.strip()) for spec in args.configs.split(",") if spec.strip()]
+    examples = load_examples(args.data, args.input_col, args.target_col, args.limit)
+    summaries = [summarize(config, run_config(config, examples, args)) for config in configs]
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            previous = json.load(f)
+        baseline = previous.get("baseline") or previous["configs"][0]
+    else:
+        baseline = summaries[0]
+    failures = quality_gate(summaries, baseline, args.max_drop)
+
+    report = {
+        "data": args.data,
+        "examples": len(examples),
+        "raw_inputs": args.raw,
+        "baseline": baseline,
+        "configs": summaries,
+        "max_drop": args.max_drop,
+        "failures": failures,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(args.out, "summary.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    write_markdown(os.path.join(args.out, "summary.md"), summaries, baseline, failures)
+    print(open(os.path.join(args.out, "summary.md")).read())
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
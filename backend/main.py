@@ -1,20 +1,40 @@
 from fastapi import FastAPI, Depends, HTTPException, status, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from starlette.middleware.sessions import SessionMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import Body
-import pandas as pd
 import uuid
 import traceback
 import re
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Union
 import secrets
 from pydantic import BaseModel
+import io
 import os
+import math
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+# Size torch thread pools for this worker before the model is imported and loaded
+from thread_config import apply_thread_config
+thread_settings = apply_thread_config()
 
 # Import model service and formatter
 from model_service import MedicalModel
 from response_formatter import format_medical_response
+from quiz_service import health_assessment
+from adaptive_quiz import AdaptiveSession
+from serving_state import ReloadInProgress, ServingState, ServingStateManager
+from medical_history import MedicalHistoryStore
+from scheduler import AdmissionController, FairScheduler, QueueFull
+from red_flags import red_flag_detector
+from request_profiler import request_profiler
+from degradation import HIGH_LOAD_MESSAGE, DegradationController
+from semantic_cache import SemanticCache
+from traffic_capture import TrafficCaptureMiddleware, TrafficRecorder
+from model_registry import DEFAULT_MODEL_NAME, ModelRegistry, model_memory_bytes
+from batch_jobs import read_records, resolve_batch_path, run_batch_job
 
 # Secret key for sessions
 SECRET_KEY = secrets.token_urlsafe(32)
@@ -34,6 +54,12 @@ app.add_middleware(
     secret_key=SECRET_KEY,
     max_age=3600,
 )
+
+# Opt-in (MEDBOT_CAPTURE_DIR) anonymized capture of /chat and /quiz traffic for replay_traffic.py
+traffic_recorder = TrafficRecorder.from_env()
+if traffic_recorder is not None:
+    app.add_middleware(TrafficCaptureMiddleware, recorder=traffic_recorder)
+
 conversations: Dict[str, List[Dict[str, str]]] = {} 
 
 class ChatMessage(BaseModel):
@@ -53,6 +79,23 @@ class MessageRequest(BaseModel):
 class SymptomsRequest(BaseModel):
     symptoms: List[str]
 
+class HistoryEntryRequest(BaseModel):
+    symptoms: List[str]
+    possible_diseases: List[Any] = []
+    timestamp: Optional[str] = None
+
+class AssessmentRequest(BaseModel):
+    # question id -> one option, or a list of options for multi-select
+    answers: Dict[str, Union[str, List[str]]]
+
+class ProfileRequest(BaseModel):
+    requests: Optional[int] = None
+    seconds: Optional[float] = None
+    torch: bool = True
+
+class AssessmentBatchRequest(BaseModel):
+    sessions: List[Dict[str, Union[str, List[str]]]]
+
 # Hardcoded demo user
 DEMO_USER = {
     "id": 1,
@@ -61,14 +104,101 @@ DEMO_USER = {
     "password": "123",
 }
 
-# Load model and data
-model = MedicalModel("../models/biobart-v2-medical-chatbot-final")
-disease_data = pd.read_csv("../data/disease_symp_cleaned.csv")
-doctors_data = pd.read_csv("../data/all_doc_data_cleaned.csv")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "../data")
+
+MODEL_PATH = os.path.join(BASE_DIR, "../models/biobart-v2-medical-chatbot-final")
+
+# Load model and data (binary artifacts from data_artifacts.py, CSVs as a fallback)
+# as one versioned state that /admin/reload or the file watcher can swap without downtime
+serving = ServingStateManager(DATA_DIR, MODEL_PATH, MedicalModel)
+serving.load()
+# Extra checkpoints selectable per /chat request, loaded on first use within a RAM budget
+model_registry = ModelRegistry.from_env(BASE_DIR, MedicalModel,
+                                        reserved=lambda: model_memory_bytes(serving.current.model))
+model_registry.preload_pinned()
+ADMIN_TOKEN = os.environ.get("MEDBOT_ADMIN_TOKEN")
+RELOAD_POLL_SECONDS = float(os.environ.get("MEDBOT_RELOAD_POLL", "0"))
 
 # In-memory stores
 dconversations: Dict[str, Any] = {}
 user_medical_history: Dict[int, List[str]] = {}
+history_store = MedicalHistoryStore()
+
+# Per-user admission control and fair scheduling for model inference
+admission = AdmissionController(
+    user_rate=float(os.environ.get("MEDBOT_USER_RATE", "0.5")),
+    user_burst=float(os.environ.get("MEDBOT_USER_BURST", "5")),
+    session_rate=float(os.environ.get("MEDBOT_SESSION_RATE", "0.5")),
+    session_burst=float(os.environ.get("MEDBOT_SESSION_BURST", "3")),
+)
+inference_scheduler = FairScheduler(
+    concurrency=int(os.environ.get("MEDBOT_INFERENCE_CONCURRENCY", "1")),
+    max_queue_per_user=int(os.environ.get("MEDBOT_MAX_QUEUE_PER_USER", "2")),
+)
+
+# Reuses model answers for paraphrased messages (None when disabled or the encoder is unavailable)
+semantic_cache = SemanticCache.from_env()
+
+# Bulk pre-screening: server-local inputs must live under BATCH_DIR
+BATCH_DIR = os.environ.get("MEDBOT_BATCH_DIR", os.path.join(DATA_DIR, "batch"))
+BATCH_SIZE = int(os.environ.get("MEDBOT_BATCH_SIZE", "16"))
+BATCH_WINDOW = int(os.environ.get("MEDBOT_BATCH_WINDOW", "256"))
+# Scheduler key for batch jobs; user ids are always strings, so a tuple can never collide with one
+BATCH_SCHEDULER_KEY = ("internal", "batch")
+
+# Steps /chat down to cheaper generation (and finally table-only answers) when latency nears the SLO
+degradation = DegradationController.from_env()
+
+@app.on_event("startup")
+async def start_scheduler():
+    inference_scheduler.start()
+    if RELOAD_POLL_SECONDS > 0:
+        task = asyncio.create_task(serving.watch(RELOAD_POLL_SECONDS))
+        background_tasks.add(task)
+
+@app.on_event("shutdown")
+def close_traffic_capture():
+    if traffic_recorder is not None:
+        traffic_recorder.close()
+
+# Model elaborations for red-flag replies, filled in after the immediate guidance
+elaborations: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+MAX_ELABORATIONS = 1000
+background_tasks = set()
+
+async def elaborate_red_flag(elaboration_id: str, user_id: str, message: str):
+    try:
+        with serving.acquire() as state:
+            model_response = await inference_scheduler.submit(user_id, state.model.generate_response, message)
+        elaborations[elaboration_id] = {"status": "done", "response": format_medical_response(model_response)}
+    except Exception as e:
+        print(f"Elaboration error: {e}")
+        elaborations[elaboration_id] = {"status": "failed", "response": None}
+
+def start_elaboration(user_id: str, message: str) -> str:
+    elaboration_id = str(uuid.uuid4())
+    elaborations[elaboration_id] = {"status": "pending", "response": None}
+    while len(elaborations) > MAX_ELABORATIONS:
+        elaborations.popitem(last=False)
+    task = asyncio.create_task(elaborate_red_flag(elaboration_id, user_id, message))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return elaboration_id
+
+def too_many_requests(retry_after: float, detail: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        content={"detail": detail},
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+# Admin endpoints are disabled unless MEDBOT_ADMIN_TOKEN is set
+def require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not secrets.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid admin token")
 
 # Utility: get current user from session
 def get_current_user(request: Request):
@@ -77,42 +207,123 @@ def get_current_user(request: Request):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     return user
 
-# Utility: derive possible diseases from symptoms
-# Now with robust error handling and string conversion
-def get_possible_diseases(symptoms: List[str]) -> List[Dict[str, str]]:
+# Chat messages naming at least this many known symptoms are answered from the disease table
+MIN_STRUCTURED_SYMPTOMS = int(os.environ.get("MEDBOT_MIN_STRUCTURED_SYMPTOMS", "2"))
+
+def ranked_with_details(symptoms: List[str], state: ServingState, k: int = 3) -> List[Dict[str, Any]]:
+    """Top-k ranked diseases with their description and precautions"""
+    ranked = state.disease_ranker.rank([str(s) for s in symptoms], k=k)
+    for entry in ranked:
+        details = state.disease_details.get(entry["disease"], {})
+        entry["description"] = details.get("descriptions")
+        entry["precautions"] = details.get("precautions")
+    return ranked
+
+@asynccontextmanager
+async def chat_model(name: str, state: ServingState):
+    """(model, version) to answer with: the serving state's own, or a registry model held for the request"""
+    if name == DEFAULT_MODEL_NAME:
+        yield state.model, state.model_version
+        return
+    model = await asyncio.to_thread(model_registry.checkout, name)
     try:
-        # Lowercase-symptom match against stringified Symptoms column
-        def match_row(cell: Any) -> bool:
-            text = str(cell).lower()
-            return all(sym.lower() in text for sym in symptoms)
-
-        matched = disease_data[disease_data['symptoms'].apply(match_row)]
-        if matched.empty:
-            return [{"disease": "Unknown", "description": "No matches found."}]
-
-        # Optionally sort by a Probability column if it exists
-        if 'Probability' in matched.columns:
-            top = matched.nlargest(3, 'Probability')
-        else:
-            top = matched.head(3)
-
-        # Rename columns to expected keys
-        result = top.rename(columns={'diseases': 'disease', 'descriptions': 'description'})
-        return result[['disease', 'description']].to_dict(orient='records')
-
-    except Exception as e:
-        # Log and rethrow as HTTPException
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error processing symptoms: {str(e)}"
-        )
+        yield model, name
+    finally:
+        model_registry.release(name)
 
 # Health check
 @app.get("/")
 async def health_check():
     return {"status": "ok"}
 
+# Operational metrics
+@app.get("/metrics/scheduler")
+def scheduler_metrics():
+    return {**inference_scheduler.stats(), "throttled": admission.throttled}
+
+@app.get("/metrics/degradation")
+def degradation_metrics():
+    return degradation.stats()
+
+@app.get("/metrics/cache")
+def cache_metrics():
+    if semantic_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **semantic_cache.stats()}
+
+@app.get("/metrics/threads")
+def thread_metrics():
+    model = serving.current.model
+    return {
+        **thread_settings,
+        "torch_mode": model.mode,
+        "attention": model.attention,
+        "bf16_autocast": model.autocast_dtype is not None,
+        "compiled": model.compiled,
+    }
+
+@app.get("/metrics/models")
+def model_metrics():
+    """Registry models: resident size, loads/evictions, per-model latency and recent load/evict events"""
+    return model_registry.stats()
+
+@app.get("/metrics/assisted")
+def assisted_metrics():
+    """Draft-model acceptance for assisted greedy generation"""
+    return serving.current.model.assisted_stats()
+
+# Hot reload of data tables and (optionally) the model checkpoint
+@app.post("/admin/reload", status_code=202)
+async def trigger_reload(reload_model: Optional[bool] = None, _: None = Depends(require_admin)):
+    if serving.reloading:
+        raise HTTPException(status_code=409, detail="A reload is already in progress")
+
+    async def run_reload():
+        try:
+            await asyncio.to_thread(serving.reload, reload_model)
+        except ReloadInProgress:
+            pass
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Reload failed, still serving {serving.current.version}: {e}")
+
+    task = asyncio.create_task(run_reload())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return {"status": "reloading", "version": serving.current.version}
+
+@app.get("/admin/reload")
+def reload_status(_: None = Depends(require_admin)):
+    return serving.status()
+
+# On-demand profiling of the next N /chat requests or T seconds
+@app.post("/admin/profile")
+def arm_profiler(request: ProfileRequest, _: None = Depends(require_admin)):
+    try:
+        request_profiler.arm(request.requests, request.seconds, request.torch)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return request_profiler.status()
+
+@app.get("/admin/profile")
+def profiler_status(_: None = Depends(require_admin)):
+    return request_profiler.status()
+
+@app.delete("/admin/profile")
+def disarm_profiler(_: None = Depends(require_admin)):
+    request_profiler.disarm()
+    return request_profiler.status()
+
+@app.get("/admin/profile/download")
+def download_profile(format: str = "zip", _: None = Depends(require_admin)):
+    if not request_profiler.captures:
+        raise HTTPException(status_code=404, detail="No profiled requests yet")
+    if format == "folded":
+        return Response(request_profiler.folded(), media_type="text/plain",
+                        headers={"Content-Disposition": "attachment; filename=chat.folded"})
+    return Response(request_profiler.bundle(), media_type="application/zip",
+                    headers={"Content-Disposition": "attachment; filename=chat_profile.zip"})
+
 # Auth endpoints
 @app.post("/login")
 async def login(request: Request, creds: LoginRequest):
@@ -134,6 +345,14 @@ async def logout(request: Request):
 
 @app.post("/chat")
 async def chat_with_bot(request_data: dict = Body(...)):
+    # None unless an admin armed /admin/profile
+    capture = request_profiler.start("/chat")
+    try:
+        return await chat_response(request_data, capture)
+    finally:
+        request_profiler.finish(capture)
+
+async def chat_response(request_data: dict, capture=None):
     try:
         # Extract fields manually
         user_id = request_data.get("user_id")
@@ -153,6 +372,46 @@ async def chat_with_bot(request_data: dict = Body(...)):
                 content={"detail": "message is required"}
             )
 
+        model_name = request_data.get("model") or DEFAULT_MODEL_NAME
+        if model_name not in model_registry.names():
+            return JSONResponse(
+                status_code=422,
+                content={"detail": f"Unknown model {model_name!r}, available: {model_registry.names()}"}
+            )
+
+        user_id = str(user_id)
+        version = serving.current.version
+
+        # Emergency fast lane: answer immediately, skipping admission and the inference queue
+        red_flag = request_profiler.call(capture, red_flag_detector.detect, message)
+        if red_flag:
+            bot_response = red_flag.guidance()
+            conversations.setdefault(user_id, []).extend([
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": bot_response},
+            ])
+            response = {
+                "response": bot_response,
+                "conversation_id": conversation_id or str(uuid.uuid4()),
+                "red_flag": red_flag.as_dict(),
+                "version": version,
+            }
+            # The guidance is never throttled, but the model elaboration it can queue is
+            if request_data.get("elaborate"):
+                if admission.admit(user_id, conversation_id) > 0:
+                    response["elaboration_id"] = None
+                    response["elaboration_skipped"] = "Rate limit exceeded"
+                else:
+                    response["elaboration_id"] = start_elaboration(user_id, message)
+            return response
+
+        extraction, structured, cached_similarity = None, False, None
+
+        # Throttle before doing any work for this request
+        retry_after = admission.admit(user_id, conversation_id)
+        if retry_after > 0:
+            return too_many_requests(retry_after, "Rate limit exceeded, please slow down")
+
         # Initialize conversation if not present
         if user_id not in conversations:
             conversations[user_id] = []
@@ -161,9 +420,51 @@ async def chat_with_bot(request_data: dict = Body(...)):
         conversations[user_id].append({"role": "user", "content": message})
 
         try:
-            # Get response from medical model
-            model_response = model.generate_response(message)  # Adjust method name as needed
-            bot_response = format_medical_response(model_response)
+            # The request stays on this version even if a reload swaps in a new one
+            with serving.acquire() as state:
+                version = state.version
+                extraction = request_profiler.call(capture, state.symptom_extractor.extract, message)
+                symptoms = extraction.symptoms
+                predictions = ranked_with_details(symptoms, state) if symptoms else None
+                level = degradation.update(inference_scheduler.queue_depth(), inference_scheduler.concurrency)
+                overrides = degradation.generation_overrides()
+                # Under heavy load (overrides None) a single symptom is enough for the table answer
+                structured = bool(predictions) and (len(symptoms) >= MIN_STRUCTURED_SYMPTOMS or overrides is None)
+                if structured:
+                    # Enough symptoms to answer from the disease table, no model call needed
+                    model_response = ""
+                elif overrides is None:
+                    model_response = HIGH_LOAD_MESSAGE
+                else:
+                    async with chat_model(model_name, state) as (model, model_version):
+                        lookup = None
+                        if semantic_cache is not None:
+                            # Same model and same (negated) symptoms, so a close paraphrase can share the answer
+                            cache_key = (model_version, tuple(sorted(symptoms)), tuple(sorted(extraction.negated)))
+                            lookup = await asyncio.to_thread(
+                                request_profiler.wrap(capture, semantic_cache.lookup), message, cache_key)
+                        if lookup is not None and lookup.hit:
+                            model_response = lookup.answer
+                            cached_similarity = round(lookup.similarity, 4)
+                        else:
+                            # Get response from medical model, queued fairly across users,
+                            # with shorter or greedy decoding when degraded
+                            generate = degradation.timed(model_registry.timed(
+                                model_name, request_profiler.wrap(capture, model.generate_response)))
+                            model_response = await inference_scheduler.submit(user_id, generate, message, **overrides)
+                            if lookup is not None and not overrides:
+                                # Only full-quality answers are worth reusing; storing may need an
+                                # encoder pass, so it runs after the reply instead of before it
+                                task = asyncio.create_task(asyncio.to_thread(semantic_cache.store, lookup, model_response))
+                                background_tasks.add(task)
+                                task.add_done_callback(background_tasks.discard)
+                bot_response = request_profiler.call(
+                    capture, format_medical_response, model_response,
+                    symptoms=symptoms or None, doctor_data=state.doctors_data, predictions=predictions,
+                )
+        except QueueFull:
+            conversations[user_id].pop()
+            return too_many_requests(1, "Too many requests in flight for this user")
         except Exception as e:
             print(f"Model error: {e}")
             # Fallback if model fails
@@ -178,46 +479,180 @@ async def chat_with_bot(request_data: dict = Body(...)):
 
         return {
             "response": bot_response,
-            "conversation_id": conversation_id
+            "conversation_id": conversation_id,
+            "version": version,
+            "model": model_name,
+            "symptoms": extraction.as_dict() if extraction else None,
+            "structured": structured,
+            "cached": cached_similarity,
+            "degradation": degradation.as_dict(),
         }
 
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Chatbot failed to respond: {str(e)}")
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-data_path = os.path.join(BASE_DIR, "../data/disease_symp_cleaned.csv")
+# Model answer queued behind a red-flag reply
+@app.get("/chat/elaboration/{elaboration_id}")
+def get_elaboration(elaboration_id: str):
+    elaboration = elaborations.get(elaboration_id)
+    if elaboration is None:
+        raise HTTPException(status_code=404, detail="Elaboration not found")
+    return elaboration
+
+# Bulk NDJSON pre-screening. Nothing here touches conversations or medical history.
+
+def screen_results(messages: List[str], replies: List[str], state: ServingState) -> List[Dict[str, Any]]:
+    """Red flags, extracted symptoms, ranking and the formatted reply for each message"""
+    results = []
+    for message, reply in zip(messages, replies):
+        red_flag = red_flag_detector.detect(message)
+        extraction = state.symptom_extractor.extract(message)
+        predictions = ranked_with_details(extraction.symptoms, state) if extraction.symptoms else None
+        results.append({
+            "response": format_medical_response(reply, symptoms=extraction.symptoms or None,
+                                                doctor_data=state.doctors_data, predictions=predictions),
+            "symptoms": extraction.as_dict(),
+            "possible_diseases": [p["disease"] for p in predictions or []],
+            "red_flag": red_flag.as_dict() if red_flag else None,
+            "version": state.version,
+        })
+    return results
+
+async def screen_batch(messages: List[str]) -> List[Dict[str, Any]]:
+    """One length-sorted batch through the model, queued behind interactive /chat traffic"""
+    with serving.acquire() as state:
+        # Cost per message, so the batch job gets no more than its fair share of the model
+        replies = await inference_scheduler.submit(BATCH_SCHEDULER_KEY, state.model.generate_batch, messages,
+                                                   cost=len(messages))
+        # Extraction and formatting of a whole batch would stall the event loop
+        return await asyncio.to_thread(screen_results, messages, replies, state)
+
+@app.post("/chat/batch")
+async def chat_batch(request: Request, path: Optional[str] = None, offset: int = 0,
+                     batch_size: int = BATCH_SIZE, _: None = Depends(require_admin)):
+    """
+    Pre-screen an NDJSON file of {"id", "message"} lines: either the request body
+    (raw NDJSON or a multipart "file" upload) or `path`, relative to MEDBOT_BATCH_DIR.
+    Results stream back as NDJSON with progress lines; pass the last resume_offset
+    as `offset` to continue an interrupted job.
+    """
+    if offset < 0 or batch_size < 1:
+        raise HTTPException(status_code=422, detail="offset must be >= 0 and batch_size >= 1")
+    if path:
+        try:
+            source = await asyncio.to_thread(open, resolve_batch_path(path, BATCH_DIR), "rb")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"Batch file not found: {path}")
+    elif request.headers.get("content-type", "").startswith("multipart/form-data"):
+        upload = (await request.form()).get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=422, detail="multipart upload needs a \"file\" field")
+        source = upload.file
+    else:
+        source = io.BytesIO(await request.body())
+
+    async def stream():
+        try:
+            async for line in run_batch_job(read_records(source, offset), screen_batch, offset,
+                                            batch_size=batch_size, window=max(BATCH_WINDOW, batch_size)):
+                yield line
+        finally:
+            source.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
-disease_df = pd.read_csv(data_path)
 class QuizRequest(BaseModel):
     symptoms: list
-# Quiz endpoint
-@app.post("/quiz")
-def get_possible_diseases(request: QuizRequest):
-    # Get the symptoms from the request
-    symptoms = request.symptoms
-    matched_diseases = []
-
-    # Iterate through the disease dataframe
-    for _, row in disease_df.iterrows():
-        disease_symptoms = row["symptoms"].split(",")
-        match_count = sum(1 for s in symptoms if s.lower() in map(str.lower, disease_symptoms))
 
-        if match_count > 0:
-            matched_diseases.append({
-                "disease": row["diseases"],
-                "match_count": match_count,
-                "description": row["descriptions"],
-                "precautions": row["precautions"]
-            })
-
-    # Sort by match count
-    matched_diseases = sorted(matched_diseases, key=lambda x: x["match_count"], reverse=True)
+class AdaptiveStartRequest(BaseModel):
+    symptoms: List[str] = []
+
+class AdaptiveAnswerRequest(BaseModel):
+    session_id: str
+    symptom: str
+    answer: str  # yes / no / unsure
+
+def adaptive_quiz_state(session: AdaptiveSession, state: ServingState) -> Dict[str, Any]:
+    """Next question for the session, or the final ranking once the quiz has converged"""
+    adaptive_quiz = state.adaptive_quiz
+    question = adaptive_quiz.next_question(session)
+    top = adaptive_quiz.top_diseases(session)
+    for entry in top:
+        details = state.disease_details.get(entry["disease"], {})
+        entry["description"] = details.get("descriptions")
+        entry["precautions"] = details.get("precautions")
+    if question is None:
+        adaptive_quiz.end(session.session_id)
+    return {
+        "session_id": session.session_id,
+        "question": question,
+        "done": question is None,
+        "questions_asked": session.questions_asked,
+        "possible_diseases": top,
+        "version": state.version,
+    }
 
-    if not matched_diseases:
-        return {"possible_diseases": ["No disease matched your symptoms."]}
+# Adaptive quiz endpoints
+@app.post("/quiz/adaptive/start")
+def start_adaptive_quiz(request: AdaptiveStartRequest):
+    with serving.acquire() as state:
+        session = state.adaptive_quiz.start(request.symptoms)
+        return adaptive_quiz_state(session, state)
+
+@app.post("/quiz/adaptive/answer")
+def answer_adaptive_quiz(request: AdaptiveAnswerRequest):
+    with serving.acquire() as state:
+        session = state.adaptive_quiz.get_session(request.session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Quiz session not found or already finished")
+        try:
+            state.adaptive_quiz.answer(session, request.symptom, request.answer)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except KeyError:
+            raise HTTPException(status_code=422, detail=f"Unknown symptom: {request.symptom}")
+        return adaptive_quiz_state(session, state)
+
+# Symptom catalogue for the quiz picker
+@app.get("/quiz/symptoms")
+def get_quiz_symptoms():
+    return {"symptoms": serving.current.symptom_matrix.symptoms}
 
-    return {"possible_diseases": matched_diseases[:3]}  # Return top 3
+# Quiz endpoint
+@app.post("/quiz")
+def quiz_possible_diseases(request: QuizRequest):
+    with serving.acquire() as state:
+        # Score the symptoms against the precomputed log-likelihood matrix
+        ranked = ranked_with_details(request.symptoms, state)
+
+        if not ranked:
+            return {"possible_diseases": ["No disease matched your symptoms."], "version": state.version}
+
+        return {"possible_diseases": ranked, "version": state.version}  # Return top 3
+
+# Health assessment endpoints
+@app.get("/assessment/questions")
+def get_assessment_questions():
+    return {"questions": [q.model_dump() for q in health_assessment.questions]}
+
+@app.post("/assessment")
+def score_assessment(request: AssessmentRequest):
+    result = health_assessment.analyze_answers(request.answers)
+    follow_ups = {}
+    for q_id, answer in request.answers.items():
+        for option in ([answer] if isinstance(answer, str) else answer):
+            questions = health_assessment.get_follow_up_questions(q_id, option)
+            if questions:
+                follow_ups[option] = questions
+    result["follow_up_questions"] = follow_ups
+    return result
+
+@app.post("/assessment/batch")
+def score_assessment_batch(request: AssessmentBatchRequest):
+    return {"results": health_assessment.analyze_batch(request.sessions)}
 
 # User conversations
 @app.get("/user/conversations")
@@ -237,6 +672,28 @@ async def update_history(history: List[str], user: dict = Depends(get_current_us
     user_medical_history[user['id']] = history
     return {'status': 'success'}
 
+# Persistent history with incrementally maintained aggregates
+@app.post("/user/history/entries")
+def add_history_entry(entry: HistoryEntryRequest, user: dict = Depends(get_current_user)):
+    try:
+        entry_id = history_store.add_entry(user['id'], entry.symptoms, entry.possible_diseases, entry.timestamp)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {'status': 'success', 'id': entry_id}
+
+@app.get("/user/history/entries")
+def get_history_entries(page: int = 1, page_size: int = 10, user: dict = Depends(get_current_user)):
+    return history_store.get_page(user['id'], page, min(max(page_size, 1), 100))
+
+@app.get("/user/history/summary")
+def get_history_summary(user: dict = Depends(get_current_user)):
+    return history_store.get_summary(user['id'])
+
+@app.delete("/user/history/entries")
+def clear_history_entries(user: dict = Depends(get_current_user)):
+    history_store.clear(user['id'])
+    return {'status': 'success'}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="localhost", port=8000)
\ No newline at end of file
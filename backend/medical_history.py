@@ -1,35 +1,218 @@
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
 
-def save_medical_history(history_entry):
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB_PATH = os.environ.get("MEDBOT_HISTORY_DB", os.path.join(BASE_DIR, "medical_assistant.db"))
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _condition_name(entry: Any) -> Optional[str]:
+    """Disease name from a /quiz result entry (dict or plain string)"""
+    name = entry.get("disease") if isinstance(entry, dict) else entry
+    if not name or name == "No disease matched your symptoms.":
+        return None
+    return str(name)
+
+
+class MedicalHistoryStore:
+    """
+    Per-user medical history in SQLite.
+
+    Besides the raw entries, every write updates running aggregates (symptom
+    counts, condition counts per day and overall, last-seen timestamps) in the
+    same transaction, so the dashboard summary is a few indexed lookups no
+    matter how long the history gets.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.executescript('''
+            CREATE TABLE IF NOT EXISTS medical_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                timestamp TEXT,
+                symptoms TEXT,
+                possible_diseases TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_user ON medical_history (user_id, id);
+
+            CREATE TABLE IF NOT EXISTS history_user_stats (
+                user_id TEXT PRIMARY KEY,
+                entries INTEGER NOT NULL,
+                first_seen TEXT,
+                last_seen TEXT
+            );
+            CREATE TABLE IF NOT EXISTS history_symptom_stats (
+                user_id TEXT,
+                symptom TEXT,
+                count INTEGER NOT NULL,
+                last_seen TEXT,
+                PRIMARY KEY (user_id, symptom)
+            );
+            CREATE TABLE IF NOT EXISTS history_condition_stats (
+                user_id TEXT,
+                condition TEXT,
+                count INTEGER NOT NULL,
+                last_seen TEXT,
+                PRIMARY KEY (user_id, condition)
+            );
+            CREATE TABLE IF NOT EXISTS history_condition_daily (
+                user_id TEXT,
+                day TEXT,
+                condition TEXT,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (user_id, day, condition)
+            );
+            ''')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def add_entry(self, user_id: str, symptoms: Sequence[str], possible_diseases: Sequence[Any],
+                  timestamp: Optional[str] = None) -> int:
+        """Store one consultation and fold it into the user's aggregates; ValueError on a malformed timestamp"""
+        user_id = str(user_id)
+        if timestamp:
+            # Aggregates are keyed by day, so a client timestamp must parse before it is stored
+            try:
+                parsed = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+            except (TypeError, ValueError):
+                raise ValueError(f"timestamp must be formatted as {TIMESTAMP_FORMAT}, got {timestamp!r}")
+        else:
+            parsed = datetime.now()
+        timestamp = parsed.strftime(TIMESTAMP_FORMAT)
+        day = timestamp[:10]
+        symptoms = list(dict.fromkeys(str(s) for s in symptoms))
+        conditions = list(dict.fromkeys(filter(None, map(_condition_name, possible_diseases))))
+
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute('''
+                INSERT INTO medical_history (user_id, timestamp, symptoms, possible_diseases)
+                VALUES (?, ?, ?, ?)
+                ''', (user_id, timestamp, json.dumps(symptoms), json.dumps(list(possible_diseases))))
+                conn.execute('''
+                INSERT INTO history_user_stats (user_id, entries, first_seen, last_seen)
+                VALUES (?, 1, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    entries = entries + 1,
+                    first_seen = MIN(first_seen, excluded.first_seen),
+                    last_seen = MAX(last_seen, excluded.last_seen)
+                ''', (user_id, timestamp, timestamp))
+                conn.executemany('''
+                INSERT INTO history_symptom_stats (user_id, symptom, count, last_seen)
+                VALUES (?, ?, 1, ?)
+                ON CONFLICT (user_id, symptom) DO UPDATE SET
+                    count = count + 1,
+                    last_seen = MAX(last_seen, excluded.last_seen)
+                ''', [(user_id, s, timestamp) for s in symptoms])
+                conn.executemany('''
+                INSERT INTO history_condition_stats (user_id, condition, count, last_seen)
+                VALUES (?, ?, 1, ?)
+                ON CONFLICT (user_id, condition) DO UPDATE SET
+                    count = count + 1,
+                    last_seen = MAX(last_seen, excluded.last_seen)
+                ''', [(user_id, c, timestamp) for c in conditions])
+                conn.executemany('''
+                INSERT INTO history_condition_daily (user_id, day, condition, count)
+                VALUES (?, ?, ?, 1)
+                ON CONFLICT (user_id, day, condition) DO UPDATE SET count = count + 1
+                ''', [(user_id, day, c) for c in conditions])
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def get_page(self, user_id: str, page: int = 1, page_size: int = 10) -> Dict[str, Any]:
+        """One page of entries, newest first"""
+        user_id = str(user_id)
+        page = max(page, 1)
+        conn = self._connect()
+        try:
+            rows = conn.execute('''
+            SELECT id, timestamp, symptoms, possible_diseases FROM medical_history
+            WHERE user_id = ? ORDER BY id DESC LIMIT ? OFFSET ?
+            ''', (user_id, page_size, (page - 1) * page_size)).fetchall()
+            stats = conn.execute(
+                "SELECT entries FROM history_user_stats WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return {
+            "page": page,
+            "page_size": page_size,
+            "total": stats["entries"] if stats else 0,
+            "entries": [
+                {
+                    "id": row["id"],
+                    "timestamp": row["timestamp"],
+                    "symptoms": json.loads(row["symptoms"]),
+                    "possible_diseases": json.loads(row["possible_diseases"]),
+                }
+                for row in rows
+            ],
+        }
+
+    def get_summary(self, user_id: str, windows: Sequence[int] = (7, 30), top: int = 10) -> Dict[str, Any]:
+        """Precomputed aggregates: top symptoms, condition counts per window and overall"""
+        user_id = str(user_id)
+        conn = self._connect()
+        try:
+            stats = conn.execute(
+                "SELECT entries, first_seen, last_seen FROM history_user_stats WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            symptoms = conn.execute('''
+            SELECT symptom, count, last_seen FROM history_symptom_stats
+            WHERE user_id = ? ORDER BY count DESC, last_seen DESC LIMIT ?
+            ''', (user_id, top)).fetchall()
+            conditions = {
+                "all": [dict(row) for row in conn.execute('''
+                SELECT condition, count, last_seen FROM history_condition_stats
+                WHERE user_id = ? ORDER BY count DESC, last_seen DESC LIMIT ?
+                ''', (user_id, top))]
+            }
+            for days in windows:
+                since = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+                conditions[f"{days}d"] = [dict(row) for row in conn.execute('''
+                SELECT condition, SUM(count) AS count FROM history_condition_daily
+                WHERE user_id = ? AND day >= ? GROUP BY condition
+                ORDER BY count DESC LIMIT ?
+                ''', (user_id, since, top))]
+        finally:
+            conn.close()
+        return {
+            "total_entries": stats["entries"] if stats else 0,
+            "first_seen": stats["first_seen"] if stats else None,
+            "last_seen": stats["last_seen"] if stats else None,
+            "top_symptoms": [dict(row) for row in symptoms],
+            "conditions": conditions,
+        }
+
+    def clear(self, user_id: str):
+        """Delete a user's entries and aggregates"""
+        conn = self._connect()
+        try:
+            with conn:
+                for table in ("medical_history", "history_user_stats", "history_symptom_stats",
+                              "history_condition_stats", "history_condition_daily"):
+                    conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (str(user_id),))
+        finally:
+            conn.close()
+
+
+def save_medical_history(history_entry, store: Optional[MedicalHistoryStore] = None):
     """Save medical history to database"""
-    # Connect to your database (this is a placeholder)
-    # You might use SQLite, PostgreSQL, MongoDB, etc.
-    
-    # Example using SQLite
-    import sqlite3
-    conn = sqlite3.connect('medical_assistant.db')
-    cursor = conn.cursor()
-    
-    # Create table if it doesn't exist
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS medical_history (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id TEXT,
-        timestamp TEXT,
-        symptoms TEXT,
-        possible_diseases TEXT
-    )
-    ''')
-    
-    # Insert history entry
-    cursor.execute('''
-    INSERT INTO medical_history (user_id, timestamp, symptoms, possible_diseases)
-    VALUES (?, ?, ?, ?)
-    ''', (
+    store = store or MedicalHistoryStore()
+    return store.add_entry(
         history_entry["user_id"],
-        history_entry["timestamp"],
-        json.dumps(history_entry["symptoms"]),
-        json.dumps(history_entry["possible_diseases"])
-    ))
-    
-    conn.commit()
-    conn.close()
\ No newline at end of file
+        history_entry["symptoms"],
+        history_entry["possible_diseases"],
+        history_entry.get("timestamp"),
+    )
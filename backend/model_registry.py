@@ -0,0 +1,220 @@
+# model_registry.py
+"""
+Named chat models served side by side (A/B tests, per-tenant routing).
+
+MEDBOT_MODELS lists extra checkpoints as name=path[@mode], comma-separated,
+e.g. "distilled=../models/biobart-distilled,int8=../models/biobart-int8@optimized".
+A model is loaded on first use and its resident size recorded (weights and
+buffers, or the process RSS growth during the load if that is larger, as for
+dynamically quantized weights). When the total, including the default model
+that ServingStateManager owns, exceeds MEDBOT_MODEL_BUDGET_MB, the least
+recently used unpinned models not serving a request are evicted. Models named
+in MEDBOT_PINNED_MODELS are loaded at startup and never evicted.
+"""
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from eval_metrics import percentile
+
+DEFAULT_MODEL_NAME = "default"
+
+
+def parse_model_specs(spec: str, base_dir: str) -> Dict[str, Dict[str, Any]]:
+    """{"name": {"path": ..., "mode": ...}} from "name=path[@mode],..." (paths relative to base_dir)"""
+    models = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, sep, target = item.partition("=")
+        if not sep or not name or not target:
+            raise ValueError(f"Bad model spec {item!r}: expected name=path[@mode]")
+        path, _, mode = target.partition("@")
+        models[name.strip()] = {"path": os.path.join(base_dir, path.strip()), "mode": mode.strip() or None}
+    return models
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def model_memory_bytes(model: Any) -> int:
+    """Bytes of parameters and buffers of a MedicalModel's torch modules (main and draft)"""
+    total = 0
+    for module in (getattr(model, "model", None), getattr(model, "draft", None)):
+        if module is None or not hasattr(module, "parameters"):
+            continue
+        total += sum(t.numel() * t.element_size() for t in itertools.chain(module.parameters(), module.buffers()))
+    return total
+
+
+class _Entry:
+    def __init__(self, name: str):
+        self.name = name
+        self.model: Any = None
+        self.bytes = 0
+        self.refs = 0
+        self.loads = 0
+        self.evictions = 0
+        self.last_used: Optional[float] = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(self, specs: Dict[str, Dict[str, Any]], load_model: Callable[..., Any],
+                 budget_bytes: int = 0, pinned: Optional[List[str]] = None,
+                 reserved: Optional[Callable[[], int]] = None):
+        self.specs = specs
+        self.load_model = load_model
+        self.budget_bytes = budget_bytes
+        self.pinned = set(pinned or [])
+        # Memory held outside the registry (the default model), counted against the budget
+        self.reserved = reserved or (lambda: 0)
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict((name, _Entry(name)) for name in specs)
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {}
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=200)
+
+    @classmethod
+    def from_env(cls, base_dir: str, load_model: Callable[..., Any],
+                 reserved: Optional[Callable[[], int]] = None) -> "ModelRegistry":
+        return cls(
+            parse_model_specs(os.environ.get("MEDBOT_MODELS", ""), base_dir),
+            load_model,
+            budget_bytes=int(float(os.environ.get("MEDBOT_MODEL_BUDGET_MB", "0")) * 1024 * 1024),
+            pinned=[n.strip() for n in os.environ.get("MEDBOT_PINNED_MODELS", "").split(",") if n.strip()],
+            reserved=reserved,
+        )
+
+    def names(self) -> List[str]:
+        return [DEFAULT_MODEL_NAME, *self.specs]
+
+    def _event(self, event: str, name: str, **details: Any):
+        entry = {"event": event, "model": name, "at": time.strftime("%Y-%m-%dT%H:%M:%S"), **details}
+        self.events.append(entry)
+        print(f"Model {event}: {name} {details}")
+
+    def resident_bytes(self) -> int:
+        return self.reserved() + sum(e.bytes for e in self._entries.values() if e.model is not None)
+
+    def _evict_for(self, needed: int, keep: str):
+        """Evict LRU models until `needed` more bytes fit in the budget (caller holds _lock)"""
+        if not self.budget_bytes:
+            return
+        for entry in list(self._entries.values()):
+            if self.resident_bytes() + needed <= self.budget_bytes:
+                return
+            if entry.model is None or entry.name == keep or entry.name in self.pinned or entry.refs:
+                continue
+            # bytes is kept as the last known size for the next load
+            entry.model = None
+            entry.evictions += 1
+            self._event("evict", entry.name, freed_mb=round(entry.bytes / 2**20, 1),
+                        resident_mb=round(self.resident_bytes() / 2**20, 1))
+        if self.resident_bytes() + needed > self.budget_bytes:
+            print(f"Model budget exceeded: {self.resident_bytes() / 2**20:.0f} MB resident, "
+                  f"{needed / 2**20:.0f} MB more for {keep}; remaining models are pinned or in use")
+
+    def checkout(self, name: str) -> Any:
+        """The named model, loading it if needed; pair with release(name)"""
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(name)
+        with entry.lock:
+            with self._lock:
+                entry.refs += 1
+                self._entries.move_to_end(name)
+                entry.last_used = time.time()
+                model = entry.model
+            if model is not None:
+                return model
+            try:
+                model = self._load(entry)
+            except Exception:
+                with self._lock:
+                    entry.refs -= 1
+                raise
+            return model
+
+    def _load(self, entry: _Entry) -> Any:
+        spec = self.specs[entry.name]
+        with self._lock:
+            # Make room up front using the size from the last load, so the peak stays in budget
+            self._evict_for(entry.bytes, keep=entry.name)
+        started, rss_before = time.perf_counter(), rss_bytes()
+        try:
+            model = self.load_model(spec["path"], mode=spec["mode"])
+        except Exception as e:
+            self._event("load_failed", entry.name, error=str(e))
+            raise
+        size = max(model_memory_bytes(model), rss_bytes() - rss_before)
+        with self._lock:
+            entry.model, entry.bytes = model, size
+            entry.loads += 1
+            self._event("load", entry.name, seconds=round(time.perf_counter() - started, 2),
+                        size_mb=round(size / 2**20, 1))
+            self._evict_for(0, keep=entry.name)
+        return model
+
+    def release(self, name: str):
+        with self._lock:
+            self._entries[name].refs -= 1
+
+    def preload_pinned(self):
+        for name in self.pinned:
+            if name in self._entries:
+                self.checkout(name)
+                self.release(name)
+
+    def timed(self, name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """fn wrapped to record its latency under model `name`"""
+        def run(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.observe(name, time.perf_counter() - started)
+        return run
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(name, deque(maxlen=500)).append(seconds)
+
+    def _latency(self, name: str) -> Dict[str, Any]:
+        recent = list(self._latencies.get(name, ()))
+        return {
+            "requests": len(recent),
+            "p50_latency_s": round(percentile(recent, 0.5), 4),
+            "p95_latency_s": round(percentile(recent, 0.95), 4),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {DEFAULT_MODEL_NAME: {"loaded": True, "pinned": True,
+                                           "size_mb": round(self.reserved() / 2**20, 1),
+                                           **self._latency(DEFAULT_MODEL_NAME)}}
+            for name, entry in self._entries.items():
+                models[name] = {
+                    "path": self.specs[name]["path"],
+                    "mode": self.specs[name]["mode"],
+                    "loaded": entry.model is not None,
+                    "pinned": name in self.pinned,
+                    "size_mb": round(entry.bytes / 2**20, 1),
+                    "in_use": entry.refs,
+                    "loads": entry.loads,
+                    "evictions": entry.evictions,
+                    "last_used": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(entry.last_used))
+                    if entry.last_used else None,
+                    **self._latency(name),
+                }
+            return {
+                "budget_mb": round(self.budget_bytes / 2**20, 1) if self.budget_bytes else None,
+                "resident_mb": round(self.resident_bytes() / 2**20, 1),
+                "models": models,
+                "events": list(self.events)[-50:],
+            }
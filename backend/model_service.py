@@ -1,61 +1,244 @@
 # model_service.py
+import contextlib
+import os
+import threading
+from typing import Any, Dict, List, Optional
 
+import torch
 from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline
 
+# Default decoding settings for /chat
+GENERATION_DEFAULTS: Dict[str, Any] = {
+    "max_length": 512,
+    "do_sample": True,
+    "top_p": 0.9,
+    "temperature": 0.7,
+}
+# /chat defaults with MEDBOT_DRAFT_GREEDY=1, so the draft model is used on every request
+GREEDY_DEFAULTS: Dict[str, Any] = {"max_length": 512, "do_sample": False, "num_beams": 1}
+
+
+def build_prompt(message: str) -> str:
+    """Wrap a patient message in the system instructions and few-shot examples"""
+    return (
+        # System role
+        "You are an empathetic, highly knowledgeable medical assistant.\n"
+        "When a patient describes their symptoms, you MUST:\n"
+        "  1. List up to 3 most likely diseases, ordered by probability.\n"
+        "     • For each, give a 1–2 sentence rationale.\n"
+        "  2. For each predicted disease, provide:\n"
+        "     - A brief (one‑sentence) description.\n"
+        "     - Two key next‑step recommendations (e.g., tests, lifestyle changes).\n"
+        "     - A recommended specialist (doctor type) and why.\n"
+        "  3. If the patient later asks “Tell me more about X,” give:\n"
+        "     – Detailed overview (cause, pathophysiology).\n"
+        "     – Common symptoms and red flags.\n"
+        "     – How it’s diagnosed.\n"
+        "     – Standard treatments and precautions.\n"
+        "Keep your tone warm, clear, and concise. Always answer in English.\n"
+        "\n"
+        "# Example 1\n"
+        "Patient: I have a high fever, sore throat, and swollen glands in my neck.\n"
+        "Assistant:\n"
+        "1. Streptococcal Pharyngitis (Strep Throat) – Likely because fever + sore throat + tender lymph nodes suggest bacterial infection.\n"
+        "   • Description: A bacterial infection of the throat caused by Streptococcus pyogenes.\n"
+        "   • Next steps: Rapid antigen detection test; keep well‑hydrated and rest.\n"
+        "   • Specialist: Otolaryngologist (ENT), to confirm with throat culture and manage complications.\n"
+        "2. Infectious Mononucleosis – Fever and lymph node swelling could also signal EBV infection.\n"
+        "   • Description: A viral infection often causing fatigue and enlarged spleen.\n"
+        "   • Next steps: Monospot antibody test; avoid contact sports (risk to spleen).\n"
+        "   • Specialist: Infectious disease physician, for antiviral guidance and monitoring.\n"
+        "\n"
+        "# Example 2 (deep dive)\n"
+        "Patient: Tell me more about Streptococcal Pharyngitis.\n"
+        "Assistant:\n"
+        "Streptococcal Pharyngitis is caused by the group A Streptococcus bacteria… [detailed overview, symptoms, diagnostics, treatment, precautions].\n"
+        "\n"
+        # Actual user message
+        f"Patient: {message}\n"
+        "Assistant:"
+    )
+
+
+def cpu_supports_bf16() -> bool:
+    """True when the CPU has native bf16 matmul support (AVX512-BF16 or AMX)"""
+    override = os.environ.get("MEDBOT_BF16")
+    if override is not None:
+        return override == "1"
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
 class MedicalModel:
-    def __init__(self, model_path: str):
+    """
+    BioBART chat model. The default "pipeline" mode is the stock transformers
+    pipeline; "optimized" mode (MEDBOT_TORCH_MODE=optimized) calls generate()
+    directly under inference_mode with SDPA attention, bf16 autocast where the
+    CPU supports it and a torch.compile'd encoder/decoder built during warm_up().
+
+    With a draft model (MEDBOT_DRAFT_MODEL, built by distill_draft.py) greedy
+    single-message generation is assisted: the draft proposes a few tokens and
+    the main model checks them all in one forward pass, keeping the longest
+    prefix it would have produced itself. Assisted calls run in fp32 (no
+    autocast), so the output is the same as plain greedy decoding. The default
+    /chat settings sample, so only greedy calls (the degraded "greedy" level, or
+    every call with MEDBOT_DRAFT_GREEDY=1) use the draft.
+    """
+
+    def __init__(self, model_path: str, mode: Optional[str] = None, compile_model: Optional[bool] = None,
+                 draft_model_path: Optional[str] = None, attn_implementation: Optional[str] = None):
+        self.mode = mode or os.environ.get("MEDBOT_TORCH_MODE", "pipeline")
         self.tokenizer = AutoTokenizer.from_pretrained(model_path)
-        self.model     = AutoModelForSeq2SeqLM.from_pretrained(model_path)
-        # Tell the pipeline to run on CPU by using device = -1
-        self.pipe = pipeline(
-            "text2text-generation",
-            model=self.model,
-            tokenizer=self.tokenizer,
-            device=-1,                # -1 = CPU instead of GPU
-            max_length=512,
-            do_sample=True,
-            top_p=0.9,
-            temperature=0.7,
-        )
-
-    def generate_response(self, message: str) -> str:
-        prompt = (
-            #System role
-                "You are an empathetic, highly knowledgeable medical assistant.\n"
-                "When a patient describes their symptoms, you MUST:\n"
-                "  1. List up to 3 most likely diseases, ordered by probability.\n"
-                "     • For each, give a 1–2 sentence rationale.\n"
-                "  2. For each predicted disease, provide:\n"
-                "     - A brief (one‑sentence) description.\n"
-                "     - Two key next‑step recommendations (e.g., tests, lifestyle changes).\n"
-                "     - A recommended specialist (doctor type) and why.\n"
-                "  3. If the patient later asks “Tell me more about X,” give:\n"
-                "     – Detailed overview (cause, pathophysiology).\n"
-                "     – Common symptoms and red flags.\n"
-                "     – How it’s diagnosed.\n"
-                "     – Standard treatments and precautions.\n"
-                "Keep your tone warm, clear, and concise. Always answer in English.\n"
-                "\n"
-                "# Example 1\n"
-                "Patient: I have a high fever, sore throat, and swollen glands in my neck.\n"
-                "Assistant:\n"
-                "1. Streptococcal Pharyngitis (Strep Throat) – Likely because fever + sore throat + tender lymph nodes suggest bacterial infection.\n"
-                "   • Description: A bacterial infection of the throat caused by Streptococcus pyogenes.\n"
-                "   • Next steps: Rapid antigen detection test; keep well‑hydrated and rest.\n"
-                "   • Specialist: Otolaryngologist (ENT), to confirm with throat culture and manage complications.\n"
-                "2. Infectious Mononucleosis – Fever and lymph node swelling could also signal EBV infection.\n"
-                "   • Description: A viral infection often causing fatigue and enlarged spleen.\n"
-                "   • Next steps: Monospot antibody test; avoid contact sports (risk to spleen).\n"
-                "   • Specialist: Infectious disease physician, for antiviral guidance and monitoring.\n"
-                "\n"
-                "# Example 2 (deep dive)\n"
-                "Patient: Tell me more about Streptococcal Pharyngitis.\n"
-                "Assistant:\n"
-                "Streptococcal Pharyngitis is caused by the group A Streptococcus bacteria… [detailed overview, symptoms, diagnostics, treatment, precautions].\n"
-                "\n"
-                # Actual user message
-                f"Patient: {message}\n"
-                "Assistant:"
-        )
-        out = self.pipe(prompt, max_length=512, num_return_sequences=1)[0]["generated_text"]
+        self.autocast_dtype = None
+        self.compiled = False
+        self.attention = "eager"
+        self.draft = None
+        self.draft_path = draft_model_path or os.environ.get("MEDBOT_DRAFT_MODEL") or None
+        self._assist_local = threading.local()
+        self._assist_lock = threading.Lock()
+        self.assist_totals = {"calls": 0, "generated_tokens": 0, "main_forwards": 0, "draft_forwards": 0}
+        greedy = self.draft_path is not None and os.environ.get("MEDBOT_DRAFT_GREEDY") == "1"
+        self.generation_defaults = dict(GREEDY_DEFAULTS if greedy else GENERATION_DEFAULTS)
+
+        if self.mode == "optimized":
+            self.model = self._load_optimized(model_path)
+            if compile_model is None:
+                compile_model = os.environ.get("MEDBOT_TORCH_COMPILE", "1") == "1"
+            self.warm_up(compile_model)
+        else:
+            # Pipeline mode loads with the transformers default (SDPA where supported) unless
+            # attn_implementation asks otherwise, e.g. "eager" for a true eager baseline
+            load_kwargs = {"attn_implementation": attn_implementation} if attn_implementation else {}
+            self.model     = AutoModelForSeq2SeqLM.from_pretrained(model_path, **load_kwargs)
+            # Tell the pipeline to run on CPU by using device = -1
+            self.pipe = pipeline(
+                "text2text-generation",
+                model=self.model,
+                tokenizer=self.tokenizer,
+                device=-1,                # -1 = CPU instead of GPU
+                **self.generation_defaults,
+            )
+        # What actually runs: transformers >= 4.36 records it, older versions only have eager attention
+        self.attention = getattr(self.model.config, "_attn_implementation", "eager")
+        if self.draft_path:
+            self._load_draft(self.draft_path)
+
+    def _load_optimized(self, model_path: str):
+        try:
+            model = AutoModelForSeq2SeqLM.from_pretrained(model_path, attn_implementation="sdpa")
+        except (TypeError, ValueError) as e:
+            # Older transformers or architectures without an SDPA path
+            print(f"SDPA attention unavailable, using default attention: {e}")
+            model = AutoModelForSeq2SeqLM.from_pretrained(model_path)
+        model.eval()
+        if cpu_supports_bf16():
+            self.autocast_dtype = torch.bfloat16
+        return model
+
+    def _load_draft(self, draft_path: str):
+        self.draft = AutoModelForSeq2SeqLM.from_pretrained(draft_path)
+        self.draft.eval()
+        # Draft tokens per step; the "heuristic" schedule adapts it (+2 when all are accepted, -1 otherwise)
+        # from this starting value, "constant" keeps it fixed
+        self.draft.generation_config.num_assistant_tokens = int(os.environ.get("MEDBOT_DRAFT_TOKENS", "5"))
+        self.draft.generation_config.num_assistant_tokens_schedule = os.environ.get("MEDBOT_DRAFT_SCHEDULE",
+                                                                                   "heuristic")
+        # Top-level forward calls are decoding steps (generate() runs the encoders separately)
+        self.model.register_forward_pre_hook(lambda module, args: self._count_forward("main_forwards"))
+        self.draft.register_forward_pre_hook(lambda module, args: self._count_forward("draft_forwards"))
+
+    def _count_forward(self, name: str):
+        counts = getattr(self._assist_local, "counts", None)
+        if counts is not None:
+            counts[name] += 1
+
+    def _can_assist(self, batch_size: int, kwargs: Dict[str, Any]) -> bool:
+        """Assisted generation is exact only for greedy decoding of one sequence"""
+        return (self.draft is not None and batch_size == 1 and not kwargs.get("do_sample")
+                and kwargs.get("num_beams", 1) == 1 and kwargs.get("num_return_sequences", 1) == 1)
+
+    def assisted_stats(self) -> Dict[str, Any]:
+        """Draft acceptance: accepted draft tokens / proposed, and tokens per main-model step"""
+        with self._assist_lock:
+            totals = dict(self.assist_totals)
+        accepted = max(0, totals["generated_tokens"] - totals["main_forwards"])
+        return {
+            "enabled": self.draft is not None,
+            "draft": self.draft_path,
+            "greedy_default": not self.generation_defaults.get("do_sample"),
+            **totals,
+            "acceptance_rate": round(accepted / totals["draft_forwards"], 4) if totals["draft_forwards"] else None,
+            "tokens_per_main_forward": round(totals["generated_tokens"] / totals["main_forwards"], 3)
+            if totals["main_forwards"] else None,
+        }
+
+    def _autocast(self):
+        if self.autocast_dtype is None:
+            return contextlib.nullcontext()
+        return torch.autocast("cpu", dtype=self.autocast_dtype)
+
+    def warm_up(self, compile_model: bool = True):
+        """Compile the encoder and decoder and run one generation to trigger compilation"""
+        if compile_model and hasattr(torch, "compile"):
+            base = self.model.get_encoder(), self.model.get_decoder()
+            try:
+                self.model.model.encoder = torch.compile(base[0], dynamic=True)
+                self.model.model.decoder = torch.compile(base[1], dynamic=True)
+                self._generate(build_prompt("I have a fever and a headache."), max_length=32)
+                self.compiled = True
+            except Exception as e:
+                print(f"torch.compile failed, running eager: {e}")
+                self.model.model.encoder, self.model.model.decoder = base
+                self.compiled = False
+        if not self.compiled:
+            self._generate(build_prompt("I have a fever and a headache."), max_length=32)
+
+    def _generate(self, prompt: str, **generation_kwargs: Any) -> str:
+        return self._generate_batch([prompt], **generation_kwargs)[0]
+
+    def _generate_batch(self, prompts: List[str], **generation_kwargs: Any) -> List[str]:
+        kwargs = {**self.generation_defaults, **generation_kwargs}
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True, truncation=True,
+                                max_length=self.model.config.max_position_embeddings)
+        if not self._can_assist(len(prompts), kwargs):
+            with torch.inference_mode(), self._autocast():
+                output = self.model.generate(**inputs, **kwargs)
+            return self.tokenizer.batch_decode(output, skip_special_tokens=True)
+
+        counts = self._assist_local.counts = {"main_forwards": 0, "draft_forwards": 0}
+        try:
+            # fp32 even when bf16 autocast is on: verifying a block of draft tokens in one pass
+            # only reproduces step-by-step greedy decoding when the numerics are exact
+            with torch.inference_mode():
+                output = self.model.generate(**inputs, assistant_model=self.draft, **kwargs)
+        finally:
+            self._assist_local.counts = None
+        with self._assist_lock:
+            self.assist_totals["calls"] += 1
+            # Everything after the decoder start token
+            self.assist_totals["generated_tokens"] += output.shape[1] - 1
+            for name, value in counts.items():
+                self.assist_totals[name] += value
+        return self.tokenizer.batch_decode(output, skip_special_tokens=True)
+
+    def generate_batch(self, messages: List[str], raw: bool = False, **generation_kwargs: Any) -> List[str]:
+        """
+        Generate replies for several messages in one padded forward pass.
+        With raw=True the messages are fed to the model as-is, without the chat prompt.
+        """
+        prompts = list(messages) if raw else [build_prompt(m) for m in messages]
+        outputs = self._generate_batch(prompts, **generation_kwargs)
+        return [out.replace(prompt, "").strip() for out, prompt in zip(outputs, prompts)]
+
+    def generate_response(self, message: str, **generation_kwargs: Any) -> str:
+        prompt = build_prompt(message)
+        if self.mode == "optimized" or self._can_assist(1, {**self.generation_defaults, **generation_kwargs}):
+            out = self._generate(prompt, **generation_kwargs)
+        else:
+            kwargs = {**self.generation_defaults, **generation_kwargs}
+            out = self.pipe(prompt, num_return_sequences=1, **kwargs)[0]["generated_text"]
         return out.replace(prompt, "").strip()
@@ -1,7 +1,39 @@
 # quiz_service.py
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Union
+import numpy as np
 from pydantic import BaseModel
 
+# Mapping of symptoms to specialists
+SPECIALIST_MAPPING: Dict[str, List[str]] = {
+    "respiratory": ["Cough", "Shortness of breath", "Wheezing"],
+    "cardiology": ["Chest", "Heart disease"],
+    "gastroenterology": ["Nausea/Vomiting", "Diarrhea", "Constipation", "Heartburn"],
+    "neurology": ["Headache", "Dizziness", "Confusion", "Numbness/Tingling", "Balance issues"],
+    "endocrinology": ["Diabetes", "Thyroid disorder", "Weight loss"],
+    "psychiatry": ["Very high", "High", "Very poor", "anxiety", "depression"],
+    "ophthalmology": ["Vision changes"],
+    "otolaryngology": ["Hearing changes", "Taste/smell changes", "Sore throat"],
+    "rheumatology": ["Joints/Limbs"],
+    "general_practice": []  # Default
+}
+
+SPECIALIST_NAMES: Dict[str, str] = {
+    "respiratory": "Pulmonologist",
+    "cardiology": "Cardiologist",
+    "gastroenterology": "Gastroenterologist",
+    "neurology": "Neurologist",
+    "endocrinology": "Endocrinologist",
+    "psychiatry": "Psychiatrist",
+    "ophthalmology": "Ophthalmologist",
+    "otolaryngology": "ENT Specialist",
+    "rheumatology": "Rheumatologist",
+    "general_practice": "General Practitioner"
+}
+
+HIGH_SEVERITY_SYMPTOMS = ["Chest", "Shortness of breath", "Confusion"]
+MEDIUM_SEVERITY_SYMPTOMS = ["Fever", "Headache", "Dizziness", "Numbness/Tingling"]
+SEVERITY_LEVELS = ["low", "medium", "high"]
+
 class QuizQuestion(BaseModel):
     id: str
     question: str
@@ -13,6 +45,7 @@ class HealthAssessment:
     def __init__(self):
         self.questions = self._initialize_questions()
         self.symptom_mapping = self._initialize_symptom_mapping()
+        self._compile()
         
     def _initialize_questions(self) -> List[QuizQuestion]:
         """Initialize the list of health assessment questions"""
@@ -135,6 +168,50 @@ class HealthAssessment:
             "Balance issues": ["inner ear disorder", "neurological condition"]
         }
     
+    def _compile(self):
+        """Compile the option mappings into index tables and weight matrices once"""
+        self._question_index = {question.id: question for question in self.questions}
+
+        # Every label that can be selected or passed in as a symptom gets a row
+        labels: List[str] = []
+        for question in self.questions:
+            labels.extend(question.options)
+        labels.extend(self.symptom_mapping)
+        for related in SPECIALIST_MAPPING.values():
+            labels.extend(related)
+        self.labels = list(dict.fromkeys(labels))
+        self._label_index = {label: i for i, label in enumerate(self.labels)}
+
+        self.conditions = list(dict.fromkeys(
+            condition for conditions in self.symptom_mapping.values() for condition in conditions
+        ))
+        condition_index = {condition: i for i, condition in enumerate(self.conditions)}
+        self.specialists = list(SPECIALIST_MAPPING)
+        specialist_index = {specialist: i for i, specialist in enumerate(self.specialists)}
+
+        n_labels = len(self.labels)
+        self._condition_weights = np.zeros((n_labels, len(self.conditions)), dtype=np.float32)
+        for label, conditions in self.symptom_mapping.items():
+            for condition in conditions:
+                self._condition_weights[self._label_index[label], condition_index[condition]] += 1
+
+        self._specialist_weights = np.zeros((n_labels, len(self.specialists)), dtype=np.float32)
+        for specialist, related in SPECIALIST_MAPPING.items():
+            for label in related:
+                self._specialist_weights[self._label_index[label], specialist_index[specialist]] = 1
+
+        # Only options with a condition mapping are reported back as symptoms
+        self._is_symptom = np.zeros(n_labels, dtype=bool)
+        for label in self.symptom_mapping:
+            self._is_symptom[self._label_index[label]] = True
+
+        # 2 = high, 1 = medium, 0 = low
+        self._severity = np.zeros(n_labels, dtype=np.int8)
+        for label in MEDIUM_SEVERITY_SYMPTOMS:
+            self._severity[self._label_index[label]] = 1
+        for label in HIGH_SEVERITY_SYMPTOMS:
+            self._severity[self._label_index[label]] = 2
+
     def get_question(self, question_idx: int) -> Optional[QuizQuestion]:
         """Get a question by index"""
         if 0 <= question_idx < len(self.questions):
@@ -143,59 +220,69 @@ class HealthAssessment:
     
     def get_question_by_id(self, question_id: str) -> Optional[QuizQuestion]:
         """Get a question by ID"""
-        for question in self.questions:
-            if question.id == question_id:
-                return question
-        return None
-    
-    def analyze_answers(self, answers: Dict[str, str]) -> Dict[str, Any]:
+        return self._question_index.get(question_id)
+
+    def encode_answers(self, answers: Dict[str, Union[str, List[str]]]) -> np.ndarray:
+        """Encode one session's answers (single or multi-select) as a 0/1 label vector"""
+        return self.encode_batch([answers])[0]
+
+    def encode_batch(self, sessions: List[Dict[str, Union[str, List[str]]]]) -> np.ndarray:
+        """Encode many sessions' answers as a (sessions x labels) 0/1 matrix"""
+        rows: List[int] = []
+        cols: List[int] = []
+        for row, answers in enumerate(sessions):
+            for answer in answers.values():
+                selected = [answer] if isinstance(answer, str) else answer
+                for option in selected:
+                    col = self._label_index.get(option)
+                    if col is not None:
+                        rows.append(row)
+                        cols.append(col)
+        selection = np.zeros((len(sessions), len(self.labels)), dtype=np.float32)
+        selection[rows, cols] = 1
+        return selection
+
+    def analyze_answers(self, answers: Dict[str, Union[str, List[str]]]) -> Dict[str, Any]:
         """Analyze quiz answers to determine potential health conditions"""
-        potential_conditions = []
-        symptoms = []
-        
-        # Extract symptoms from answers
-        for q_id, answer in answers.items():
-            if answer in self.symptom_mapping:
-                symptoms.append(answer)
-                potential_conditions.extend(self.symptom_mapping[answer])
-        
-        # Count and sort conditions by frequency
-        condition_count = {}
-        for condition in potential_conditions:
-            if condition in condition_count:
-                condition_count[condition] += 1
-            else:
-                condition_count[condition] = 1
-        
-        # Sort by count (descending)
-        sorted_conditions = sorted(condition_count.items(), key=lambda x: x[1], reverse=True)
-        top_conditions = [cond for cond, count in sorted_conditions[:5]]
-        
-        # General health assessment based on answers
-        severity_level = self._assess_severity(answers, symptoms)
-        
-        return {
-            "symptoms": symptoms,
-            "potential_conditions": top_conditions,
-            "severity_level": severity_level,
-            "follow_up_required": len(top_conditions) > 0 and severity_level != "low"
-        }
+        return self.analyze_batch([answers])[0]
+
+    def analyze_batch(self, sessions: List[Dict[str, Union[str, List[str]]]]) -> List[Dict[str, Any]]:
+        """Score many quiz sessions at once with two matrix products"""
+        if not sessions:
+            return []
+        selection = self.encode_batch(sessions)
+        condition_scores = selection @ self._condition_weights
+        specialist_scores = selection @ self._specialist_weights
+        severity = (selection * self._severity).max(axis=1)
+
+        results = []
+        for row in range(len(sessions)):
+            selected = np.flatnonzero(selection[row])
+            symptoms = [self.labels[i] for i in selected if self._is_symptom[i]]
+
+            # Sort by count (descending), ties keep the mapping order
+            scores = condition_scores[row]
+            order = np.argsort(-scores, kind="stable")[:5]
+            top_conditions = [self.conditions[i] for i in order if scores[i] > 0]
+
+            severity_level = SEVERITY_LEVELS[int(severity[row])]
+            results.append({
+                "symptoms": symptoms,
+                "potential_conditions": top_conditions,
+                "severity_level": severity_level,
+                "follow_up_required": len(top_conditions) > 0 and severity_level != "low",
+                "specialist": self._pick_specialist(specialist_scores[row]),
+            })
+        return results
     
-    def _assess_severity(self, answers: Dict[str, str], symptoms: List[str]) -> str:
+    def _assess_severity(self, answers: Dict[str, Union[str, List[str]]], symptoms: List[str]) -> str:
         """Assess the potential severity of the condition"""
         # This is a very simplified severity assessment
-        high_severity_symptoms = ["Chest", "Shortness of breath", "Confusion"]
-        medium_severity_symptoms = ["Fever", "Headache", "Dizziness", "Numbness/Tingling"]
-        
-        for symptom in symptoms:
-            if symptom in high_severity_symptoms:
-                return "high"
-        
+        selection = self.encode_answers(answers)
         for symptom in symptoms:
-            if symptom in medium_severity_symptoms:
-                return "medium"
-        
-        return "low"
+            if symptom in self._label_index:
+                selection[self._label_index[symptom]] = 1
+        return SEVERITY_LEVELS[int((selection * self._severity).max())]
     
     def get_follow_up_questions(self, question_id: str, answer: str) -> List[str]:
         """Get follow-up questions based on an answer"""
@@ -206,51 +293,18 @@ class HealthAssessment:
     
     def get_specialist_recommendation(self, symptoms: List[str]) -> Optional[str]:
         """Recommend a medical specialist based on symptoms"""
-        # Mapping of symptoms to specialists
-        specialist_mapping = {
-            "respiratory": ["Cough", "Shortness of breath", "Wheezing"],
-            "cardiology": ["Chest", "Heart disease"],
-            "gastroenterology": ["Nausea/Vomiting", "Diarrhea", "Constipation", "Heartburn"],
-            "neurology": ["Headache", "Dizziness", "Confusion", "Numbness/Tingling", "Balance issues"],
-            "endocrinology": ["Diabetes", "Thyroid disorder", "Weight loss"],
-            "psychiatry": ["Very high", "High", "Very poor", "anxiety", "depression"],
-            "ophthalmology": ["Vision changes"],
-            "otolaryngology": ["Hearing changes", "Taste/smell changes", "Sore throat"],
-            "rheumatology": ["Joints/Limbs"],
-            "general_practice": []  # Default
-        }
-        
-        # Count which specialist appears most frequently
-        specialist_count = {specialist: 0 for specialist in specialist_mapping}
-        
+        selection = np.zeros(len(self.labels), dtype=np.float32)
         for symptom in symptoms:
-            for specialist, related_symptoms in specialist_mapping.items():
-                if symptom in related_symptoms:
-                    specialist_count[specialist] += 1
-        
-        # Get specialist with highest count
-        max_count = 0
-        recommended_specialist = "general_practice"
-        
-        for specialist, count in specialist_count.items():
-            if count > max_count:
-                max_count = count
-                recommended_specialist = specialist
-        
-        specialist_names = {
-            "respiratory": "Pulmonologist",
-            "cardiology": "Cardiologist",
-            "gastroenterology": "Gastroenterologist",
-            "neurology": "Neurologist",
-            "endocrinology": "Endocrinologist",
-            "psychiatry": "Psychiatrist",
-            "ophthalmology": "Ophthalmologist",
-            "otolaryngology": "ENT Specialist",
-            "rheumatology": "Rheumatologist",
-            "general_practice": "General Practitioner"
-        }
-        
-        return specialist_names.get(recommended_specialist)
+            if symptom in self._label_index:
+                selection[self._label_index[symptom]] += 1
+        return self._pick_specialist(selection @ self._specialist_weights)
+
+    def _pick_specialist(self, scores: np.ndarray) -> str:
+        """Map a specialist score row to a display name, defaulting to a GP"""
+        # argmax keeps the first specialist on ties, like the original loop
+        best = int(np.argmax(scores))
+        specialist = self.specialists[best] if scores[best] > 0 else "general_practice"
+        return SPECIALIST_NAMES[specialist]
 
 # Example usage
 health_assessment = HealthAssessment()
\ No newline at end of file
@@ -0,0 +1,189 @@
+# red_flags.py
+import re
+from typing import Dict, List, Optional
+
+# Emergency phrases by category. Each entry is a regex fragment matched on word boundaries.
+RED_FLAGS: Dict[str, List[str]] = {
+    "cardiac": [
+        r"(?:crushing|severe|sudden|heavy|tight(?:ening)?|squeezing)\s+(?:\w+\s+)?chest(?:\s+pain)?",
+        r"chest\s+(?:pain|tightness|pressure)",
+        r"pain\s+(?:spreading|radiating|going)\s+(?:down\s+|to\s+|into\s+)(?:my\s+)?(?:left\s+)?(?:arm|jaw)",
+        r"heart\s+attack",
+    ],
+    "respiratory": [
+        # Not a blocked nose ("can't breathe through my nose")
+        r"(?:can'?t|cannot|can\s+not|unable\s+to|not\s+able\s+to|struggling\s+to|hard\s+to)\s+breathe?"
+        r"(?!\s+(?:through|out\s+of|from)\s+(?:my\s+|the\s+|one\s+)?(?:nose|nostrils?))",
+        # The negation is part of the phrase, so _negated never sees it
+        r"(?:not|isn'?t|stopped)\s+breathing"
+        r"(?!\s+(?:through|out\s+of|from)\s+(?:my\s+|the\s+|one\s+)?(?:nose|nostrils?))",
+        r"shortness\s+of\s+breath",
+        r"gasping\s+for\s+(?:air|breath)",
+        r"choking",
+        r"(?:lips|face|fingers)\s+(?:(?:are|is|turning|going)\s+){0,2}blue",
+    ],
+    "neurological": [
+        # Confusion as a symptom, not "confused about my medication dose"
+        r"confus(?:ed|ion)(?!\s+(?:about|by|with|over|on|regarding|as\s+to|whether|if|why|what|how|which))",
+        r"slurred\s+speech",
+        r"(?:face|mouth)\s+(?:is\s+)?droop(?:ing|s|y)?",
+        r"sudden\s+(?:weakness|numbness)",
+        r"(?:weakness|numbness)\s+(?:on|in)\s+one\s+side",
+        r"worst\s+headache",
+        r"seizures?",
+        r"(?:passed\s+out|fainted|unconscious|unresponsive)",
+        r"stroke",
+    ],
+    "bleeding": [
+        r"(?:vomiting|coughing|throwing\s+up)\s+(?:up\s+)?blood",
+        r"(?:heavy|severe|uncontrolled)\s+bleeding",
+        r"bleeding\s+(?:won'?t|will\s+not|does\s*n'?t|doesn't)\s+stop",
+        r"blood\s+in\s+(?:my\s+)?(?:vomit|stool)",
+    ],
+    "allergic": [
+        r"anaphyla(?:xis|ctic)",
+        r"throat\s+(?:is\s+)?(?:closing|swelling)",
+        r"(?:tongue|lips)\s+(?:is\s+|are\s+)?swollen",
+        r"swollen\s+(?:tongue|lips|throat)",
+    ],
+    "mental_health": [
+        r"suicid(?:e|al)",
+        r"kill\s+myself",
+        r"end\s+my\s+life",
+        r"(?:hurt|harm)(?:ing)?\s+myself",
+        r"self[\s-]harm",
+    ],
+    "poisoning": [
+        r"overdos(?:e|ed)",
+        r"swallowed\s+(?:poison|bleach|pills)",
+    ],
+}
+
+# Guidance returned immediately, one line per matched category
+GUIDANCE: Dict[str, str] = {
+    "cardiac": "Chest pain or pressure, especially spreading to the arm or jaw, can be a heart attack. "
+               "Stop any activity, sit down and chew an aspirin if you are not allergic to it.",
+    "respiratory": "Severe difficulty breathing needs immediate care. Sit upright and use a rescue "
+                   "inhaler if one has been prescribed for you.",
+    "neurological": "Sudden confusion, slurred speech, facial droop, one-sided weakness or a seizure can "
+                    "signal a stroke or other emergency. Note the time symptoms started.",
+    "bleeding": "Apply firm pressure to any external bleeding. Vomiting or coughing up blood needs urgent "
+                "assessment.",
+    "allergic": "Swelling of the throat, tongue or lips can be anaphylaxis. Use an epinephrine "
+                "auto-injector if you have one.",
+    "mental_health": "You don't have to go through this alone. Please reach out right now to a crisis "
+                     "line (in India: Tele-MANAS 14416; in the US: 988) or someone you trust.",
+    "poisoning": "Contact poison control or emergency services immediately and keep the container "
+                 "or packaging with you.",
+}
+
+EMERGENCY_HEADER = (
+    "⚠️ Your message mentions symptoms that can be a medical emergency. "
+    "Please call your local emergency number now (112 in India, 911 in the US) "
+    "or go to the nearest emergency department. Do not wait for an online answer."
+)
+
+NEGATION_CUES = {
+    "no", "not", "without", "denies", "deny", "never", "nor",
+    "don't", "doesn't", "didn't", "haven't", "hasn't",
+}
+NEGATION_WINDOW = 3
+# Words that end a negation's scope ("no fever but a headache", "not sure but chest pain")
+SCOPE_TERMINATORS = {"but", "however", "though", "although", "except", "yet", "still"}
+_TOKEN = re.compile(r"[a-z']+|[.!?;,\n]")
+_PUNCTUATION = set(".!?;,\n")
+_SENTENCE_BREAK = re.compile(r"[.!?\n]")
+_CLAUSE_BREAK = re.compile(r"[.!?;,\n]|\b(?:and|but|however|though|although|yet|so)\b", re.IGNORECASE)
+
+# A sentence opening with one of these is a question...
+QUESTION_STARTS = {
+    "what", "what's", "whats", "how", "why", "which", "who", "when", "where", "can", "could", "should",
+    "would", "does", "do", "is", "are", "will", "tell", "explain",
+}
+# ...and is only urgent when it also describes the writer's situation now ("am I having a heart attack?")
+PRESENT_CONTEXT = re.compile(
+    r"\b(?:i\s+am|i'?m|am\s+i|i\s+have|i'?ve|i\s+feel|i\s+keep|i\s+(?:can'?t|cannot)|is\s+this|could\s+this"
+    r"|this\s+is|right\s+now|currently|suddenly|should\s+i\s+(?:go|call|see)|do\s+i\s+need"
+    r"|my\s+(?:\w+\s+){0,2}(?:is|are|hurts?|feels?|went|started))\b",
+    re.IGNORECASE,
+)
+# Clauses about the past or about someone else's past ("my grandfather had a stroke years ago")
+HISTORY_CONTEXT = re.compile(
+    r"\b(?:(?:years?|months?|weeks?)\s+ago|last\s+(?:year|month)|in\s+the\s+past|history\s+of|used\s+to"
+    r"|as\s+a\s+child|when\s+i\s+was"
+    r"|(?:(?:grand)?(?:father|mother|dad|mom|parents?)|grandpa|grandma|uncle|aunt|brother|sister|cousin"
+    r"|relatives?|friend|family)\s+(?:\w+\s+){0,2}?(?:had|died|passed\s+away|suffered))\b",
+    re.IGNORECASE,
+)
+
+
+class RedFlagMatch:
+    def __init__(self, categories: List[str], phrases: List[str]):
+        self.categories = categories
+        self.phrases = phrases
+
+    def guidance(self) -> str:
+        lines = [EMERGENCY_HEADER, ""]
+        lines.extend(f"• {GUIDANCE[category]}" for category in self.categories)
+        return "\n".join(lines)
+
+    def as_dict(self) -> Dict[str, List[str]]:
+        return {"categories": self.categories, "matched": self.phrases}
+
+
+class RedFlagDetector:
+    """
+    All red-flag phrases compiled into a single alternation with one named group
+    per category, so a message is checked in one regex pass before any model work.
+    Matches preceded closely by a negation in the same clause ("no chest pain"),
+    inside general questions ("how can I prevent a heart attack") or in clauses
+    about the past ("my grandfather had a stroke years ago") are ignored.
+    """
+
+    def __init__(self, red_flags: Optional[Dict[str, List[str]]] = None):
+        red_flags = red_flags or RED_FLAGS
+        alternation = "|".join(
+            f"(?P<{category}>{'|'.join(patterns)})" for category, patterns in red_flags.items()
+        )
+        self._pattern = re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE)
+
+    @staticmethod
+    def _negated(text: str, start: int) -> bool:
+        words = []
+        for token in reversed(_TOKEN.findall(text[max(0, start - 40):start].lower())):
+            if token in SCOPE_TERMINATORS or token in _PUNCTUATION:
+                break
+            words.append(token)
+            if len(words) == NEGATION_WINDOW:
+                break
+        return any(word in NEGATION_CUES for word in words)
+
+    @staticmethod
+    def _span(text: str, start: int, end: int, breaks: "re.Pattern[str]") -> str:
+        """The sentence or clause around text[start:end], including a closing "?" """
+        left = 0
+        for found in breaks.finditer(text, 0, start):
+            left = found.end()
+        found = breaks.search(text, end)
+        return text[left:found.end() if found else len(text)]
+
+    def _not_current(self, text: str, start: int, end: int) -> bool:
+        sentence = self._span(text, start, end, _SENTENCE_BREAK)
+        words = _TOKEN.findall(sentence.lower())
+        if words and words[0] in QUESTION_STARTS and not PRESENT_CONTEXT.search(sentence):
+            return True
+        return bool(HISTORY_CONTEXT.search(self._span(text, start, end, _CLAUSE_BREAK)))
+
+    def detect(self, message: str) -> Optional[RedFlagMatch]:
+        categories: List[str] = []
+        phrases: List[str] = []
+        for match in self._pattern.finditer(message):
+            if self._negated(message, match.start()) or self._not_current(message, match.start(), match.end()):
+                continue
+            if match.lastgroup not in categories:
+                categories.append(match.lastgroup)
+            phrases.append(match.group(0))
+        return RedFlagMatch(categories, phrases) if categories else None
+
+
+red_flag_detector = RedFlagDetector()
@@ -0,0 +1,246 @@
+# replay_traffic.py
+"""
+Re-drive traffic captured by traffic_capture.py against a running instance.
+
+Usage:
+    python replay_traffic.py captures/ --url http://localhost:8000 --speed 2
+    python replay_traffic.py captures/traffic-*.ndjson.gz --speed max --concurrency 32 --out replay_report
+
+At 1x/2x/10x (any factor) requests are sent open-loop at their captured
+arrival times divided by the speed, so bursts arrive as they did in production
+whatever the server does; "max" sends back-to-back from --concurrency clients.
+Adaptive quiz answers wait for their session's replayed start and are sent
+with the new session id. Prints per-endpoint latency percentiles and errors
+next to the captured latencies and writes the full report to <out>.json.
+"""
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from eval_metrics import percentile
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def _capture_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.ndjson.gz"))))
+        else:
+            files.append(path)
+    return files
+
+
+def _read_lines(path: str) -> List[Dict[str, Any]]:
+    entries = []
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+    except (EOFError, json.JSONDecodeError):
+        # Worker killed mid-write: keep everything up to its last flush
+        print(f"{path}: truncated, using the first {len(entries)} lines")
+    return entries
+
+
+def load_capture(paths: List[str]) -> Tuple[List[Dict[str, Any]], int]:
+    """All records from every capture file on one timeline (seconds from the first arrival), and how many were skipped"""
+    records, skipped = [], 0
+    for path in _capture_files(paths):
+        started = 0.0
+        for entry in _read_lines(path):
+            if "capture" in entry:
+                started = entry["capture"]["started"]
+                continue
+            if entry["method"] != "GET" and entry["body"] is None:
+                skipped += 1  # body too large or not JSON, cannot be reproduced
+                continue
+            entry["at"] = started + entry["t"]
+            records.append(entry)
+    records.sort(key=lambda r: r["at"])
+    if records:
+        first = records[0]["at"]
+        for record in records:
+            record["at"] -= first
+    return records, skipped
+
+
+class Replayer:
+    def __init__(self, url: str, records: List[Dict[str, Any]], concurrency: int, timeout: float):
+        self.url = url.rstrip("/")
+        self.records = records
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.results: List[Dict[str, Any]] = []
+        self.max_send_lag = 0.0
+        # Sessions whose start is in the capture: answers wait on the replayed start's session id
+        self.sessions: Dict[str, asyncio.Future] = {}
+
+    def _prepare_sessions(self):
+        loop = asyncio.get_running_loop()
+        for record in self.records:
+            body = record["body"] if isinstance(record["body"], dict) else {}
+            created = record.get("response_session")
+            if created and "session_id" not in body and created not in self.sessions:
+                self.sessions[created] = loop.create_future()
+
+    async def _send(self, client: httpx.AsyncClient, record: Dict[str, Any]):
+        endpoint = f"{record['method']} {record['path']}"
+        result = {"endpoint": endpoint, "status": None, "error": None, "latency_ms": None,
+                  "captured_status": record["status"], "captured_latency_ms": record["latency_ms"]}
+        body = record["body"]
+        created = record.get("response_session")
+        starts_session = created in self.sessions and not (isinstance(body, dict) and "session_id" in body)
+        try:
+            if isinstance(body, dict) and body.get("session_id"):
+                future = self.sessions.get(body["session_id"])
+                if future is None:
+                    result["error"] = "session started before the capture"
+                    return
+                session_id = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+                if session_id is None:
+                    result["error"] = "session start failed in replay"
+                    return
+                body = {**body, "session_id": session_id}
+            url = f"{self.url}{record['path']}" + (f"?{record['query']}" if record["query"] else "")
+            t0 = time.perf_counter()
+            try:
+                response = await client.request(record["method"], url, json=body)
+            except httpx.HTTPError as e:
+                result["error"] = type(e).__name__
+                return
+            result["latency_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            result["status"] = response.status_code
+            if starts_session and response.status_code == 200:
+                self.sessions[created].set_result(response.json().get("session_id"))
+        except asyncio.TimeoutError:
+            result["error"] = "timed out waiting for session start"
+        finally:
+            if starts_session and not self.sessions[created].done():
+                self.sessions[created].set_result(None)
+            self.results.append(result)
+
+    async def run(self, speed: Optional[float]) -> float:
+        """Replay everything; speed None means as fast as the clients allow. Returns wall seconds."""
+        self._prepare_sessions()
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits) as client:
+            started = time.perf_counter()
+            if speed is None:
+                pending = iter(self.records)
+
+                async def client_loop():
+                    for record in pending:
+                        await self._send(client, record)
+
+                tasks = [asyncio.create_task(client_loop()) for _ in range(self.concurrency)]
+            else:
+                tasks = []
+                for record in self.records:
+                    due = record["at"] / speed
+                    delay = due - (time.perf_counter() - started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    else:
+                        # Client falling behind the schedule, so the offered load is lower than captured
+                        self.max_send_lag = max(self.max_send_lag, -delay)
+                    tasks.append(asyncio.create_task(self._send(client, record)))
+            await asyncio.gather(*tasks)
+            return time.perf_counter() - started
+
+
+def _distribution(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    stats = {f"p{int(q * 100)}_ms": round(percentile(values, q), 2) for q in PERCENTILES}
+    stats["max_ms"] = round(max(values), 2)
+    return stats
+
+
+def summarize(results: List[Dict[str, Any]], wall: float, speed: Optional[float], skipped: int,
+              max_send_lag: float) -> Dict[str, Any]:
+    by_endpoint: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for result in results:
+        by_endpoint[result["endpoint"]].append(result)
+    endpoints = {}
+    for endpoint, rows in sorted(by_endpoint.items()):
+        errors: Dict[str, int] = defaultdict(int)
+        for row in rows:
+            if row["error"]:
+                errors[row["error"]] += 1
+            elif row["status"] >= 400:
+                errors[f"HTTP {row['status']}"] += 1
+        endpoints[endpoint] = {
+            "requests": len(rows),
+            "errors": dict(errors),
+            "status_changed": sum(1 for r in rows if r["status"] is not None and r["status"] != r["captured_status"]),
+            "replay": _distribution([r["latency_ms"] for r in rows if r["latency_ms"] is not None]),
+            "captured": _distribution([r["captured_latency_ms"] for r in rows]),
+        }
+    sent = sum(1 for r in results if r["status"] is not None)
+    return {
+        "speed": "max" if speed is None else speed,
+        "requests": len(results),
+        "skipped_unreplayable": skipped,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(sent / wall, 2) if wall > 0 else 0.0,
+        "max_send_lag_s": round(max_send_lag, 3),
+        "overall": _distribution([r["latency_ms"] for r in results if r["latency_ms"] is not None]),
+        "endpoints": endpoints,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    speed = "max speed" if report["speed"] == "max" else f"{report['speed']}x"
+    print(f"Replayed {report['requests']} requests at {speed} in {report['wall_s']}s "
+          f"({report['throughput_rps']} req/s, {report['skipped_unreplayable']} skipped, "
+          f"max send lag {report['max_send_lag_s']}s)")
+    print(f"{'endpoint':32} {'n':>6} {'err':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'cap p50':>9} {'cap p95':>9}")
+    for endpoint, stats in report["endpoints"].items():
+        replay, captured = stats["replay"], stats["captured"]
+        print(f"{endpoint:32} {stats['requests']:>6} {sum(stats['errors'].values()):>5} "
+              f"{replay.get('p50_ms', '-'):>9} {replay.get('p95_ms', '-'):>9} {replay.get('p99_ms', '-'):>9} "
+              f"{captured.get('p50_ms', '-'):>9} {captured.get('p95_ms', '-'):>9}")
+        for error, count in stats["errors"].items():
+            print(f"    {error}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured /chat and /quiz traffic against a running instance")
+    parser.add_argument("captures", nargs="+", help="capture files or directories of *.ndjson.gz")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--speed", default="1", help="time compression factor (1, 2, 10, ...) or 'max'")
+    parser.add_argument("--concurrency", type=int, default=256, help="client connections (the load in 'max' mode)")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--out", default="replay_report", help="output path without extension")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    records, skipped = load_capture(args.captures)
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        parser.error("no replayable requests in the capture")
+
+    replayer = Replayer(args.url, records, args.concurrency, args.timeout)
+    wall = asyncio.run(replayer.run(speed))
+    report = summarize(replayer.results, wall, speed, skipped, replayer.max_send_lag)
+    with open(f"{args.out}.json", "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# request_profiler.py
+"""
+On-demand profiling of /chat requests.
+
+An admin arms the profiler for the next N requests or T seconds, capped at
+MEDBOT_PROFILE_MAX_CAPTURES requests. While armed, each request gets a Capture:
+the model call and response formatting run under cProfile (in whatever thread
+executes them) and, when torch is available, under torch.profiler. Results are
+served as a zip with merged pstats, folded stacks for flamegraph.pl /
+speedscope / inferno, torch chrome traces and a text summary. Unarmed, start()
+is a single attribute check and wrap()/call() hand the function straight through.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+MAX_STACK_DEPTH = 64
+# Subtrees below this share of the profiled time are collapsed into one frame
+MIN_STACK_SHARE = 1e-4
+MAX_STACK_NODES = 50_000
+MAX_CAPTURES = int(os.environ.get("MEDBOT_PROFILE_MAX_CAPTURES", "200"))
+
+
+def _frame_name(func) -> str:
+    filename, line, name = func
+    if filename == "~":
+        return name.strip("<>")
+    return f"{os.path.basename(filename)}:{name}:{line}"
+
+
+def folded_stacks(stats: pstats.Stats, prefix: str = "", min_share: float = MIN_STACK_SHARE,
+                  max_nodes: int = MAX_STACK_NODES) -> Dict[str, int]:
+    """
+    Approximate folded stacks (microseconds) from cProfile's caller/callee graph.
+    cProfile keeps no full stacks, so each function's time is split between its
+    callers in proportion to the time spent under each call edge.
+
+    The number of caller paths grows exponentially with the call graph's fan-in,
+    so a path is only expanded while its share is at least min_share of the
+    profiled time and fewer than max_nodes stacks have been emitted; beyond that
+    the subtree's whole share is charged to its top frame, keeping totals exact.
+    """
+    raw = stats.stats
+    names = {func: _frame_name(func) for func in raw}
+    children: Dict[Any, List] = defaultdict(list)
+    roots = []
+    for func, (_, _, _, _, callers) in raw.items():
+        known = [c for c in callers if c in raw]
+        if not known:
+            roots.append(func)
+        for caller in known:
+            children[caller].append((func, callers[caller][3]))
+
+    folded: Dict[str, int] = defaultdict(int)
+    threshold = min_share * sum(raw[root][3] for root in roots)
+    nodes = 0
+
+    def walk(func, parent: str, depth: int, on_stack: frozenset, share: float):
+        nonlocal nodes
+        nodes += 1
+        tt, ct = raw[func][2], raw[func][3]
+        scale = share / ct if ct > 0 else 0.0
+        key = f"{parent};{names[func]}" if parent else names[func]
+        expand = [(child, edge_time * scale) for child, edge_time in children[func] if child not in on_stack]
+        if depth >= MAX_STACK_DEPTH or share < threshold or nodes >= max_nodes:
+            # Collapse: the frame's own time plus everything under it
+            folded[key] += int((tt * scale + sum(child_share for _, child_share in expand)) * 1e6)
+            return
+        folded[key] += int(tt * scale * 1e6)
+        for child, child_share in expand:
+            walk(child, key, depth + 1, on_stack | {child}, child_share)
+
+    for root in roots:
+        walk(root, prefix, 1, frozenset([root]), raw[root][3])
+    return {stack: us for stack, us in folded.items() if us > 0}
+
+
+class Capture:
+    """Profiling data for one request"""
+
+    def __init__(self, label: str, use_torch: bool):
+        self.label = label
+        self.use_torch = use_torch
+        self.started = time.perf_counter()
+        self.profiles: List[cProfile.Profile] = []
+        self.segments: Dict[str, float] = defaultdict(float)
+        self.torch_stacks: List[str] = []
+        self.torch_traces: List[str] = []
+        self.torch_tables: List[str] = []
+        self.wall = 0.0
+
+
+class RequestProfiler:
+    def __init__(self, max_captures: int = MAX_CAPTURES):
+        self._lock = threading.Lock()
+        # Only one torch.profiler session may be active per process
+        self._torch_lock = threading.Lock()
+        self.armed = False
+        self._remaining: Optional[int] = None
+        self._deadline: Optional[float] = None
+        self._use_torch = True
+        self.captures: List[Capture] = []
+        # Bounds memory when armed by time under heavy traffic; profiling stops once full
+        self.max_captures = max_captures
+        self.armed_at: Optional[str] = None
+
+    def arm(self, requests: Optional[int] = None, seconds: Optional[float] = None, use_torch: bool = True):
+        """Profile the next `requests` requests or everything for `seconds`, whichever ends first"""
+        if not requests and not seconds:
+            raise ValueError("requests or seconds is required")
+        with self._lock:
+            self.captures = []
+            self._remaining = requests
+            self._deadline = time.monotonic() + seconds if seconds else None
+            self._use_torch = use_torch
+            self.armed_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+            self.armed = True
+
+    def disarm(self):
+        with self._lock:
+            self.armed = False
+
+    def start(self, label: str) -> Optional[Capture]:
+        """A Capture if this request should be profiled, else None"""
+        if not self.armed:
+            return None
+        with self._lock:
+            if not self.armed:
+                return None
+            if self._deadline is not None and time.monotonic() > self._deadline:
+                self.armed = False
+                return None
+            if len(self.captures) >= self.max_captures:
+                self.armed = False
+                return None
+            if self._remaining is not None:
+                self._remaining -= 1
+                if self._remaining <= 0:
+                    self.armed = False
+        return Capture(label, self._use_torch)
+
+    def call(self, capture: Optional[Capture], fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run fn under the capture's profilers (or plainly when not profiling)"""
+        if capture is None:
+            return fn(*args, **kwargs)
+        name = getattr(fn, "__qualname__", getattr(fn, "__name__", "call"))
+        torch_prof = self._torch_profiler() if capture.use_torch else None
+        profile = cProfile.Profile()
+        t0 = time.perf_counter()
+        try:
+            if torch_prof is not None:
+                try:
+                    torch_prof.__enter__()
+                except Exception:
+                    self._torch_lock.release()
+                    torch_prof = None
+            profile.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                if torch_prof is not None:
+                    # The lock is released even when stopping the profiler fails
+                    try:
+                        torch_prof.__exit__(None, None, None)
+                        self._collect_torch(capture, torch_prof)
+                    except Exception as e:
+                        print(f"torch.profiler stop failed: {e}")
+                    finally:
+                        self._torch_lock.release()
+        finally:
+            capture.segments[name] += time.perf_counter() - t0
+            capture.profiles.append(profile)
+
+    def wrap(self, capture: Optional[Capture], fn: Callable[..., Any]) -> Callable[..., Any]:
+        """fn bound to the capture, for calls that run on another thread (e.g. the scheduler)"""
+        if capture is None:
+            return fn
+        return lambda *args, **kwargs: self.call(capture, fn, *args, **kwargs)
+
+    def finish(self, capture: Optional[Capture]):
+        if capture is None:
+            return
+        capture.wall = time.perf_counter() - capture.started
+        with self._lock:
+            # Requests already in flight when the limit was reached are dropped
+            if len(self.captures) < self.max_captures:
+                self.captures.append(capture)
+
+    def _torch_profiler(self):
+        """A torch profiler holding the torch lock, or None if torch is missing or busy"""
+        try:
+            import torch.profiler
+        except ImportError:
+            return None
+        if not self._torch_lock.acquire(blocking=False):
+            return None
+        try:
+            return torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], with_stack=True)
+        except Exception:
+            self._torch_lock.release()
+            return None
+
+    def _collect_torch(self, capture: Capture, prof):
+        try:
+            capture.torch_tables.append(prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=30))
+            with tempfile.TemporaryDirectory() as tmp:
+                stacks_path = os.path.join(tmp, "stacks.txt")
+                trace_path = os.path.join(tmp, "trace.json")
+                prof.export_stacks(stacks_path, "self_cpu_time_total")
+                prof.export_chrome_trace(trace_path)
+                with open(stacks_path) as f:
+                    capture.torch_stacks.append(f.read())
+                with open(trace_path) as f:
+                    capture.torch_traces.append(f.read())
+        except Exception as e:
+            print(f"torch.profiler export failed: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "armed": self.armed,
+                "armed_at": self.armed_at,
+                "remaining_requests": self._remaining if self.armed else 0,
+                "seconds_left": round(max(0.0, self._deadline - time.monotonic()), 1)
+                if self.armed and self._deadline else None,
+                "captured": len(self.captures),
+                "max_captures": self.max_captures,
+            }
+
+    def _snapshot(self) -> List[Capture]:
+        with self._lock:
+            return list(self.captures)
+
+    def _merged_stats(self, captures: List[Capture]) -> Optional[pstats.Stats]:
+        stats = None
+        for capture in captures:
+            for profile in capture.profiles:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+        return stats
+
+    def folded(self, captures: Optional[List[Capture]] = None) -> str:
+        """All captures as folded stacks rooted at the request label"""
+        folded: Dict[str, int] = defaultdict(int)
+        for capture in captures if captures is not None else self._snapshot():
+            for profile in capture.profiles:
+                for stack, us in folded_stacks(pstats.Stats(profile), capture.label).items():
+                    folded[stack] += us
+            profiled = sum(capture.segments.values())
+            # Handler time outside the profiled calls: validation, queueing, awaiting
+            other = int(max(0.0, capture.wall - profiled) * 1e6)
+            if other:
+                folded[f"{capture.label};handler (unprofiled, incl. queue wait)"] += other
+        return "".join(f"{stack} {us}\n" for stack, us in sorted(folded.items()))
+
+    def bundle(self) -> bytes:
+        """Zip with merged pstats, folded stacks, torch traces and a summary"""
+        captures = self._snapshot()
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            stats = self._merged_stats(captures)
+            if stats is not None:
+                with tempfile.NamedTemporaryFile(suffix=".prof") as tmp:
+                    stats.dump_stats(tmp.name)
+                    zf.write(tmp.name, "cprofile.prof")
+                summary = io.StringIO()
+                stats.stream = summary
+                stats.sort_stats("cumulative").print_stats(40)
+                zf.writestr("cprofile_summary.txt", summary.getvalue())
+            zf.writestr("cprofile.folded", self.folded(captures))
+            torch_stacks = "".join(s for c in captures for s in c.torch_stacks)
+            if torch_stacks:
+                zf.writestr("torch.folded", torch_stacks)
+            for i, trace in enumerate(t for c in captures for t in c.torch_traces):
+                zf.writestr(f"torch_trace_{i}.json", trace)
+            tables = [t for c in captures for t in c.torch_tables]
+            if tables:
+                zf.writestr("torch_ops.txt", "\n\n".join(tables))
+            zf.writestr("requests.json", json.dumps([
+                {"label": c.label, "wall_s": round(c.wall, 4),
+                 "segments_s": {k: round(v, 4) for k, v in c.segments.items()}}
+                for c in captures
+            ], indent=2))
+        return buffer.getvalue()
+
+
+request_profiler = RequestProfiler()
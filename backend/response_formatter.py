@@ -9,7 +9,7 @@ def load_doctor_data(filepath="all_doc-data_cleaned.csv"):
         print(f"Warning: Doctor data file '{filepath}' not found.")
         return None
 
-def format_medical_response(raw_response, symptoms=None, doctor_data=None):
+def format_medical_response(raw_response, symptoms=None, doctor_data=None, predictions=None):
     """
     Process the raw model response and guide it through the medical conversation flow
     
@@ -17,6 +17,7 @@ def format_medical_response(raw_response, symptoms=None, doctor_data=None):
         raw_response: Raw text from the language model
         symptoms: User's reported symptoms (if available)
         doctor_data: DataFrame containing doctor information
+        predictions: Ranked diseases for the symptoms (dicts with disease, probability, description)
     """
     # Step 1: Clean the basic formatting (from your original function)
     formatted = clean_basic_formatting(raw_response)
@@ -26,7 +27,7 @@ def format_medical_response(raw_response, symptoms=None, doctor_data=None):
     
     # Step 3: Apply specific formatting based on the conversation stage
     if conversation_stage == "initial_symptoms":
-        return format_disease_prediction(formatted, symptoms)
+        return format_disease_prediction(formatted, symptoms, predictions, doctor_data)
     elif conversation_stage == "disease_selection":
         return format_disease_information(formatted)
     elif conversation_stage == "disease_information":
@@ -81,12 +82,29 @@ def determine_conversation_stage(text, symptoms):
     else:
         return "general_response"
 
-def format_disease_prediction(text, symptoms):
+def format_disease_prediction(text, symptoms, predictions=None, doctor_data=None):
     """Format the response to include disease predictions"""
     # Check if the model already predicted diseases
     if re.search(r"(possible diagnoses|possible conditions|potential diseases)", text, re.IGNORECASE):
         # Already formatted correctly
         return text + "\n\nWhich disease would you like more information about?"
+    elif predictions:
+        # Fill in the ranked diseases from the disease table
+        lines = [f"Based on your symptoms ({', '.join(symptoms)}), these are the most likely possibilities:", ""]
+        for i, entry in enumerate(predictions, 1):
+            line = f"{i}. {entry['disease'].title()} ({entry['probability']:.0%} likely)"
+            if entry.get("description"):
+                line += f" - {entry['description']}"
+            lines.append(line)
+        if doctor_data is not None:
+            specialties = determine_relevant_specialties(predictions[0]["disease"])
+            recommended_doctors = get_doctor_recommendations(doctor_data, specialties)
+            if recommended_doctors:
+                lines += ["", "Specialists you could consult:"]
+                lines += [f"{i}. Dr. {name} - {specialty} ({location})"
+                          for i, (name, specialty, location) in enumerate(recommended_doctors, 1)]
+        lines += ["", "Which of these would you like more information about?"]
+        return (text + "\n\n" + "\n".join(lines)).strip()
     else:
         # Guide the model to make predictions
         prompt_addition = f"""
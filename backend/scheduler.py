@@ -0,0 +1,235 @@
+# scheduler.py
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from eval_metrics import percentile
+
+
+class QueueFull(Exception):
+    """Raised when a user already has the maximum number of requests waiting"""
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float = 1.0) -> float:
+        """Seconds until `cost` tokens are available (0 if they are now)"""
+        self._refill(time.monotonic())
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def consume(self, cost: float = 1.0):
+        self.tokens -= cost
+
+
+class AdmissionController:
+    """
+    Token buckets per user and per (user, session). A request is admitted only if
+    both buckets have tokens, so one user cannot dodge the limit by opening sessions.
+    """
+
+    def __init__(self, user_rate: float, user_burst: float, session_rate: float,
+                 session_burst: float, max_buckets: int = 100000):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def _bucket(self, key: Hashable, rate: float, burst: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst)
+            # Idle buckets are full again anyway, so dropping the oldest loses nothing
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def admit(self, user_id: str, session_id: Optional[str] = None, cost: float = 1.0) -> float:
+        """Consume tokens and return 0, or return the seconds to wait before retrying"""
+        with self._lock:
+            buckets = [self._bucket(("user", user_id), self.user_rate, self.user_burst)]
+            if session_id:
+                buckets.append(self._bucket(("session", user_id, session_id),
+                                            self.session_rate, self.session_burst))
+            wait = max(bucket.wait_time(cost) for bucket in buckets)
+            if wait > 0:
+                self.throttled += 1
+                return wait
+            for bucket in buckets:
+                bucket.consume(cost)
+            return 0.0
+
+
+class _Job:
+    __slots__ = ("fn", "args", "kwargs", "cost", "enqueued", "future")
+
+    def __init__(self, fn, args, kwargs, cost, future):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.cost = cost
+        self.enqueued = time.monotonic()
+        self.future = future
+
+
+class _UserStats:
+    __slots__ = ("served", "total_wait", "max_wait", "recent")
+
+    def __init__(self):
+        self.served = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent: Deque[float] = deque(maxlen=200)
+
+    def record(self, wait: float):
+        self.served += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent.append(wait)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "served": self.served,
+            "mean_wait_s": round(self.total_wait / self.served, 4) if self.served else 0.0,
+            "p95_wait_s": round(percentile(self.recent, 0.95), 4),
+            "max_wait_s": round(self.max_wait, 4),
+        }
+
+
+class FairScheduler:
+    """
+    Deficit-round-robin scheduler for blocking inference calls.
+
+    Every user has their own FIFO queue; workers take jobs round-robin across users
+    with a per-user deficit counter, so a user with a long backlog gets one turn
+    per round like everyone else. Jobs run on a thread pool of `concurrency`
+    workers so the event loop stays free.
+    """
+
+    def __init__(self, concurrency: int = 1, quantum: float = 1.0, max_queue_per_user: int = 4,
+                 max_tracked_users: int = 10000):
+        self.concurrency = concurrency
+        self.quantum = quantum
+        self.max_queue_per_user = max_queue_per_user
+        self._queues: Dict[Hashable, Deque[_Job]] = {}
+        self._deficit: Dict[Hashable, float] = {}
+        self._active: Deque[Hashable] = deque()
+        self._stats: "OrderedDict[Hashable, _UserStats]" = OrderedDict()
+        self.max_tracked_users = max_tracked_users
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="inference")
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers = []
+        self.running = 0
+
+    def start(self):
+        """Start the worker tasks on the running event loop"""
+        if self._workers:
+            return
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        self._workers = []
+        self._executor.shutdown(wait=False)
+
+    def queue_depth(self, user: Optional[Hashable] = None) -> int:
+        if user is not None:
+            return len(self._queues.get(user, ()))
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def submit(self, user: Hashable, fn: Callable[..., Any], *args: Any,
+                     cost: float = 1.0, **kwargs: Any) -> Any:
+        """Queue fn(*args, **kwargs) under `user` and wait for its result"""
+        if self._wakeup is None:
+            self.start()
+        queue = self._queues.setdefault(user, deque())
+        if len(queue) >= self.max_queue_per_user:
+            raise QueueFull(user)
+        future = asyncio.get_running_loop().create_future()
+        queue.append(_Job(fn, args, kwargs, cost, future))
+        if user not in self._deficit:
+            self._deficit[user] = 0.0
+            self._active.append(user)
+        self._wakeup.set()
+        return await future
+
+    def _next_job(self) -> Optional[Tuple[Hashable, _Job]]:
+        while self._active:
+            user = self._active[0]
+            queue = self._queues.get(user)
+            if not queue:
+                self._active.popleft()
+                self._deficit.pop(user, None)
+                self._queues.pop(user, None)
+                continue
+            if self._deficit[user] >= queue[0].cost:
+                self._deficit[user] -= queue[0].cost
+                return user, queue.popleft()
+            # Out of credit this round: top up and move to the back of the line
+            self._deficit[user] += self.quantum
+            self._active.rotate(-1)
+        return None
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            picked = self._next_job()
+            if picked is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            user, job = picked
+            if job.future.cancelled():
+                continue
+            self._record_wait(user, time.monotonic() - job.enqueued)
+            self.running += 1
+            try:
+                result = await loop.run_in_executor(self._executor, lambda: job.fn(*job.args, **job.kwargs))
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self.running -= 1
+
+    def _record_wait(self, user: Hashable, wait: float):
+        stats = self._stats.get(user)
+        if stats is None:
+            stats = self._stats[user] = _UserStats()
+            while len(self._stats) > self.max_tracked_users:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(user)
+        stats.record(wait)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": self.queue_depth(),
+            "users": {str(user): stats.as_dict() for user, stats in self._stats.items()},
+        }
@@ -0,0 +1,195 @@
+# semantic_cache.py
+"""
+Semantic response cache in front of MedicalModel.generate_response.
+
+Messages are embedded with a small local encoder (the dynamically quantized
+DistilBERT with mean pooling from embedding_generation.ipynb) and compared by
+cosine similarity against a fixed-size in-memory matrix of previously answered
+messages. A lookup above the threshold reuses the stored answer, so paraphrases
+like "my head hurts and I'm feverish" / "fever with headache" skip generation.
+
+Entries also carry a key (model version plus extracted and negated symptoms)
+and only match lookups with the same key: an embedding alone barely separates
+"I have a fever" from "I don't have a fever".
+
+Off unless MEDBOT_SEMANTIC_CACHE=1.
+"""
+import os
+import threading
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+SIMILARITY_BINS = np.round(np.arange(0.0, 1.0001, 0.05), 2)
+
+
+class MessageEncoder:
+    """Mean-pooled, L2-normalised DistilBERT embeddings on CPU, int8 dynamic quantization"""
+
+    def __init__(self, model_name: str = "distilbert-base-uncased", quantized_state: Optional[str] = None,
+                 max_length: int = 128):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        self._torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name)
+        self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        if quantized_state:
+            # Fine-tuned weights saved by embedding_generation.ipynb
+            self.model.load_state_dict(torch.load(quantized_state, map_location="cpu"))
+        self.model.eval()
+        self.max_length = max_length
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        torch = self._torch
+        inputs = self.tokenizer(texts, return_tensors="pt", truncation=True, padding=True,
+                                max_length=self.max_length)
+        with torch.inference_mode():
+            hidden = self.model(**inputs)[0]
+            mask = inputs["attention_mask"].unsqueeze(-1).float()
+            pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+        vectors = pooled.numpy().astype(np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+
+class CacheLookup:
+    """
+    Result of one lookup; hand it back to store() on a miss to avoid re-encoding.
+    embedding is None when no entry had the key, so nothing was encoded yet.
+    """
+
+    def __init__(self, embedding: Optional[np.ndarray], key: Hashable, answer: Optional[str], similarity: float,
+                 message: str = ""):
+        self.embedding = embedding
+        self.message = message
+        self.key = key
+        self.answer = answer
+        self.similarity = similarity
+
+    @property
+    def hit(self) -> bool:
+        return self.answer is not None
+
+
+class SemanticCache:
+    """
+    Up to `capacity` (embedding, answer) pairs in a preallocated matrix; a lookup
+    is one matrix-vector product. When full, the least recently used entry is
+    overwritten.
+    """
+
+    def __init__(self, encoder: Any, threshold: float = 0.95, capacity: int = 5000):
+        self.encoder = encoder
+        self.threshold = threshold
+        self.capacity = capacity
+        self._vectors: Optional[np.ndarray] = None
+        self._keys = np.full(capacity, -1, dtype=np.int64)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._answers: List[Optional[str]] = [None] * capacity
+        self._key_ids: Dict[Hashable, int] = {}
+        self._next_key_id = 0
+        self._size = 0
+        self._tick = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        # Best-match similarity of every lookup, for tuning the threshold
+        self._best_counts = np.zeros(len(SIMILARITY_BINS), dtype=np.int64)
+
+    @classmethod
+    def from_env(cls) -> Optional["SemanticCache"]:
+        """The configured cache, or None when disabled or the encoder cannot load"""
+        if os.environ.get("MEDBOT_SEMANTIC_CACHE", "0") != "1":
+            return None
+        try:
+            encoder = MessageEncoder(
+                os.environ.get("MEDBOT_EMBED_MODEL", "distilbert-base-uncased"),
+                os.environ.get("MEDBOT_EMBED_QUANTIZED") or None,
+            )
+        except Exception as e:
+            print(f"Semantic cache disabled, encoder failed to load: {e}")
+            return None
+        return cls(
+            encoder,
+            threshold=float(os.environ.get("MEDBOT_CACHE_THRESHOLD", "0.95")),
+            capacity=int(os.environ.get("MEDBOT_CACHE_CAPACITY", "5000")),
+        )
+
+    def _key_id(self, key: Hashable) -> int:
+        key_id = self._key_ids.get(key)
+        if key_id is None:
+            key_id = self._key_ids[key] = self._next_key_id
+            self._next_key_id += 1
+        return key_id
+
+    def lookup(self, message: str, key: Hashable = None) -> CacheLookup:
+        with self._lock:
+            known = key in self._key_ids
+        if not known:
+            # No entry can match, so skip the encoder; store() encodes if the answer is kept
+            with self._lock:
+                self.lookups += 1
+                self._best_counts[0] += 1
+            return CacheLookup(None, key, None, 0.0, message)
+        embedding = self.encoder.encode([message])[0]
+        with self._lock:
+            self.lookups += 1
+            best, answer = 0.0, None
+            key_id = self._key_ids.get(key)
+            if self._size and key_id is not None:
+                similarities = self._vectors[:self._size] @ embedding
+                similarities[self._keys[:self._size] != key_id] = -1.0
+                index = int(np.argmax(similarities))
+                best = float(similarities[index])
+                if best >= self.threshold:
+                    self._tick += 1
+                    self._last_used[index] = self._tick
+                    answer = self._answers[index]
+                    self.hits += 1
+            self._best_counts[np.searchsorted(SIMILARITY_BINS, max(best, 0.0), side="right") - 1] += 1
+        return CacheLookup(embedding, key, answer, best, message)
+
+    def store(self, lookup: CacheLookup, answer: str):
+        if not answer or lookup.hit:
+            return
+        if lookup.embedding is None:
+            lookup.embedding = self.encoder.encode([lookup.message])[0]
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.capacity, lookup.embedding.shape[0]), dtype=np.float32)
+            if self._size < self.capacity:
+                index = self._size
+                self._size += 1
+            else:
+                index = int(np.argmin(self._last_used))
+                self.evictions += 1
+            self._tick += 1
+            self._vectors[index] = lookup.embedding
+            self._keys[index] = self._key_id(lookup.key)
+            self._answers[index] = answer
+            self._last_used[index] = self._tick
+            if len(self._key_ids) > 4 * self.capacity:
+                self._compact_keys()
+
+    def _compact_keys(self):
+        """Forget keys no entry uses any more so the key map stays bounded"""
+        live = set(self._keys[:self._size].tolist())
+        self._key_ids = {key: key_id for key, key_id in self._key_ids.items() if key_id in live}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = self._best_counts.tolist()
+            return {
+                "size": self._size,
+                "capacity": self.capacity,
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "evictions": self.evictions,
+                "best_similarity_histogram": {
+                    f"{lo:.2f}": n for lo, n in zip(SIMILARITY_BINS.tolist(), counts) if n
+                },
+            }
@@ -0,0 +1,199 @@
+# serving_state.py
+"""
+Versioned serving state with zero-downtime reloads.
+
+Everything a request reads (model, disease tables, ranker, questionnaire,
+doctor directory) lives on one immutable ServingState. A reload builds the
+next state in the background, then swaps the live reference under a lock.
+Requests hold their state through acquire(), so anything in flight finishes on
+the version it started with; a replaced state is dropped once its last
+request releases it.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from adaptive_quiz import AdaptiveQuestionnaire
+from data_artifacts import DISEASE_FILE, DOCTOR_FILE, SEVERITY_FILE, load_data_store
+from disease_ranker import DiseaseRanker
+from symptom_extractor import SymptomExtractor
+
+
+class ReloadInProgress(Exception):
+    """Raised when a reload is requested while another one is still building"""
+
+
+def _fingerprint(paths: List[str]) -> str:
+    """Short hash of the size and mtime of every existing file under `paths`"""
+    entries = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(path, name) for name in os.listdir(path))
+        else:
+            files = [path]
+        for name in files:
+            if os.path.isfile(name):
+                stat = os.stat(name)
+                entries.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha256("\n".join(entries).encode()).hexdigest()[:12]
+
+
+class ServingState:
+    """One consistent version of the model and data served to requests"""
+
+    def __init__(self, model: Any, model_version: str, data_store, data_version: str):
+        self.model = model
+        self.model_version = model_version
+        self.data_store = data_store
+        self.data_version = data_version
+        self.version = f"{data_version}/{model_version}"
+        self.doctors_data = data_store.doctors_df
+        self.symptom_matrix = data_store.symptom_matrix
+        self.disease_details = data_store.disease_details
+        self.adaptive_quiz = AdaptiveQuestionnaire(self.symptom_matrix)
+        self.disease_ranker = DiseaseRanker(self.symptom_matrix, data_store.severity)
+        self.disease_ranker.calibrate_on_table()
+        self.symptom_extractor = SymptomExtractor(self.symptom_matrix.symptoms)
+        self.refs = 0
+        self.created = time.time()
+
+
+class ServingStateManager:
+    """Owns the live ServingState and builds/swaps new ones on reload"""
+
+    def __init__(self, data_dir: str, model_path: str, load_model: Callable[[str], Any],
+                 artifacts_dir: Optional[str] = None, rebuild_artifacts: Optional[bool] = None):
+        self.data_dir = data_dir
+        self.model_path = model_path
+        self.load_model = load_model
+        self.artifacts_dir = artifacts_dir or os.path.join(data_dir, "artifacts")
+        # Rebuild a stale artifact build on reload instead of serving straight from the CSVs
+        if rebuild_artifacts is None:
+            rebuild_artifacts = os.environ.get("MEDBOT_REBUILD_ARTIFACTS") == "1"
+        self.rebuild_artifacts = rebuild_artifacts
+        # Data fingerprint as of the last build, after any artifact rebuild it did
+        self.built_fingerprint: Optional[str] = None
+        self.current: Optional[ServingState] = None
+        self._retired: List[ServingState] = []
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.last_reload: Dict[str, Any] = {}
+
+    def _data_paths(self) -> List[str]:
+        names = (DISEASE_FILE, DOCTOR_FILE, SEVERITY_FILE)
+        return [os.path.join(self.data_dir, n) for n in names] + [os.path.join(self.artifacts_dir, "CURRENT")]
+
+    def data_fingerprint(self) -> str:
+        return _fingerprint(self._data_paths())
+
+    def model_fingerprint(self) -> str:
+        return _fingerprint([self.model_path])
+
+    def _build(self, reload_model: Optional[bool]) -> ServingState:
+        previous = self.current
+        model_version = self.model_fingerprint()
+        reuse_model = previous is not None and (
+            reload_model is False or (reload_model is None and model_version == previous.model_version)
+        )
+        if reuse_model:
+            model, model_version = previous.model, previous.model_version
+        else:
+            model = self.load_model(self.model_path)
+
+        # When the CSVs no longer match the CURRENT build's manifest this parses them (or
+        # rebuilds the artifacts) rather than serving the stale build again
+        data_store = load_data_store(self.data_dir, self.artifacts_dir, rebuild=self.rebuild_artifacts)
+        self.built_fingerprint = self.data_fingerprint()
+        data_version = data_store.version
+        if data_version == "csv":
+            data_version = f"csv-{self.built_fingerprint}"
+        state = ServingState(model, model_version, data_store, data_version)
+        if previous is not None:
+            # Quiz sessions survive the swap when the disease/symptom vocabulary did not change
+            state.adaptive_quiz.adopt_sessions(previous.adaptive_quiz)
+        return state
+
+    def load(self) -> ServingState:
+        """Build the first state synchronously at startup"""
+        self.current = self._build(reload_model=True)
+        return self.current
+
+    def reload(self, reload_model: Optional[bool] = None) -> ServingState:
+        """
+        Build a new state and swap it in. The model is reloaded when reload_model is
+        True, or when None and the checkpoint files changed; otherwise it is shared.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            raise ReloadInProgress()
+        started = time.perf_counter()
+        try:
+            state = self._build(reload_model)
+            with self._lock:
+                old, self.current = self.current, state
+                if old is not None and old.refs > 0:
+                    self._retired.append(old)
+            self.last_reload = {
+                "version": state.version,
+                "previous_version": old.version if old is not None else None,
+                "model_reloaded": old is None or state.model is not old.model,
+                "seconds": round(time.perf_counter() - started, 3),
+                "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            print(f"Serving version {state.version} (was {self.last_reload['previous_version']})")
+            return state
+        except Exception as e:
+            self.last_reload = {"error": str(e), "finished": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            raise
+        finally:
+            self._reload_lock.release()
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_lock.locked()
+
+    @contextmanager
+    def acquire(self) -> Iterator[ServingState]:
+        """Pin the current state for the duration of one request"""
+        with self._lock:
+            state = self.current
+            state.refs += 1
+        try:
+            yield state
+        finally:
+            with self._lock:
+                state.refs -= 1
+                if state.refs == 0 and state in self._retired:
+                    # Last request on an old version: drop it so its model/tables can be freed
+                    self._retired.remove(state)
+
+    async def watch(self, interval: float):
+        """Poll the data files and model checkpoint and reload when either changes"""
+        seen = (self.data_fingerprint(), self.model_fingerprint())
+        while True:
+            await asyncio.sleep(interval)
+            current = (self.data_fingerprint(), self.model_fingerprint())
+            if current == seen or self.reloading:
+                continue
+            try:
+                await asyncio.to_thread(self.reload)
+                # A rebuild moves CURRENT; that is not a change to reload for again
+                seen = (self.built_fingerprint, current[1])
+            except ReloadInProgress:
+                continue
+            except Exception as e:
+                print(f"Reload failed, still serving {self.current.version}: {e}")
+                seen = current
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "version": self.current.version if self.current else None,
+                "in_flight": self.current.refs if self.current else 0,
+                "draining": [{"version": s.version, "in_flight": s.refs} for s in self._retired],
+                "reloading": self.reloading,
+                "last_reload": self.last_reload,
+            }
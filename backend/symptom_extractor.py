@@ -0,0 +1,134 @@
+# symptom_extractor.py
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+from red_flags import NEGATION_CUES, NEGATION_WINDOW, SCOPE_TERMINATORS
+from symptom_matrix import normalize_symptom
+
+# Words that carry a negation over to the next symptom ("no fever or chills")
+NEGATION_CONNECTORS = {"or", "nor", "and", "any", "a", "an"}
+_NON_WORD = re.compile(r"[^a-z0-9']+")
+# Sentence and clause punctuation, kept as a CLAUSE_BREAK token so negation never crosses it
+_CLAUSE_PUNCTUATION = re.compile(r"[.!?;,\n]")
+CLAUSE_BREAK = "."
+
+
+def _words(text: str) -> str:
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercase, clause punctuation to a standalone "." token, other punctuation and
+    underscores to single spaces, padded so every word is space-delimited
+    """
+    clauses = (_words(part) for part in _CLAUSE_PUNCTUATION.split(text))
+    return f" {f' {CLAUSE_BREAK} '.join(clause for clause in clauses if clause)} "
+
+
+class SymptomExtraction:
+    def __init__(self, symptoms: List[str], negated: List[str]):
+        self.symptoms = symptoms
+        self.negated = negated
+
+    def as_dict(self) -> Dict[str, List[str]]:
+        return {"symptoms": self.symptoms, "negated": self.negated}
+
+
+class SymptomExtractor:
+    """
+    Aho-Corasick automaton over the symptom vocabulary. A message is scanned once,
+    character by character, and every whole-word occurrence of a symptom name is
+    found in time linear in the message length, whatever the vocabulary size.
+    Overlapping hits keep the longest ("chest pain" over "pain"), and a symptom is
+    negated when a negation cue appears in the few words before it, within the
+    same clause.
+    """
+
+    def __init__(self, symptoms: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, str]]] = [[]]
+        for symptom in symptoms:
+            canonical = normalize_symptom(symptom)
+            pattern = _words(canonical)
+            if pattern:
+                self._add(f" {pattern} ", canonical)
+        self._build_failure_links()
+
+    def _add(self, pattern: str, canonical: str):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(pattern), canonical))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                if state:
+                    fail = self._fail[state]
+                    while fail and ch not in self._goto[fail]:
+                        fail = self._fail[fail]
+                    self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _matches(self, text: str) -> List[Tuple[int, int, str]]:
+        """(start, end, canonical) of every hit; patterns are space-delimited so hits are whole words"""
+        hits = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, canonical in self._out[state]:
+                hits.append((i - length + 1, i + 1, canonical))
+        return hits
+
+    @staticmethod
+    def _longest_non_overlapping(hits: List[Tuple[int, int, str]]) -> List[Tuple[int, int, str]]:
+        chosen = []
+        last_end = -1
+        for start, end, canonical in sorted(hits, key=lambda h: (h[0], -(h[1] - h[0]))):
+            # Patterns share their delimiting spaces with neighbours, hence the -1
+            if start >= last_end - 1:
+                chosen.append((start, end, canonical))
+                last_end = end
+        return chosen
+
+    def extract(self, message: str) -> SymptomExtraction:
+        text = normalize_text(message)
+        symptoms: List[str] = []
+        negated: List[str] = []
+        previous_end, previous_negated = 0, False
+        for start, end, canonical in self._longest_non_overlapping(self._matches(text)):
+            # Bounded look-back keeps the whole scan linear in the message length
+            lookback = text[max(0, start - 80):start]
+            before = lookback.split()
+            if start > 80 and not lookback.startswith(" "):
+                before = before[1:]
+            before = before[-NEGATION_WINDOW:]
+            for i in range(len(before) - 1, -1, -1):
+                if before[i] in SCOPE_TERMINATORS or before[i] == CLAUSE_BREAK:
+                    before = before[i + 1:]
+                    break
+            # Carried over connectors only ("no fever or chills"); a clause break ends it
+            between = text[previous_end:start].split()
+            is_negated = any(word in NEGATION_CUES for word in before) or (
+                previous_negated and all(word in NEGATION_CONNECTORS for word in between)
+            )
+            target = negated if is_negated else symptoms
+            if canonical not in target:
+                target.append(canonical)
+            previous_end, previous_negated = end, is_negated
+        return SymptomExtraction([s for s in symptoms if s not in negated], negated)
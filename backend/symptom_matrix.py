@@ -0,0 +1,63 @@
+# symptom_matrix.py
+import re
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+
+def normalize_symptom(symptom: Any) -> str:
+    """Canonical form of a symptom name: lowercase words, no underscores or quotes"""
+    text = str(symptom).strip().strip("[]'\"").replace("_", " ")
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def split_list(cell: Any) -> List[str]:
+    """Split a stored list cell (comma string or list repr) into stripped items"""
+    if cell is None or (isinstance(cell, float) and np.isnan(cell)):
+        return []
+    parts = cell if isinstance(cell, (list, tuple, np.ndarray)) else str(cell).split(",")
+    items = [str(part).strip().strip("[]'\"").strip() for part in parts]
+    return [item for item in items if item and item.lower() not in ("0", "unknown", "nan")]
+
+
+def split_symptoms(cell: Any) -> List[str]:
+    """Split a stored symptom list into canonical names"""
+    return list(dict.fromkeys(normalize_symptom(part) for part in split_list(cell)))
+
+
+class SymptomMatrix:
+    """Binary disease x symptom incidence matrix with name lookups"""
+
+    def __init__(self, diseases: List[str], symptoms: List[str], matrix: np.ndarray):
+        self.diseases = list(diseases)
+        self.symptoms = list(symptoms)
+        self.matrix = matrix
+        self.disease_index: Dict[str, int] = {d: i for i, d in enumerate(self.diseases)}
+        self.symptom_index: Dict[str, int] = {s: i for i, s in enumerate(self.symptoms)}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, disease_col: str = "diseases",
+                   symptom_col: str = "symptoms") -> "SymptomMatrix":
+        """Build the matrix from the cleaned disease table"""
+        diseases = df[disease_col].astype(str).tolist()
+        symptom_lists = [split_symptoms(cell) for cell in df[symptom_col]]
+        symptoms = sorted({s for symptom_list in symptom_lists for s in symptom_list})
+        index = {s: i for i, s in enumerate(symptoms)}
+
+        matrix = np.zeros((len(diseases), len(symptoms)), dtype=np.uint8)
+        for row, symptom_list in enumerate(symptom_lists):
+            matrix[row, [index[s] for s in symptom_list]] = 1
+        return cls(diseases, symptoms, matrix)
+
+    def encode(self, symptoms: Iterable[str]) -> np.ndarray:
+        """0/1 vector over the vocabulary; unknown symptoms are ignored"""
+        vector = np.zeros(len(self.symptoms), dtype=np.float32)
+        for symptom in symptoms:
+            col = self.symptom_index.get(normalize_symptom(symptom))
+            if col is not None:
+                vector[col] = 1
+        return vector
+
+    def symptoms_of(self, disease_idx: int) -> List[str]:
+        return [self.symptoms[i] for i in np.flatnonzero(self.matrix[disease_idx])]
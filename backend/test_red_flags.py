@@ -0,0 +1,59 @@
+# test_red_flags.py
+import pytest
+
+from red_flags import red_flag_detector
+from symptom_extractor import SymptomExtractor
+
+
+@pytest.mark.parametrize("message, category", [
+    ("I have crushing chest pain spreading to my left arm", "cardiac"),
+    ("not sure but chest pain", "cardiac"),
+    ("no fever, however I can't breathe", "respiratory"),
+    ("am I having a heart attack?", "cardiac"),
+    ("is this a stroke? my face is drooping", "neurological"),
+    ("my father suddenly can't breathe and his lips are turning blue", "respiratory"),
+    ("she is confused and her speech is slurred since this morning", "neurological"),
+    ("I had a stroke last year and now my face is drooping", "neurological"),
+    ("I had a seizure this morning", "neurological"),
+    ("what should I do, I have crushing chest pain", "cardiac"),
+    ("I am not able to breathe", "respiratory"),
+    ("He is not breathing", "respiratory"),
+    ("my son stopped breathing for a few seconds", "respiratory"),
+])
+def test_detects_current_emergencies(message, category):
+    match = red_flag_detector.detect(message)
+    assert match is not None and category in match.categories
+
+
+@pytest.mark.parametrize("message", [
+    "what are the risk factors for stroke?",
+    "how can I prevent a heart attack",
+    "my grandfather had a stroke years ago",
+    "I'm confused about my medication dose",
+    "can't breathe through my nose",
+    "I'm not breathing through my nose at night",
+    "no chest pain, just a dry cough at night",
+    "I don't have chest pain",
+])
+def test_ignores_questions_history_and_negations(message):
+    assert red_flag_detector.detect(message) is None
+
+
+def test_negation_scope_ends_at_terminator():
+    extractor = SymptomExtractor(["chest pain", "fever"])
+    extraction = extractor.extract("no fever but chest pain")
+    assert extraction.symptoms == ["chest pain"]
+    assert extraction.negated == ["fever"]
+
+
+@pytest.mark.parametrize("message, symptoms, negated", [
+    ("I have no fever. Headache since yesterday", ["headache"], ["fever"]),
+    ("No fever. Cough and headache.", ["cough", "headache"], ["fever"]),
+    ("not sure, headache", ["headache"], []),
+    ("no fever, and headache is bad", ["headache"], ["fever"]),
+    ("no fever or headache", [], ["fever", "headache"]),
+])
+def test_negation_scope_ends_at_punctuation(message, symptoms, negated):
+    extraction = SymptomExtractor(["cough", "fever", "headache"]).extract(message)
+    assert extraction.symptoms == symptoms
+    assert extraction.negated == negated
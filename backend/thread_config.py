@@ -0,0 +1,163 @@
+# thread_config.py
+"""
+Per-worker CPU thread configuration for model inference.
+
+Every uvicorn worker loads its own copy of the model, and by default each one
+sizes PyTorch's thread pools to all cores, so N workers oversubscribe the host
+N times over. apply_thread_config() splits the physical cores between workers,
+sets torch's intra-/inter-op pools accordingly and can pin each worker to its
+own cores.
+
+Precedence: MEDBOT_INTRA_OP_THREADS / MEDBOT_INTER_OP_THREADS, then an autotune
+result (thread_config.json from autotune_threads.py) recorded for the same
+worker count, then an even split of the detected physical cores.
+"""
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.environ.get("MEDBOT_THREAD_CONFIG", os.path.join(BASE_DIR, "thread_config.json"))
+
+# Lock files held for the life of a worker so each one claims a distinct core slice
+_slot_handle = None
+
+
+def allowed_cpus() -> List[int]:
+    """Logical CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def physical_cores(cpus: Optional[List[int]] = None) -> List[List[int]]:
+    """Group allowed logical CPUs by physical core (hyperthread siblings together)"""
+    cpus = cpus if cpus is not None else allowed_cpus()
+    allowed = set(cpus)
+    cores: Dict[str, List[int]] = {}
+    for cpu in cpus:
+        path = f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list"
+        try:
+            with open(path) as f:
+                key = f.read().strip()
+        except OSError:
+            key = str(cpu)
+        cores.setdefault(key, []).append(cpu)
+    return [sorted(c for c in siblings if c in allowed) for siblings in cores.values()]
+
+
+def worker_count() -> int:
+    return int(os.environ.get("MEDBOT_WORKERS") or os.environ.get("WEB_CONCURRENCY") or 1)
+
+
+def load_tuned_config(path: str = CONFIG_PATH) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: ignoring unreadable thread config {path}: {e}")
+        return None
+
+
+def plan_threads(workers: Optional[int] = None, cores: Optional[List[List[int]]] = None,
+                 tuned: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Decide thread counts for one worker out of `workers` sharing this host"""
+    workers = workers or worker_count()
+    cores = cores if cores is not None else physical_cores()
+    intra = max(1, len(cores) // workers)
+    inter = 1
+    pin = os.environ.get("MEDBOT_PIN_CPUS") == "1"
+    source = "auto"
+
+    if tuned and tuned.get("workers") == workers:
+        intra = int(tuned.get("intra_op_threads", intra))
+        inter = int(tuned.get("inter_op_threads", inter))
+        pin = bool(tuned.get("pin_affinity", pin))
+        source = "autotune"
+    if os.environ.get("MEDBOT_INTRA_OP_THREADS"):
+        intra = int(os.environ["MEDBOT_INTRA_OP_THREADS"])
+        source = "env"
+    if os.environ.get("MEDBOT_INTER_OP_THREADS"):
+        inter = int(os.environ["MEDBOT_INTER_OP_THREADS"])
+
+    return {
+        "workers": workers,
+        "physical_cores": len(cores),
+        "intra_op_threads": intra,
+        "inter_op_threads": inter,
+        "pin_affinity": pin,
+        "source": source,
+    }
+
+
+def claim_worker_slot(workers: int) -> Optional[int]:
+    """Take the first free worker slot on this host (released automatically on exit)"""
+    global _slot_handle
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    lock_dir = os.path.join(tempfile.gettempdir(), f"medbot-cpu-slots-{os.getuid()}")
+    os.makedirs(lock_dir, exist_ok=True)
+    for slot in range(workers):
+        handle = open(os.path.join(lock_dir, f"slot-{slot}.lock"), "w")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        _slot_handle = handle
+        return slot
+    return None
+
+
+def pin_to_slot(slot: int, threads: int, cores: Optional[List[List[int]]] = None) -> List[int]:
+    """Restrict this process to `threads` physical cores starting at slot * threads"""
+    cores = cores if cores is not None else physical_cores()
+    chosen = cores[slot * threads:(slot + 1) * threads]
+    # One logical CPU per physical core keeps hyperthread siblings from contending
+    cpus = [siblings[0] for siblings in chosen]
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    return cpus
+
+
+def apply_thread_config(workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Configure this worker's thread pools (and optionally CPU affinity).
+    Call before the model is loaded so OpenMP/MKL pick the settings up.
+    """
+    cores = physical_cores()
+    settings = plan_threads(workers, cores, load_tuned_config())
+    intra, inter = settings["intra_op_threads"], settings["inter_op_threads"]
+
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, str(intra))
+
+    if settings["pin_affinity"]:
+        slot = claim_worker_slot(settings["workers"])
+        if slot is not None:
+            settings["slot"] = slot
+            settings["cpus"] = pin_to_slot(slot, intra, cores)
+
+    import torch
+    torch.set_num_threads(intra)
+    try:
+        torch.set_num_interop_threads(inter)
+    except RuntimeError:
+        # Only allowed before the first parallel op; keep the existing pool
+        settings["inter_op_threads"] = torch.get_num_interop_threads()
+    return settings
+
+
+def sweep_candidates(cores: Optional[int] = None) -> List[Dict[str, int]]:
+    """(workers, threads) combinations worth benchmarking on this host"""
+    cores = cores or len(physical_cores())
+    powers = [n for n in (1, 2, 4, 8, 16, 32, 64) if n <= cores]
+    return [
+        {"workers": w, "intra_op_threads": t}
+        for w in powers for t in powers if w * t <= cores
+    ]
@@ -0,0 +1,197 @@
+# traffic_capture.py
+"""
+Opt-in capture of /chat and /quiz traffic for replay_traffic.py.
+
+Set MEDBOT_CAPTURE_DIR to record every matching request as one gzip'd NDJSON
+line: arrival time (seconds since the capture started), method, path, query,
+anonymized JSON body, status and latency. Headers and cookies are never
+recorded. IDs (user/session/conversation) are replaced by salted hashes so
+per-user burst structure survives; credentials and personal fields are
+dropped; emails, URLs and long digit runs in free text are masked. Each worker
+writes its own file from a background thread.
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+ID_FIELDS = {"user_id", "conversation_id", "session_id"}
+DROP_FIELDS = {"password", "username", "email", "name", "phone", "address", "location"}
+TEXT_FIELDS = {"message"}
+MAX_CAPTURE_BODY = 64 * 1024
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_URL = re.compile(r"https?://\S+")
+_DIGITS = re.compile(r"\+?\d[\d\s().-]{4,}\d")
+
+
+def scrub_text(text: str) -> str:
+    """Mask emails, URLs and phone/ID-like digit runs, keeping the message length roughly intact"""
+    text = _EMAIL.sub("[email]", text)
+    text = _URL.sub("[url]", text)
+    return _DIGITS.sub("[number]", text)
+
+
+class TrafficRecorder:
+    """Anonymizes requests and appends them to a gzip NDJSON file off the event loop"""
+
+    def __init__(self, directory: str, salt: Optional[str] = None, max_records: int = 1_000_000):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"traffic-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.ndjson.gz")
+        # A shared MEDBOT_CAPTURE_SALT keeps hashed IDs consistent across workers
+        self._salt = (salt or secrets.token_hex(16)).encode()
+        self.max_records = max_records
+        self.started = time.monotonic()
+        self.recorded = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=10000)
+        self._thread = threading.Thread(target=self._write_loop, name="traffic-capture", daemon=True)
+        self._thread.start()
+        self._queue.put({"capture": {"started": time.time(), "pid": os.getpid()}})
+
+    @classmethod
+    def from_env(cls) -> Optional["TrafficRecorder"]:
+        directory = os.environ.get("MEDBOT_CAPTURE_DIR")
+        if not directory:
+            return None
+        return cls(directory, os.environ.get("MEDBOT_CAPTURE_SALT"),
+                   int(os.environ.get("MEDBOT_CAPTURE_MAX_RECORDS", "1000000")))
+
+    def pseudonym(self, value: Any) -> str:
+        digest = hmac.new(self._salt, str(value).encode(), hashlib.sha256).hexdigest()
+        return f"anon-{digest[:12]}"
+
+    def anonymize(self, payload: Any) -> Any:
+        if isinstance(payload, dict):
+            clean = {}
+            for key, value in payload.items():
+                if key in DROP_FIELDS:
+                    continue
+                if key in ID_FIELDS and value is not None:
+                    clean[key] = self.pseudonym(value)
+                elif key in TEXT_FIELDS and isinstance(value, str):
+                    clean[key] = scrub_text(value)
+                else:
+                    clean[key] = self.anonymize(value)
+            return clean
+        if isinstance(payload, list):
+            return [self.anonymize(item) for item in payload]
+        return payload
+
+    def record(self, arrived: float, method: str, path: str, query: str, body: Optional[bytes],
+               status: int, latency: float, response: Optional[bytes] = None):
+        if self.recorded >= self.max_records:
+            return
+        entry: Dict[str, Any] = {
+            "t": round(arrived - self.started, 4),
+            "method": method,
+            "path": path,
+            "query": query,
+            "body": None,
+            "body_bytes": len(body) if body is not None else None,
+            "status": status,
+            "latency_ms": round(latency * 1000, 2),
+        }
+        if body:
+            try:
+                entry["body"] = self.anonymize(json.loads(body))
+            except ValueError:
+                pass
+        created = _response_session(response)
+        if created:
+            # Lets the replay map later answers onto the session the replayed run created
+            entry["response_session"] = self.pseudonym(created)
+        try:
+            self._queue.put_nowait(entry)
+            self.recorded += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _write_loop(self):
+        with gzip.open(self.path, "at", encoding="utf-8") as out:
+            last_flush = time.monotonic()
+            while True:
+                try:
+                    entry = self._queue.get(timeout=1.0)
+                except queue.Empty:
+                    entry = {}
+                if entry is None:
+                    break
+                if entry:
+                    out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                if time.monotonic() - last_flush >= 1.0:
+                    # Sync-flush so a crashed worker still leaves a readable file
+                    out.flush()
+                    last_flush = time.monotonic()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "recorded": self.recorded, "dropped": self.dropped}
+
+
+def _response_session(response: Optional[bytes]) -> Optional[str]:
+    if not response:
+        return None
+    try:
+        payload = json.loads(response)
+    except ValueError:
+        return None
+    return payload.get("session_id") if isinstance(payload, dict) else None
+
+
+class TrafficCaptureMiddleware:
+    """ASGI middleware feeding matching requests to a TrafficRecorder; streaming responses pass through untouched"""
+
+    def __init__(self, app, recorder: TrafficRecorder, prefixes: Tuple[str, ...] = ("/chat", "/quiz"),
+                 exclude: Tuple[str, ...] = ("/chat/batch", "/chat/elaboration")):
+        self.app = app
+        self.recorder = recorder
+        self.prefixes = prefixes
+        self.exclude = exclude
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or not path.startswith(self.prefixes) or path.startswith(self.exclude):
+            await self.app(scope, receive, send)
+            return
+        arrived = time.monotonic()
+        body = bytearray()
+        response = bytearray()
+        state = {"status": 500, "oversize": False}
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                if len(body) + len(chunk) <= MAX_CAPTURE_BODY:
+                    body.extend(chunk)
+                else:
+                    state["oversize"] = True
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body" and path.startswith("/quiz"):
+                if len(response) < MAX_CAPTURE_BODY:
+                    response.extend(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            self.recorder.record(
+                arrived, scope["method"], path, scope.get("query_string", b"").decode("latin-1"),
+                None if state["oversize"] else bytes(body), state["status"],
+                time.monotonic() - arrived, bytes(response),
+            )
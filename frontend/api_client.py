@@ -0,0 +1,125 @@
+# api_client.py
+import os
+import random
+import time
+from typing import Any, Iterator, List, Optional
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+
+DEFAULT_API_URL = os.environ.get("MEDBOT_API_URL", "http://localhost:8000")
+CONNECT_TIMEOUT = float(os.environ.get("MEDBOT_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.environ.get("MEDBOT_READ_TIMEOUT", "120"))
+MAX_RETRIES = int(os.environ.get("MEDBOT_MAX_RETRIES", "3"))
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class ApiClient:
+    """
+    One pooled keep-alive session per browser session for every call to the backend.
+
+    Idempotent calls are retried a bounded number of times with full-jitter
+    exponential backoff; other calls are only retried when the connection was
+    never established, so a chat message is never sent twice.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_API_URL, connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float = READ_TIMEOUT, max_retries: int = MAX_RETRIES,
+                 backoff: float = 0.3, max_backoff: float = 5.0, pool_size: int = 10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _sleep_before_retry(self, attempt: int, response: Optional[requests.Response] = None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = random.uniform(0, self.backoff * (2 ** attempt))
+        time.sleep(min(delay, self.max_backoff))
+
+    def request(self, method: str, path: str, idempotent: Optional[bool] = None,
+                **kwargs: Any) -> requests.Response:
+        """Send a request, retrying transient failures when it is safe to"""
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", self.timeout)
+        url = f"{self.base_url}/{path.lstrip('/')}"
+
+        attempts = self.max_retries + 1
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectTimeout:
+                # Nothing reached the server, safe to retry any method
+                if last:
+                    raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout):
+                if last or not idempotent:
+                    raise
+            else:
+                if response.status_code in RETRY_STATUSES and idempotent and not last:
+                    self._sleep_before_retry(attempt, response)
+                    continue
+                return response
+            self._sleep_before_retry(attempt)
+        raise RuntimeError("unreachable")
+
+    def get(self, path: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def stream_lines(self, method: str, path: str, **kwargs: Any) -> Iterator[str]:
+        """Yield decoded lines of a streamed response body (e.g. NDJSON) as they arrive"""
+        response = self.request(method, path, stream=True, idempotent=False, **kwargs)
+        with response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line:
+                    yield line
+
+    def health(self) -> bool:
+        try:
+            return self.get("/", idempotent=False).status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    def close(self):
+        self.session.close()
+
+
+def get_client() -> ApiClient:
+    """The ApiClient for this browser session (holds its auth cookie)"""
+    if "api_client" not in st.session_state:
+        st.session_state.api_client = ApiClient(st.session_state.get("api_url", DEFAULT_API_URL))
+    return st.session_state.api_client
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _fetch_symptom_catalogue(base_url: str, _client: ApiClient) -> List[str]:
+    # Cached per base_url; the leading underscore keeps the client out of the cache key
+    response = _client.get("/quiz/symptoms", timeout=(CONNECT_TIMEOUT, 10))
+    response.raise_for_status()
+    return response.json()["symptoms"]
+
+
+def get_symptom_catalogue(client: ApiClient, fallback: List[str]) -> List[str]:
+    """Symptom names the backend knows, cached across reruns and sessions"""
+    try:
+        return _fetch_symptom_catalogue(client.base_url, client)
+    except (requests.exceptions.RequestException, KeyError, ValueError):
+        return fallback
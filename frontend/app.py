@@ -1,17 +1,14 @@
+import math
 import streamlit as st
-import requests
 from typing import Dict, Any, List
+from api_client import DEFAULT_API_URL, get_client
 from components.quiz import medical_quiz
 from components.user_dashboard import user_dashboard
 
-# Default API endpoint
-default_api_url = "http://localhost:8000"
-
-# Initialize session state for API URL, auth, messages, and HTTP session
+# Initialize session state for API URL, auth, messages, and the pooled API client
 if 'api_url' not in st.session_state:
-    st.session_state.api_url = default_api_url
-if 'http_session' not in st.session_state:
-    st.session_state.http_session = requests.Session()
+    st.session_state.api_url = DEFAULT_API_URL
+client = get_client()
 if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
 if 'user_info' not in st.session_state:
@@ -25,19 +22,9 @@ if 'conversation_id' not in st.session_state:
 
 # Authentication functions
 def login(email: str, password: str) -> bool:
-    """Log in with email and password using persistent session"""
+    """Log in with email and password using the pooled API client"""
     try:
-        base = st.session_state.api_url
-        sess = st.session_state.http_session
-        # Health check
-        health = sess.get(base)
-        if health.status_code != 200:
-            st.error(f"API not responding: {health.status_code}")
-            return False
-
-        # Login request
-        login_url = f"{base}/login"
-        response = sess.post(login_url, json={"email": email, "password": password})
+        response = client.post("/login", json={"email": email, "password": password})
         if response.status_code == 200:
             user_data = response.json()
             st.session_state.user_info = user_data
@@ -55,9 +42,8 @@ def login(email: str, password: str) -> bool:
 def logout():
     """Log out the user and clear session cookies"""
     try:
-        sess = st.session_state.http_session
-        sess.get(f"{st.session_state.api_url}/logout")
-        sess.cookies.clear()
+        client.get("/logout")
+        client.session.cookies.clear()
     except:
         pass
     st.session_state.user_info = None
@@ -68,14 +54,11 @@ def logout():
 
 # Chat functions
 def send_message(message: str) -> Dict[str, Any] | None:
-    """Send a message to the chatbot API using persistent session"""
+    """Send a message to the chatbot API using the pooled API client"""
     if not st.session_state.authenticated:
         st.error("You must be logged in to send messages.")
         return None
     try:
-        base = st.session_state.api_url
-        sess = st.session_state.http_session
-        
         # Add user_id to the request data
         data: Dict[str, Any] = {
             "message": message,
@@ -85,10 +68,7 @@ def send_message(message: str) -> Dict[str, Any] | None:
         if st.session_state.conversation_id:
             data["conversation_id"] = st.session_state.conversation_id
 
-        # Debug the payload
-        print(f"Sending data: {data}")
-        
-        response = sess.post(f"{base}/chat", json=data)
+        response = client.post("/chat", json=data)
         if response.status_code == 200:
             result = response.json()
             if result.get("conversation_id"):
@@ -111,16 +91,13 @@ def display_auth_status():
                 value=st.session_state.api_url,
                 key="api_url_input"
             )
+            client.base_url = st.session_state.api_url.rstrip("/")
             st.write("Currently connecting to:", st.session_state.api_url)
             if st.button("Test Connection", key="test_conn"):
-                try:
-                    resp = st.session_state.http_session.get(st.session_state.api_url)
-                    if resp.status_code == 200:
-                        st.success("Connected to API server", icon="✅")
-                    else:
-                        st.warning(f"Bad status: {resp.status_code}", icon="⚠️")
-                except Exception as e:
-                    st.error(f"Connection failed: {e}")
+                if client.health():
+                    st.success("Connected to API server", icon="✅")
+                else:
+                    st.warning("API server is not responding", icon="⚠️")
         st.markdown("---")
         if not st.session_state.authenticated:
             st.subheader("Login")
@@ -134,24 +111,57 @@ def display_auth_status():
                 logout()
 
 
+# Only the latest turns are drawn on each run; older ones are paged in on demand
+RECENT_MESSAGES = 20
+HISTORY_PAGE_SIZE = 20
+
+
+def render_message(msg: Dict[str, str]):
+    with st.chat_message(msg["role"]):
+        st.markdown(msg["content"])
+
+
+def chat_history():
+    """Earlier turns, one page at a time and only when expanded"""
+    older = st.session_state.messages[:-RECENT_MESSAGES]
+    if not older:
+        return
+    if not st.toggle(f"Show {len(older)} earlier messages", key="show_history"):
+        return
+    pages = math.ceil(len(older) / HISTORY_PAGE_SIZE)
+    page = st.number_input("Page (1 = most recent)", min_value=1, max_value=pages, value=1, key="history_page")
+    end = len(older) - (page - 1) * HISTORY_PAGE_SIZE
+    for msg in older[max(0, end - HISTORY_PAGE_SIZE):end]:
+        render_message(msg)
+
+
+@st.fragment
+def chat_window():
+    """
+    History pager, latest turns and the input box. A new message reruns only this
+    fragment; the pager is inside it so turns leaving the recent window show up there.
+    """
+    chat_history()
+    for msg in st.session_state.messages[-RECENT_MESSAGES:]:
+        render_message(msg)
+    user_input = st.chat_input("Type your symptoms or health concerns...")
+    if user_input:
+        message = {"role": "user", "content": user_input}
+        render_message(message)
+        st.session_state.messages.append(message)
+        with st.spinner("Thinking..."):
+            response = send_message(user_input)
+        if response:
+            reply = {"role": "assistant", "content": response["response"]}
+            render_message(reply)
+            st.session_state.messages.append(reply)
+
+
 def chatbot_ui():
     """Display chatbot UI"""
     st.title("Medical Assistant Chat")
     if st.session_state.authenticated:
-        for msg in st.session_state.messages:
-            with st.chat_message(msg["role"]):
-                st.markdown(msg["content"])
-        user_input = st.chat_input("Type your symptoms or health concerns...")
-        if user_input:
-            with st.chat_message("user"):
-                st.markdown(user_input)
-            st.session_state.messages.append({"role": "user", "content": user_input})
-            response = send_message(user_input)
-            if response:
-                with st.chat_message("assistant"):
-                    st.markdown(response["response"])
-                st.session_state.messages.append({"role": "assistant", "content": response["response"]})
-                st.rerun()
+        chat_window()
     else:
         st.info("Please log in to use the medical assistant.")
 
@@ -173,9 +183,9 @@ def main():
     if st.session_state.current_page == "chatbot":
         chatbot_ui()
     elif st.session_state.current_page == "quiz":
-        medical_quiz(st.session_state.api_url, st.session_state.http_session)
+        medical_quiz(client)
     elif st.session_state.current_page == "dashboard":
-        user_dashboard()
+        user_dashboard(client)
 
 if __name__ == "__main__":
     main()
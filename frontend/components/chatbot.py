@@ -1,10 +1,6 @@
 import streamlit as st
-import requests
-import json
 import uuid
-import logging
-
-logging.basicConfig(level=logging.DEBUG)
+from api_client import get_client
 
 # Ensure user_id exists in session state
 if "user_id" not in st.session_state:
@@ -40,7 +36,7 @@ def chatbot_ui():
     with st.chat_message("user"):
         st.write(user_input)
 
-    # Prepare payload - the key issue was here
+    # Prepare payload
     payload = {
         "user_id": st.session_state.user_id,
         "message": user_input
@@ -53,32 +49,10 @@ def chatbot_ui():
     # Send to backend
     with st.spinner("Thinking…"):
         try:
-            # Debug what we're about to send
-            st.write(f"DEBUG - About to send: {payload}")
-            print(f"DEBUG - About to send payload: {payload}")
-
-            # Make request with explicit dump to string for logging
-            payload_str = json.dumps(payload)
-            st.write(f"Payload as string: {payload_str}")
-
-            # Try with manual headers and data
-            headers = {"Content-Type": "application/json"}
-            resp = requests.post(
-                "http://127.0.0.1:8000/chat",
-                data=payload_str,  # Use data with string
-                headers=headers,
-                timeout=60
-            )
-            
-        # Log what was sent and received
-            st.write(f"Request headers: {headers}")
-            st.write(f"Response status: {resp.status_code}")
-            st.write(f"Response headers: {dict(resp.headers)}")
-            st.write(f"Response text: {resp.text}")
-            
+            resp = get_client().post("/chat", json=payload)
             resp.raise_for_status()
             data = resp.json()
-                # Extract and display assistant response
+            # Extract and display assistant response
             assistant_text = data.get("response")
             if assistant_text is None:
                 st.error("No `response` field in server reply.")
@@ -90,5 +64,5 @@ def chatbot_ui():
 
         except Exception as e:
             st.error(f"Chat request failed: {e}")
-            if hasattr(e, 'response') and e.response:
-                    st.error(f"Response content: {e.response.text}")
\ No newline at end of file
+            if getattr(e, "response", None) is not None:
+                st.error(f"Response content: {e.response.text}")
@@ -1,41 +1,109 @@
 # quiz.py
 import streamlit as st
-from datetime import datetime
 from typing import List
+from api_client import ApiClient, get_client, get_symptom_catalogue
+
+# Shown when the backend's symptom catalogue cannot be fetched
+DEFAULT_SYMPTOMS = [
+    "fever", "cough", "fatigue", "headache", "shortness of breath",
+    "sore throat", "chills", "nausea", "vomiting", "diarrhea",
+    "body aches", "congestion", "loss of taste", "loss of smell",
+    "rash", "dizziness", "chest pain", "abdominal pain"
+]
 
 def save_quiz_results(symptoms: List[str], possible_diseases: List[dict]):
-    """Save quiz results for dashboard display."""
-    if "medical_history" not in st.session_state:
-        st.session_state.medical_history = []
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    entry = {
-        "timestamp": timestamp,
-        "symptoms": symptoms,
-        "possible_diseases": possible_diseases,
-    }
-    st.session_state.medical_history.append(entry)
+    """Save quiz results to the backend history shown on the dashboard."""
+    if not st.session_state.get("authenticated"):
+        st.info("Log in to keep this result in your dashboard history.")
+        return
+    try:
+        resp = get_client().post(
+            "/user/history/entries",
+            json={"symptoms": symptoms, "possible_diseases": possible_diseases},
+        )
+        resp.raise_for_status()
+    except Exception as e:
+        st.warning(f"Could not save this result to your history: {e}")
+
+def show_possible_diseases(possible_diseases: List[dict]):
+    """Render the ranked conditions returned by the API"""
+    st.subheader("Possible Conditions")
+    for idx, d in enumerate(possible_diseases, start=1):
+        title = f"{idx}. {d.get('disease', 'Unknown Disease')}"
+        if d.get("probability") is not None:
+            title += f" ({d['probability']:.0%})"
+        with st.expander(title):
+            st.write(d.get("description") or "No description available.")
+
+def adaptive_quiz(client: ApiClient):
+    """
+    One question at a time; the backend picks each next question by expected
+    information gain and stops once it is confident.
+    """
+    state = st.session_state.get("adaptive_quiz")
+    if state is None:
+        st.write("Answer a few yes/no questions and we'll narrow down the likely causes.")
+        if st.button("Start guided check"):
+            try:
+                resp = client.post("/quiz/adaptive/start", json={"symptoms": []})
+                resp.raise_for_status()
+            except Exception as e:
+                st.error(f"Error connecting to API: {e}")
+                return
+            st.session_state.adaptive_quiz = resp.json()
+            st.session_state.adaptive_answers = []
+            st.rerun()
+        return
 
-def medical_quiz(api_base: str, http_session):
+    if not state["done"]:
+        question = state["question"]
+        st.caption(f"Question {state['questions_asked'] + 1}")
+        st.write(f"**{question['question'].capitalize()}**")
+        cols = st.columns(3)
+        for col, (label, answer) in zip(cols, [("Yes", "yes"), ("No", "no"), ("Not sure", "unsure")]):
+            if col.button(label, key=f"adaptive_{answer}", use_container_width=True):
+                try:
+                    resp = client.post(
+                        "/quiz/adaptive/answer",
+                        json={"session_id": state["session_id"], "symptom": question["symptom"], "answer": answer},
+                    )
+                    resp.raise_for_status()
+                except Exception as e:
+                    st.error(f"Error connecting to API: {e}")
+                    return
+                if answer == "yes":
+                    st.session_state.adaptive_answers.append(question["symptom"])
+                st.session_state.adaptive_quiz = resp.json()
+                st.rerun()
+        return
+
+    show_possible_diseases(state["possible_diseases"])
+    if not state.get("saved"):
+        save_quiz_results(st.session_state.adaptive_answers, state["possible_diseases"])
+        state["saved"] = True
+        st.success("Quiz complete—check your Dashboard for history.")
+    if st.button("Start over"):
+        st.session_state.adaptive_quiz = None
+        st.rerun()
+
+def medical_quiz(client: ApiClient):
     """
     Display medical symptom quiz and POST to /quiz.
-    `api_base`  – e.g. http://localhost:8000
-    `http_session` – your requests.Session()
+    `client` – the session's ApiClient
     """
     st.header("🩺 Symptom Checker Quiz")
+    mode = st.radio("Mode", ["Guided questions", "Pick from a list"], horizontal=True)
+    if mode == "Guided questions":
+        adaptive_quiz(client)
+        return
+
     # List all possible symptoms from your disease_symp dataset
-    all_symptoms = [
-        "fever", "cough", "fatigue", "headache", "shortness of breath",
-        "sore throat", "chills", "nausea", "vomiting", "diarrhea",
-        "body aches", "congestion", "loss of taste", "loss of smell",
-        "rash", "dizziness", "chest pain", "abdominal pain"
-    ]
-    st.write("Select the symptoms you're experiencing:")
-    cols = st.columns(3)
-    selected = []
-    for i, sym in enumerate(all_symptoms):
-        with cols[i % 3]:
-            if st.checkbox(sym.capitalize(), key=f"sym_{i}"):
-                selected.append(sym)
+    all_symptoms = get_symptom_catalogue(client, DEFAULT_SYMPTOMS)
+    selected = st.multiselect(
+        "Select the symptoms you're experiencing:",
+        all_symptoms,
+        format_func=str.capitalize,
+    )
     
     if st.button("Analyze Symptoms"):
         if not selected:
@@ -43,10 +111,7 @@ def medical_quiz(api_base: str, http_session):
             return
         with st.spinner("Sending symptoms to the API…"):
             try:
-                resp = http_session.post(
-                    f"{api_base}/quiz",
-                    json={"symptoms": selected}
-                )
+                resp = client.post("/quiz", json={"symptoms": selected}, idempotent=True)
             except Exception as e:
                 st.error(f"Error connecting to API: {e}")
                 return
@@ -60,11 +125,8 @@ def medical_quiz(api_base: str, http_session):
                 return
             
             # Show results
-            st.subheader("Possible Conditions")
             try:
-                for idx, d in enumerate(data["possible_diseases"], start=1):
-                    with st.expander(f"{idx}. {d.get('disease', 'Unknown Disease')}"):
-                        st.write(d.get("description", "No description available."))
+                show_possible_diseases(data["possible_diseases"])
             except Exception as e:
                 st.error(f"Error displaying results: {e}")
                 st.write("Raw data:", data)
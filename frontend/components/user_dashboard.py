@@ -1,51 +1,106 @@
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from api_client import ApiClient
 
-def user_dashboard():
+PAGE_SIZE = 10
+
+def _disease_label(disease) -> str:
+    """Readable label for a stored /quiz result entry"""
+    if isinstance(disease, dict):
+        label = disease.get("disease", "Unknown")
+        if disease.get("probability") is not None:
+            label += f" ({disease['probability']:.0%})"
+        return label
+    return str(disease)
+
+def user_dashboard(client: ApiClient):
     """Display user dashboard with medical history"""
     st.title("Medical Dashboard")
-    
-    # Check if medical history exists
-    if "medical_history" not in st.session_state or not st.session_state.medical_history:
+
+    if not st.session_state.get("authenticated"):
+        st.info("Please log in to see your medical history.")
+        return
+
+    # The backend keeps running aggregates, so the summary is cheap to fetch
+    try:
+        resp = client.get("/user/history/summary")
+        resp.raise_for_status()
+        summary = resp.json()
+    except Exception as e:
+        st.error(f"Could not load your medical history: {e}")
+        return
+
+    if not summary["total_entries"]:
         st.info("No medical history found. Complete a symptom quiz to see your history.")
         return
-    
+
     # Display medical history
     st.header("Your Medical History")
-    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Consultations", summary["total_entries"])
+    col2.metric("First consultation", (summary["first_seen"] or "")[:10])
+    col3.metric("Last consultation", (summary["last_seen"] or "")[:10])
+
+    # Only the page being shown is fetched
+    pages = max(1, -(-summary["total_entries"] // PAGE_SIZE))
+    page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1)
+    try:
+        resp = client.get("/user/history/entries", params={"page": int(page), "page_size": PAGE_SIZE})
+        resp.raise_for_status()
+        entries = resp.json()["entries"]
+    except Exception as e:
+        st.error(f"Could not load history page: {e}")
+        return
+    st.caption(f"Page {int(page)} of {pages}")
+
     # Create tabs for different views
-    tab1, tab2 = st.tabs(["Timeline View", "Table View"])
-    
+    tab1, tab2, tab3 = st.tabs(["Timeline View", "Table View", "Trends"])
+
     with tab1:
-        # Display history in reverse chronological order (newest first)
-        for i, entry in enumerate(reversed(st.session_state.medical_history)):
+        # Entries arrive newest first
+        for entry in entries:
             with st.expander(f"Consultation on {entry['timestamp']}"):
                 st.subheader("Symptoms Reported")
                 for symptom in entry['symptoms']:
                     st.write(f"- {symptom}")
-                
+
                 st.subheader("Possible Conditions")
                 for disease in entry['possible_diseases']:
-                    st.write(f"- {disease}")
-    
+                    st.write(f"- {_disease_label(disease)}")
+
     with tab2:
-        # Create a dataframe for table view
-        history_data = []
-        for entry in st.session_state.medical_history:
-            history_data.append({
+        history_df = pd.DataFrame([
+            {
                 "Date": entry['timestamp'],
                 "Symptoms": ", ".join(entry['symptoms']),
-                "Possible Conditions": ", ".join(entry['possible_diseases'])
-            })
-        
-        # Display as table
-        if history_data:
-            history_df = pd.DataFrame(history_data)
-            st.dataframe(history_df, use_container_width=True)
-    
+                "Possible Conditions": ", ".join(_disease_label(d) for d in entry['possible_diseases'])
+            }
+            for entry in entries
+        ])
+        st.dataframe(history_df, use_container_width=True)
+
+    with tab3:
+        if summary["top_symptoms"]:
+            st.subheader("Most reported symptoms")
+            symptoms_df = pd.DataFrame(summary["top_symptoms"]).set_index("symptom")
+            st.bar_chart(symptoms_df["count"])
+
+        st.subheader("Possible conditions over time")
+        windows = {"Last 7 days": "7d", "Last 30 days": "30d", "All time": "all"}
+        for col, (label, key) in zip(st.columns(len(windows)), windows.items()):
+            with col:
+                st.write(f"**{label}**")
+                conditions = summary["conditions"].get(key, [])
+                if not conditions:
+                    st.write("None")
+                for condition in conditions:
+                    st.write(f"- {condition['condition']} ({condition['count']})")
+
     # Add option to clear history
     if st.button("Clear Medical History"):
-        st.session_state.medical_history = []
-        st.success("Medical history cleared successfully!")
-        st.rerun()
\ No newline at end of file
+        try:
+            client.request("DELETE", "/user/history/entries").raise_for_status()
+            st.success("Medical history cleared successfully!")
+            st.rerun()
+        except Exception as e:
+            st.error(f"Could not clear history: {e}")